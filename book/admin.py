@@ -1,13 +1,19 @@
 from django.contrib import admin
 
-from book.models import Book, Borrowing, Payment
+from book.models import Book, Borrowing, Notification, Payment
+from book.search import search_books
 
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ("author", "title", "cover", "inventory", "daily_fee")
     list_filter = ("cover", "author")
-    search_fields = ("title",)
+    search_fields = ("title", "author")
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_books(queryset, search_term), False
 
 
 @admin.register(Borrowing)
@@ -34,3 +40,9 @@ class PaymentAdmin(admin.ModelAdmin):
     )
     list_filter = ("status", "type")
     search_fields = ("user", "session_id")
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "status", "attempts", "sent_at", "text")
+    list_filter = ("status",)
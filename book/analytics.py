@@ -0,0 +1,178 @@
+import datetime
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from book.models import (
+    Borrowing,
+    BorrowingDailyRollup,
+    Payment,
+    PaymentDailyRollup,
+    RollupWatermark,
+)
+from book.pricing import FinePolicy, outstanding_fines
+
+
+ROLLUP_WATERMARK = "analytics"
+# Rows committed a while after their updated_at (long transactions) are
+# still picked up: every run re-reads this much before the watermark.
+ROLLUP_OVERLAP = datetime.timedelta(minutes=10)
+
+
+def _day_ranges(field: str, days) -> Q:
+    """Index-friendly `field` within any of the (local) days."""
+    tz = timezone.get_current_timezone()
+    return reduce(
+        or_,
+        (
+            Q(
+                **{
+                    f"{field}__gte": datetime.datetime.combine(
+                        day, datetime.time(), tz
+                    ),
+                    f"{field}__lt": datetime.datetime.combine(
+                        day + datetime.timedelta(days=1), datetime.time(), tz
+                    ),
+                }
+            )
+            for day in days
+        ),
+    )
+
+
+def refresh_payment_days(days=None) -> int:
+    """Recomputes the payment rollups of the days, or of all days."""
+    payments = Payment.objects.order_by()
+    rollups = PaymentDailyRollup.objects.all()
+    if days is not None:
+        if not days:
+            return 0
+        payments = payments.filter(_day_ranges("created_at", days))
+        rollups = rollups.filter(day__in=days)
+
+    rows = (
+        payments.annotate(day=TruncDate("created_at"))
+        .values("day", "status", "type")
+        .annotate(count=Count("id"), amount=Sum("money_to_pay"))
+    )
+    rollups.delete()
+    return len(
+        PaymentDailyRollup.objects.bulk_create(
+            [PaymentDailyRollup(**row) for row in rows]
+        )
+    )
+
+
+def refresh_borrowing_days(days=None) -> int:
+    """Recomputes what started and returned on the days, or on all days."""
+    if days is not None and not days:
+        return 0
+    started = Borrowing.objects.order_by()
+    returned = Borrowing.objects.order_by().filter(
+        actual_return_date__isnull=False
+    )
+    if days is not None:
+        started = started.filter(borrow_date__in=days)
+        returned = returned.filter(actual_return_date__in=days)
+
+    rollups = {day: BorrowingDailyRollup(day=day) for day in days or ()}
+    for row in started.values("borrow_date").annotate(count=Count("id")):
+        rollup = rollups.setdefault(
+            row["borrow_date"], BorrowingDailyRollup(day=row["borrow_date"])
+        )
+        rollup.started = row["count"]
+    for row in returned.values("actual_return_date").annotate(
+        count=Count("id"),
+        late=Count(
+            "id", filter=Q(actual_return_date__gt=F("expected_return_date"))
+        ),
+    ):
+        day = row["actual_return_date"]
+        rollup = rollups.setdefault(day, BorrowingDailyRollup(day=day))
+        rollup.returned = row["count"]
+        rollup.returned_late = row["late"]
+
+    BorrowingDailyRollup.objects.bulk_create(
+        rollups.values(),
+        update_conflicts=True,
+        unique_fields=["day"],
+        update_fields=["started", "returned", "returned_late"],
+    )
+    return len(rollups)
+
+
+def snapshot_overdue(today: datetime.date) -> None:
+    """Stores today's active overdue borrowings and their fines so far."""
+    overdue = Borrowing.objects.filter(
+        actual_return_date__isnull=True, expected_return_date__lt=today
+    ).count()
+    BorrowingDailyRollup.objects.bulk_create(
+        [
+            BorrowingDailyRollup(
+                day=today,
+                overdue=overdue,
+                projected_fines=outstanding_fines(
+                    FinePolicy.from_settings(), today
+                ),
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=["day"],
+        update_fields=["overdue", "projected_fines"],
+    )
+
+
+def _changed_days(rows, *fields) -> set:
+    days = set()
+    for values in rows.values_list(*fields).distinct():
+        days.update(day for day in values if day is not None)
+    return days
+
+
+def refresh_rollups(now=None) -> dict:
+    """
+    Brings the daily rollups up to date incrementally: only the days of
+    payments and borrowings written since the last run (by their indexed
+    updated_at) are recomputed, the first run computes every day.
+    Deleted rows are only accounted for on the days recomputed later on.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        watermark = (
+            RollupWatermark.objects.select_for_update()
+            .filter(name=ROLLUP_WATERMARK)
+            .first()
+        )
+        if watermark is None:
+            payment_days = borrowing_days = None
+            watermark = RollupWatermark(name=ROLLUP_WATERMARK)
+        else:
+            window = {
+                "updated_at__gt": watermark.value - ROLLUP_OVERLAP,
+                "updated_at__lte": now,
+            }
+            payment_days = _changed_days(
+                Payment.objects.filter(**window)
+                .order_by()
+                .annotate(day=TruncDate("created_at")),
+                "day",
+            )
+            borrowing_days = _changed_days(
+                Borrowing.objects.filter(**window).order_by(),
+                "borrow_date",
+                "actual_return_date",
+            )
+
+        result = {
+            "payment_rollups": refresh_payment_days(payment_days),
+            "borrowing_days": refresh_borrowing_days(borrowing_days),
+        }
+        snapshot_overdue(timezone.localdate(now))
+        watermark.value = now
+        watermark.save()
+
+    return result
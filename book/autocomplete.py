@@ -0,0 +1,285 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from book.models import Book
+
+
+AUTOCOMPLETE_SNAPSHOT_TIMEOUT = 60 * 60
+AUTOCOMPLETE_CHANGE_TIMEOUT = 60 * 60 * 24
+AUTOCOMPLETE_MAX_CHANGES = 1000
+
+AUTOCOMPLETE_VERSION_KEY = "book:autocomplete:version"
+AUTOCOMPLETE_SNAPSHOT_KEY = "book:autocomplete:snapshot"
+
+
+def _change_key(version: int) -> str:
+    return f"book:autocomplete:change:{version}"
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def word_keys(text: str) -> list[str]:
+    """'J. R. R. Tolkien' -> ['j. r. r. tolkien', 'r. r. tolkien', ...]"""
+    words = normalize(text).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex:
+    """
+    Titles and authors as sorted arrays: `by_key` holds every word suffix
+    of them, so any prefix is a bisected range; `by_popularity` holds the
+    books most borrowed first.
+
+    A narrow range is ranked directly. A wide one (a prefix of one or two
+    letters) matches a large share of the books, so walking the popular
+    books until `limit` of them match ends after a few steps instead:
+    about limit * books / range, whichever is less work is picked.
+    """
+
+    def __init__(self, rows, version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.books = {}
+        self.by_key = []
+        self.by_popularity = []
+        for book_id, title, author, popularity in rows:
+            entries = self._keys(book_id, title, author)
+            self.books[book_id] = (title, author, popularity, entries)
+            self.by_key += entries
+            self.by_popularity.append((-popularity, book_id))
+        self.by_key.sort()
+        self.by_popularity.sort()
+
+    @staticmethod
+    def _keys(book_id, title, author):
+        return [(key, book_id, "title") for key in word_keys(title)] + [
+            (key, book_id, "author") for key in word_keys(author)
+        ]
+
+    def add(self, book_id, title, author, popularity=0):
+        self.remove(book_id)
+        entries = self._keys(book_id, title, author)
+        self.books[book_id] = (title, author, popularity, entries)
+        for entry in entries:
+            insort(self.by_key, entry)
+        insort(self.by_popularity, (-popularity, book_id))
+
+    def remove(self, book_id):
+        if book_id not in self.books:
+            return
+        *_, popularity, entries = self.books.pop(book_id)
+        for entry in entries:
+            del self.by_key[bisect_left(self.by_key, entry)]
+        del self.by_popularity[
+            bisect_left(self.by_popularity, (-popularity, book_id))
+        ]
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[dict]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        low = bisect_left(self.by_key, (prefix,))
+        high = bisect_left(self.by_key, (prefix + "\U0010ffff",))
+        if (high - low) ** 2 <= limit * len(self.books):
+            matches = sorted(
+                self.by_key[low:high],
+                key=lambda entry: (-self.books[entry[1]][2], entry[1]),
+            )
+        else:
+            matches = self._popular_matches(prefix)
+
+        suggestions, seen = [], set()
+        for _, book_id, kind in matches:
+            title, author, *_ = self.books[book_id]
+            text = title if kind == "title" else author
+            if (kind, text) in seen:
+                continue
+            seen.add((kind, text))
+            suggestions.append(
+                {
+                    "text": text,
+                    "kind": kind,
+                    "book": book_id if kind == "title" else None,
+                }
+            )
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+    def _popular_matches(self, prefix):
+        for _, book_id in self.by_popularity:
+            for entry in self.books[book_id][3]:
+                if entry[0].startswith(prefix):
+                    yield entry
+
+
+def load_rows():
+    return list(
+        Book.objects.order_by()
+        .annotate(popularity=Count("borrowings"))
+        .values_list("id", "title", "author", "popularity")
+    )
+
+
+def autocomplete_version() -> int | None:
+    """None while the cache is unreachable (its errors are ignored)."""
+    return cache.get_or_set(AUTOCOMPLETE_VERSION_KEY, 0, timeout=None)
+
+
+def build_snapshot() -> dict:
+    """
+    Reads the books with their borrowing counts and shares them, so other
+    processes build their index without the query. The version is read
+    first: changes racing with the query get replayed, which is harmless.
+    """
+    snapshot = {"version": autocomplete_version(), "rows": load_rows()}
+    cache.set(
+        AUTOCOMPLETE_SNAPSHOT_KEY, snapshot, AUTOCOMPLETE_SNAPSHOT_TIMEOUT
+    )
+    return snapshot
+
+
+def record_change(book_id: int) -> None:
+    """Logs a written or deleted book for every process to apply."""
+    try:
+        version = cache.incr(AUTOCOMPLETE_VERSION_KEY)
+    except ValueError:
+        cache.add(AUTOCOMPLETE_VERSION_KEY, 0, timeout=None)
+        version = cache.incr(AUTOCOMPLETE_VERSION_KEY)
+    cache.set(_change_key(version), book_id, AUTOCOMPLETE_CHANGE_TIMEOUT)
+
+
+def record_change_on_commit(book_id: int) -> None:
+    # Logged only once committed, so nobody re-reads the book too early.
+    transaction.on_commit(lambda: record_change(book_id))
+
+
+def record_changes(book_ids: list[int]) -> None:
+    """
+    Logs many books with a single version bump. Too many to replay are
+    not logged: the jump alone makes every process rebuild its index.
+    """
+    if not book_ids:
+        return
+    replay = len(book_ids) <= AUTOCOMPLETE_MAX_CHANGES
+    delta = len(book_ids) if replay else AUTOCOMPLETE_MAX_CHANGES + 1
+    try:
+        version = cache.incr(AUTOCOMPLETE_VERSION_KEY, delta)
+    except ValueError:
+        cache.add(AUTOCOMPLETE_VERSION_KEY, 0, timeout=None)
+        version = cache.incr(AUTOCOMPLETE_VERSION_KEY, delta)
+    if not replay:
+        return
+    first = version - delta + 1
+    cache.set_many(
+        {
+            _change_key(first + i): book_id
+            for i, book_id in enumerate(book_ids)
+        },
+        AUTOCOMPLETE_CHANGE_TIMEOUT,
+    )
+
+
+def record_changes_on_commit(book_ids: list[int]) -> None:
+    transaction.on_commit(lambda: record_changes(book_ids))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def apply_changes(index: PrefixIndex, version: int) -> bool:
+    """
+    Brings `index` up to `version` book by book. Returns False when the log
+    has a gap or is too long to replay, and the index has to be rebuilt.
+    """
+    versions = range(index.version + 1, version + 1)
+    if len(versions) > AUTOCOMPLETE_MAX_CHANGES:
+        return False
+
+    logged = cache.get_many([_change_key(v) for v in versions])
+    changed, applied = set(), index.version
+    for v in versions:
+        if _change_key(v) not in logged:
+            # Either expired, or logged a moment after the version bump.
+            if any(
+                _change_key(later) in logged
+                for later in range(v + 1, version + 1)
+            ):
+                return False
+            break
+        changed.add(logged[_change_key(v)])
+        applied = v
+
+    rows = Book.objects.filter(id__in=changed).values_list(
+        "id", "title", "author"
+    )
+    for book_id, title, author in rows:
+        popularity = index.books.get(book_id, (None, None, 0, None))[2]
+        index.add(book_id, title, author, popularity)
+        changed.discard(book_id)
+    for book_id in changed:
+        index.remove(book_id)
+
+    index.version = applied
+    return True
+
+
+def get_index() -> PrefixIndex:
+    """
+    The index of this process, kept in step with the change log. It is
+    rebuilt from the shared snapshot once an hour to refresh popularity.
+    While the cache is unreachable there is no change log to follow: the
+    local index is served as is, or built from the database without a
+    version, and replaced as soon as the cache is back.
+    """
+    global _index
+    version = autocomplete_version()
+    with _index_lock:
+        if version is None:
+            if (
+                _index is None
+                or time.monotonic() - _index.built_at
+                > AUTOCOMPLETE_SNAPSHOT_TIMEOUT
+            ):
+                _index = PrefixIndex(load_rows(), None)
+            return _index
+
+        expired = (
+            _index is None
+            or _index.version is None
+            # The version key was evicted and started over.
+            or _index.version > version
+            or time.monotonic() - _index.built_at
+            > AUTOCOMPLETE_SNAPSHOT_TIMEOUT
+        )
+        if expired:
+            snapshot = (
+                cache.get(AUTOCOMPLETE_SNAPSHOT_KEY) or build_snapshot()
+            )
+            _index = PrefixIndex(snapshot["rows"], snapshot["version"])
+
+        if _index.version < version and not apply_changes(_index, version):
+            snapshot = build_snapshot()
+            _index = PrefixIndex(snapshot["rows"], snapshot["version"])
+            apply_changes(_index, version)
+
+        return _index
+
+
+def suggest(prefix: str, limit: int = 10) -> list[dict]:
+    return get_index().suggest(prefix, limit)
+
+
+def reset_index() -> None:
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,214 @@
+import statistics
+import time
+import tracemalloc
+from typing import Callable, NamedTuple
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from book.cache import invalidate_catalog
+from book.models import Book, Borrowing, Payment
+
+
+BENCHMARK_PASSWORD = "bench-Passw0rd!"
+
+
+class Endpoint(NamedTuple):
+    """
+    One request to measure. `url` and `data` get the fixtures, `role` picks
+    the client ("anonymous", "reader" or "staff") and `max_queries` is the
+    budget that must hold whatever the size of the dataset.
+    """
+
+    name: str
+    method: str
+    url: Callable[[dict], str]
+    role: str
+    max_queries: int
+    data: Callable[[dict], dict] | None = None
+    before: Callable[[], None] | None = None
+
+
+ENDPOINTS = [
+    Endpoint(
+        "books-list",
+        "get",
+        lambda f: reverse("book:book-list"),
+        "anonymous",
+        # The page and its facet counts.
+        max_queries=2,
+        # Measures the database path, not a cached page.
+        before=invalidate_catalog,
+    ),
+    Endpoint(
+        "books-detail",
+        "get",
+        lambda f: reverse("book:book-detail", args=[f["book"].id]),
+        "staff",
+        # The version lookup for conditional requests comes on top.
+        max_queries=3,
+    ),
+    Endpoint(
+        "borrowings-list",
+        "get",
+        lambda f: reverse("book:borrow-list"),
+        "reader",
+        max_queries=2,
+    ),
+    Endpoint(
+        "borrowings-list-staff",
+        "get",
+        lambda f: reverse("book:borrow-list") + "?is_active=false",
+        "staff",
+        max_queries=2,
+    ),
+    Endpoint(
+        "borrowings-detail",
+        "get",
+        lambda f: reverse("book:borrow-detail", args=[f["borrowing"].id]),
+        "reader",
+        max_queries=4,
+    ),
+    Endpoint(
+        "payments-list",
+        "get",
+        lambda f: reverse("book:payment-list"),
+        "reader",
+        max_queries=2,
+    ),
+    Endpoint(
+        "payments-list-staff",
+        "get",
+        lambda f: reverse("book:payment-list"),
+        "staff",
+        max_queries=2,
+    ),
+    Endpoint(
+        "payments-detail",
+        "get",
+        lambda f: reverse("book:payment-detail", args=[f["payment"].id]),
+        "reader",
+        max_queries=3,
+    ),
+    Endpoint(
+        "users-me",
+        "get",
+        lambda f: reverse("user:me"),
+        "reader",
+        max_queries=1,
+    ),
+    Endpoint(
+        "token",
+        "post",
+        lambda f: reverse("user:token_obtain_pair"),
+        "anonymous",
+        max_queries=1,
+        data=lambda f: {
+            "email": f["reader"].email,
+            "password": BENCHMARK_PASSWORD,
+        },
+    ),
+]
+
+
+def prepare_fixtures() -> dict:
+    """
+    Picks the busiest reader of the current dataset (so list pages are
+    full) and adds a staff user, both with a known password.
+    """
+    User = get_user_model()
+    busiest = (
+        Borrowing.objects.values("user")
+        .annotate(total=Count("id"))
+        .order_by("-total")
+        .first()
+    )
+    reader = User.objects.get(id=busiest["user"])
+    reader.set_password(BENCHMARK_PASSWORD)
+    reader.save(update_fields=["password"])
+
+    staff = User.objects.create_user(
+        email=f"bench-staff-{reader.id}@library.test",
+        password=BENCHMARK_PASSWORD,
+        is_staff=True,
+    )
+    borrowing = reader.borrowings.order_by("-id").first()
+    return {
+        "reader": reader,
+        "staff": staff,
+        "book": Book.objects.order_by("id").first(),
+        "borrowing": borrowing,
+        "payment": Payment.objects.filter(borrowing=borrowing).first(),
+    }
+
+
+def make_clients(fixtures: dict) -> dict:
+    def client(user=None):
+        # localhost passes ALLOWED_HOSTS outside of tests, and the remote
+        # address is not in INTERNAL_IPS, which keeps the debug toolbar out.
+        api_client = APIClient(
+            SERVER_NAME="localhost", REMOTE_ADDR="10.0.0.1"
+        )
+        if user is not None:
+            token = RefreshToken.for_user(user).access_token
+            api_client.credentials(HTTP_AUTHORIZE=f"Bearer {token}")
+        return api_client
+
+    return {
+        "anonymous": client(),
+        "reader": client(fixtures["reader"]),
+        "staff": client(fixtures["staff"]),
+    }
+
+
+def request(endpoint: Endpoint, clients: dict, fixtures: dict):
+    if endpoint.before is not None:
+        endpoint.before()
+    data = endpoint.data(fixtures) if endpoint.data else None
+    return getattr(clients[endpoint.role], endpoint.method)(
+        endpoint.url(fixtures), data
+    )
+
+
+def count_queries(endpoint: Endpoint, clients: dict, fixtures: dict):
+    with CaptureQueriesContext(connection) as queries:
+        response = request(endpoint, clients, fixtures)
+    return response, len(queries)
+
+
+def measure(
+    endpoint: Endpoint, clients: dict, fixtures: dict, repeat: int = 50
+) -> dict:
+    """Query count, p50/p95 latency and memory allocated by one request."""
+    response, queries = count_queries(endpoint, clients, fixtures)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        request(endpoint, clients, fixtures)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        request(endpoint, clients, fixtures)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "endpoint": endpoint.name,
+        "status": response.status_code,
+        "queries": queries,
+        "max_queries": endpoint.max_queries,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[max(int(len(timings) * 0.95) - 1, 0)], 3),
+        "allocated_kb": round((after - before) / 1024, 1),
+        "peak_kb": round((peak - before) / 1024, 1),
+    }
@@ -0,0 +1,190 @@
+import codecs
+import csv
+import itertools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from book.autocomplete import record_changes_on_commit
+from book.cache import invalidate_catalog_on_commit
+from book.models import Book
+from book.serializers import BookSerializer
+
+
+IMPORT_BATCH_SIZE = 1_000
+IMPORT_MAX_ERRORS = 1_000
+EXPORT_CHUNK_SIZE = 2_000
+
+BOOK_FIELDS = ("title", "author", "cover", "inventory", "daily_fee")
+EXPORT_COLUMNS = ("id", *BOOK_FIELDS)
+
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+def detect_format(filename: str) -> str:
+    for extension, fmt in FORMATS.items():
+        if filename.lower().endswith(extension):
+            return fmt
+    raise ValueError(
+        f"Unsupported file type, expected one of {', '.join(FORMATS)}"
+    )
+
+
+def _decode(line: bytes, number: int) -> str:
+    if number == 1:
+        line = line.removeprefix(codecs.BOM_UTF8)
+    return line.decode("utf-8")
+
+
+def read_rows(stream, fmt: str):
+    """
+    Yields (row number, row) for a binary UTF-8 CSV or NDJSON stream, one
+    line at a time. A row that can not be decoded or parsed is yielded as
+    its error message. In a CSV, whose rows may span lines, nothing after
+    such a row is read.
+    """
+    if fmt == "csv":
+        lines = (
+            _decode(line, number)
+            for number, line in enumerate(stream, start=1)
+        )
+        number = 0
+        try:
+            for number, row in enumerate(csv.DictReader(lines), start=1):
+                yield number, row
+        except (UnicodeDecodeError, csv.Error) as error:
+            yield number + 1, (
+                f"Invalid CSV, the rest of the file was skipped: {error}"
+            )
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(_decode(line, number))
+        except UnicodeDecodeError as error:
+            yield number, f"Invalid UTF-8: {error}"
+            continue
+        except ValueError as error:
+            yield number, f"Invalid JSON: {error}"
+            continue
+        yield number, row if isinstance(row, dict) else "Expected an object"
+
+
+def import_books(rows, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Validates the rows with the rules of BookSerializer and writes them
+    batch by batch: a row with an id updates that book, one without
+    creates a new book. Each batch is its own transaction, invalid rows
+    are skipped and reported (the first IMPORT_MAX_ERRORS of them).
+    """
+    report = {"created": 0, "updated": 0, "failed": 0, "errors": []}
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        _import_batch(batch, report)
+    return report
+
+
+def _report_error(report: dict, number: int, errors) -> None:
+    report["failed"] += 1
+    if len(report["errors"]) < IMPORT_MAX_ERRORS:
+        report["errors"].append({"row": number, "errors": errors})
+
+
+def _import_batch(batch, report: dict) -> None:
+    serializer = BookSerializer()
+    new, updates = [], {}
+    for number, row in batch:
+        if isinstance(row, str):
+            _report_error(report, number, {"non_field_errors": [row]})
+            continue
+        try:
+            book_id = _parse_id(row.get("id"))
+            data = serializer.run_validation(row)
+        except ValidationError as error:
+            _report_error(report, number, error.detail)
+            continue
+        if book_id is None:
+            new.append(Book(**data))
+        else:
+            # The last row wins if a batch has the same id twice.
+            updates[book_id] = (number, Book(id=book_id, **data))
+
+    with transaction.atomic():
+        # Locked, so no book is deleted before the upsert brings it back.
+        existing = set(
+            Book.objects.select_for_update()
+            .filter(id__in=updates)
+            .values_list("id", flat=True)
+        )
+        for book_id, (number, _) in list(updates.items()):
+            if book_id not in existing:
+                del updates[book_id]
+                _report_error(
+                    report, number, {"id": ["No book with this id."]}
+                )
+
+        Book.objects.bulk_create(new)
+        Book.objects.bulk_create(
+            [book for _, book in updates.values()],
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=[*BOOK_FIELDS, "updated_at"],
+        )
+        # Bulk writes send no signals, the search vector and facet counts
+        # are kept by database triggers, the caches are refreshed here.
+        if new or updates:
+            invalidate_catalog_on_commit()
+            record_changes_on_commit(
+                [book.id for book in new] + list(updates)
+            )
+
+    report["created"] += len(new)
+    report["updated"] += len(updates)
+
+
+def _parse_id(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({"id": ["A valid integer is required."]})
+
+
+class _Echo:
+    """File-like object whose write returns the line csv.writer formats."""
+
+    def write(self, value):
+        return value
+
+
+def export_books(fmt: str):
+    """
+    Yields the whole catalog, ordered by id, in chunks of formatted lines.
+    Rows are read through a server-side cursor, so memory stays flat
+    however large the catalog is.
+    """
+    rows = (
+        Book.objects.order_by("id")
+        .values_list(*EXPORT_COLUMNS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    writer = csv.writer(_Echo())
+    if fmt == "csv":
+        yield writer.writerow(EXPORT_COLUMNS)
+
+    while chunk := list(itertools.islice(rows, EXPORT_CHUNK_SIZE)):
+        if fmt == "csv":
+            yield "".join(writer.writerow(row) for row in chunk)
+        else:
+            yield "".join(
+                json.dumps(
+                    dict(zip(EXPORT_COLUMNS, row)), cls=DjangoJSONEncoder
+                )
+                + "\n"
+                for row in chunk
+            )
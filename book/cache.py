@@ -0,0 +1,77 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+CATALOG_VERSION_KEY = "book:catalog:version"
+CATALOG_HITS_KEY = "book:catalog:hits"
+CATALOG_MISSES_KEY = "book:catalog:misses"
+
+
+def _incr(key: str) -> int:
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def _initial_version() -> int:
+    # Seeded from the clock rather than 1, so a version key that got evicted
+    # never comes back with a number older entries are still stored under.
+    return int(time.time() * 1000)
+
+
+def catalog_version() -> int | None:
+    """None while the cache is unreachable (its errors are ignored)."""
+    return cache.get_or_set(
+        CATALOG_VERSION_KEY, _initial_version, timeout=None
+    )
+
+
+def catalog_cache_key(request, version: int) -> str:
+    """
+    One entry per catalog version and full url (query string included),
+    so bumping the version invalidates every cached page at once. The
+    version is the one the caller read, e.g. for its ETag.
+    """
+    url_hash = hashlib.md5(
+        request.build_absolute_uri().encode("utf-8")
+    ).hexdigest()
+    return f"book:catalog:v{version}:{url_hash}"
+
+
+def invalidate_catalog() -> None:
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+
+
+def get_cached_catalog(key: str):
+    data = cache.get(key)
+    _incr(CATALOG_MISSES_KEY if data is None else CATALOG_HITS_KEY)
+    return data
+
+
+def set_cached_catalog(key: str, data) -> None:
+    cache.set(key, data, CATALOG_CACHE_TIMEOUT)
+
+
+def catalog_cache_stats() -> dict:
+    stats = cache.get_many([CATALOG_HITS_KEY, CATALOG_MISSES_KEY])
+    return {
+        "hits": stats.get(CATALOG_HITS_KEY, 0),
+        "misses": stats.get(CATALOG_MISSES_KEY, 0),
+    }
+
+
+def invalidate_catalog_on_commit() -> None:
+    # The immediate bump drops pages cached before the write, the one on
+    # commit drops pages other requests cached from the pre-commit state.
+    invalidate_catalog()
+    transaction.on_commit(invalidate_catalog)
@@ -0,0 +1,66 @@
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def version_etag(pk, version) -> str:
+    return quote_etag(f"{pk}-{int(version.timestamp() * 1_000_000)}")
+
+
+def set_validators(response, etag, version=None):
+    response["ETag"] = etag
+    if version is not None:
+        response["Last-Modified"] = http_date(version.timestamp())
+    return response
+
+
+class ConditionalRetrieveMixin:
+    """
+    Answers conditional GETs of one object (If-None-Match and
+    If-Modified-Since) with 304 before anything is serialized.
+    The object's version, the latest updated_at of everything its
+    representation shows, comes from a single query that also loads
+    what the object permissions need.
+    """
+
+    def get_version_queryset(self):
+        """
+        The objects annotated with their `version`: by default their own
+        updated_at, views showing related objects take theirs into account.
+        """
+        return self.get_queryset().annotate(version=F("updated_at"))
+
+    def get_versioned_object(self, queryset=None):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if queryset is None:
+            queryset = self.get_version_queryset()
+        obj = get_object_or_404(
+            queryset,
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def check_preconditions(self, obj):
+        """Returns the 304/412 response if a condition fails, else None."""
+        etag = version_etag(obj.pk, obj.version)
+        response = get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=int(obj.version.timestamp()),
+        )
+        if response is not None:
+            set_validators(response, etag, obj.version)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        obj = self.get_versioned_object()
+        response = self.check_preconditions(obj)
+        if response is not None:
+            return response
+
+        response = super().retrieve(request, *args, **kwargs)
+        return set_validators(
+            response, version_etag(obj.pk, obj.version), obj.version
+        )
@@ -0,0 +1,32 @@
+from book.models import Book, BookFacet
+
+
+FACET_TOP_AUTHORS = 20
+
+
+def facet_counts(author: str | None = None) -> dict:
+    """
+    Catalog-wide number of books per cover, availability and author
+    (the most prolific ones, plus `author` if given), read from the
+    trigger-maintained summary table with a single query.
+    """
+    fixed = BookFacet.objects.filter(facet__in=("cover", "available"))
+    if author:
+        fixed = fixed | BookFacet.objects.filter(facet="author", value=author)
+    top_authors = BookFacet.objects.filter(
+        facet="author", count__gt=0
+    ).order_by("-count", "value")[:FACET_TOP_AUTHORS]
+
+    facets = {
+        "cover": dict.fromkeys(Book.CoverChoices.values, 0),
+        "available": {"true": 0, "false": 0},
+        "author": {},
+    }
+    rows = fixed.values_list("facet", "value", "count").union(
+        top_authors.values_list("facet", "value", "count"), all=True
+    )
+    for facet, value, count in sorted(rows, key=lambda r: (-r[2], r[1])):
+        facets[facet][value] = count
+    if author:
+        facets["author"].setdefault(author, 0)
+    return facets
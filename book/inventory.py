@@ -0,0 +1,71 @@
+from django.db.models import Case, F, Value, When
+
+from book.cache import invalidate_catalog_on_commit
+from book.models import Book
+
+
+def take_copy(book_id: int) -> bool:
+    """
+    Decrements the inventory in a single conditional UPDATE, so concurrent
+    borrows can never oversell the last copy.
+    Returns False if there was no copy left.
+    """
+    taken = Book.objects.filter(pk=book_id, inventory__gt=0).update(
+        inventory=F("inventory") - 1
+    )
+    if taken:
+        invalidate_catalog_on_commit()
+    return bool(taken)
+
+
+def return_copy(book_id: int) -> None:
+    Book.objects.filter(pk=book_id).update(inventory=F("inventory") + 1)
+    invalidate_catalog_on_commit()
+
+
+def take_copies(book_ids: list[int]) -> tuple[list[Book], list[int]]:
+    """
+    Takes one copy of each book, all or nothing, with a single UPDATE.
+    The books are locked in id order first, so checkouts of overlapping
+    books wait for each other instead of deadlocking.
+    Returns the locked books and the ids of the ones missing or out of
+    stock; if there are any, nothing is taken. Call in a transaction.
+    """
+    books = list(
+        Book.objects.select_for_update()
+        .filter(id__in=book_ids)
+        .order_by("id")
+    )
+    available = {book.id for book in books if book.inventory > 0}
+    unavailable = [
+        book_id for book_id in book_ids if book_id not in available
+    ]
+    if unavailable:
+        return books, unavailable
+
+    Book.objects.filter(id__in=book_ids).update(inventory=F("inventory") - 1)
+    for book in books:
+        book.inventory -= 1
+    invalidate_catalog_on_commit()
+    return books, []
+
+
+def return_copies(book_counts: dict[int, int]) -> None:
+    """
+    Puts back the given number of copies of each book with a single
+    UPDATE. Rows are locked in id order first, like take_copies does.
+    """
+    if not book_counts:
+        return
+    books = Book.objects.filter(id__in=book_counts)
+    list(books.select_for_update().order_by("id").values_list("id"))
+    books.update(
+        inventory=F("inventory")
+        + Case(
+            *[
+                When(id=book_id, then=Value(count))
+                for book_id, count in book_counts.items()
+            ]
+        )
+    )
+    invalidate_catalog_on_commit()
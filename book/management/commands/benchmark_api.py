@@ -0,0 +1,87 @@
+import json
+import platform
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from book.benchmark import ENDPOINTS, make_clients, measure, prepare_fixtures
+from book.management.benchmarking import Rollback
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs every API endpoint against seeded datasets of several sizes "
+        "(rolled back afterwards) and reports query counts, p50/p95 latency "
+        "and allocations as JSON. Fails if a query budget is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1_000, 10_000, 100_000],
+            help="Numbers of borrowings to seed, one run each.",
+        )
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--output", help="Write the report to this file (default stdout)."
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        report = {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "repeat": options["repeat"],
+            "results": [],
+        }
+        for size in options["sizes"]:
+            report["results"] += self.run(
+                size, options["repeat"], options["seed"]
+            )
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        over_budget = [
+            f"{result['endpoint']} ({result['size']}): "
+            f"{result['queries']} > {result['max_queries']} queries"
+            for result in report["results"]
+            if result["queries"] > result["max_queries"]
+        ]
+        if over_budget:
+            raise CommandError(
+                "Query budget exceeded: " + "; ".join(over_budget)
+            )
+
+    def run(self, size, repeat, seed):
+        results = []
+        try:
+            with transaction.atomic():
+                call_command(
+                    "seed_library",
+                    users=max(size // 20, 1),
+                    books=max(size // 10, 1),
+                    borrowings=size,
+                    seed=seed,
+                    stdout=self.stderr,
+                )
+                fixtures = prepare_fixtures()
+                clients = make_clients(fixtures)
+                for endpoint in ENDPOINTS:
+                    self.stderr.write(f"{size}: {endpoint.name}")
+                    result = measure(endpoint, clients, fixtures, repeat)
+                    results.append({"size": size, **result})
+                raise Rollback
+        except Rollback:
+            return results
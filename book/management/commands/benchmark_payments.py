@@ -0,0 +1,158 @@
+import datetime
+import json
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from book.management.benchmarking import Rollback
+from book.models import Book, Payment
+from book.stripe_gateway import get_gateway
+from book.tasks import create_checkout_session
+from book.testing.fake_stripe import FakeStripeServer
+
+
+STEPS = ("borrow", "session", "confirm")
+
+
+def summary(timings: list[float]) -> dict:
+    timings = sorted(timings)
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[max(int(len(timings) * 0.95) - 1, 0)], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the whole payment flow (borrow, checkout session, payment, "
+        "confirmation) against a local fake Stripe answering after the "
+        "given latency, fully offline and rolled back afterwards, and "
+        "reports the throughput and the latency of every step as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flows", type=int, default=200)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.05,
+            help="Seconds the fake Stripe takes to answer each call.",
+        )
+        parser.add_argument(
+            "--confirm",
+            choices=("success", "webhook"),
+            default="success",
+            help="Confirm payments through the success redirect, which "
+            "calls Stripe, or through signed webhook events.",
+        )
+        parser.add_argument(
+            "--fixtures", help="Start the fake Stripe from this JSON file."
+        )
+        parser.add_argument(
+            "--record", help="Save the fake Stripe's state to this file."
+        )
+
+    def handle(self, *args, **options):
+        if options["flows"] < 1:
+            raise CommandError("--flows must be at least 1.")
+
+        with FakeStripeServer(
+            latency=options["latency"], fixtures=options["fixtures"]
+        ) as server, override_settings(
+            STRIPE_API_BASE=server.api_base,
+            STRIPE_SECRET_KEY="sk_test_benchmark",
+            STRIPE_WEBHOOK_SECRET=server.webhook_secret,
+        ):
+            try:
+                with transaction.atomic():
+                    report = self.run(
+                        server, options["flows"], options["confirm"]
+                    )
+                    raise Rollback
+            except Rollback:
+                pass
+            if options["record"]:
+                server.save(options["record"])
+
+        report.update(
+            latency=options["latency"],
+            confirm=options["confirm"],
+            stripe_requests=len(server.requests),
+        )
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, server, flows, confirm):
+        reader = get_user_model().objects.create_user(
+            email="bench-payments@library.test", password="bench-Passw0rd!"
+        )
+        book = Book.objects.create(
+            title="Benchmark",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=flows,
+            daily_fee=Decimal("1.50"),
+        )
+        client = APIClient(SERVER_NAME="localhost", REMOTE_ADDR="10.0.0.1")
+        client.force_authenticate(reader)
+        payload = {
+            "book": book.id,
+            "expected_return_date": datetime.date.today()
+            + datetime.timedelta(days=7),
+        }
+
+        timings = {step: [] for step in STEPS}
+        start = time.perf_counter()
+        for _ in range(flows):
+            step = time.perf_counter()
+            response = client.post(reverse("book:borrow-list"), payload)
+            if response.status_code != 202:
+                raise CommandError(f"Borrowing failed: {response.data}")
+            timings["borrow"].append(time.perf_counter() - step)
+
+            # What the celery worker does once the borrowing commits.
+            payment = Payment.objects.get(id=response.data["id"])
+            step = time.perf_counter()
+            create_checkout_session(payment.outbox_id)
+            timings["session"].append(time.perf_counter() - step)
+
+            payment.refresh_from_db()
+            server.pay(payment.session_id)
+            step = time.perf_counter()
+            if confirm == "webhook":
+                event, signature = server.event(
+                    "checkout.session.completed", payment.session_id
+                )
+                response = client.generic(
+                    "POST",
+                    reverse("book:stripe-webhook"),
+                    event,
+                    content_type="application/json",
+                    HTTP_STRIPE_SIGNATURE=signature,
+                )
+            else:
+                response = client.get(
+                    reverse("book:payment-success", args=[payment.id])
+                )
+            if response.status_code != 200:
+                raise CommandError(f"Confirmation failed: {response.data}")
+            timings["confirm"].append(time.perf_counter() - step)
+        seconds = time.perf_counter() - start
+
+        return {
+            "flows": flows,
+            "seconds": round(seconds, 3),
+            "flows_per_second": round(flows / seconds, 1),
+            "steps": {
+                step: summary([t * 1000 for t in timings[step]])
+                for step in STEPS
+            },
+            "gateway": get_gateway().metrics(),
+        }
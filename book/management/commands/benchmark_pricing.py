@@ -0,0 +1,109 @@
+import datetime
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from book.management.benchmarking import Rollback, seed
+from book.models import Book, Borrowing
+from book.pricing import (
+    FinePolicy,
+    annotate_fees,
+    fine,
+    outstanding_fines,
+    rental_fee,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Prices every borrowing of a synthetic dataset (rolled back "
+        "afterwards) with one SQL aggregate and borrowing by borrowing in "
+        "Python, checks that both agree and prints the timings as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--borrowings",
+            type=int,
+            default=1_000_000,
+            help="Borrowings to seed, 0 to use existing data.",
+        )
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--books", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This benchmark needs PostgreSQL.")
+
+        try:
+            with transaction.atomic():
+                if options["borrowings"]:
+                    self.stderr.write("Seeding...")
+                    seed(
+                        options["users"],
+                        options["books"],
+                        options["borrowings"],
+                    )
+                with connection.cursor() as cursor:
+                    for model in (Book, Borrowing):
+                        cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+                report = self.measure(FinePolicy.from_settings())
+                self.stdout.write(json.dumps(report, indent=2))
+                if report["sql"]["totals"] != report["python"]["totals"]:
+                    raise CommandError("SQL and Python prices differ.")
+                raise Rollback
+        except Rollback:
+            pass
+
+    @staticmethod
+    def measure(policy):
+        today = datetime.date.today()
+
+        start = time.perf_counter()
+        sql = annotate_fees(Borrowing.objects.order_by(), policy, today)
+        sql = sql.aggregate(rental_fees=Sum("rental_fee"), fines=Sum("fine"))
+        sql_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        outstanding = outstanding_fines(policy, today)
+        outstanding_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        python = {"rental_fees": 0, "fines": 0}
+        borrowings = (
+            Borrowing.objects.order_by()
+            .select_related("book")
+            .only(
+                "borrow_date",
+                "expected_return_date",
+                "actual_return_date",
+                "book__daily_fee",
+            )
+        )
+        count = 0
+        for borrowing in borrowings.iterator(chunk_size=10_000):
+            python["rental_fees"] += rental_fee(borrowing)
+            python["fines"] += fine(borrowing, policy, today)
+            count += 1
+        python_seconds = time.perf_counter() - start
+
+        return {
+            "borrowings": count,
+            "sql": {
+                "seconds": round(sql_seconds, 3),
+                "totals": {key: str(value) for key, value in sql.items()},
+            },
+            "python": {
+                "seconds": round(python_seconds, 3),
+                "totals": {key: str(value) for key, value in python.items()},
+            },
+            "outstanding_fines": {
+                "seconds": round(outstanding_seconds, 3),
+                "total": str(outstanding),
+            },
+            "speedup": round(python_seconds / sql_seconds, 1),
+        }
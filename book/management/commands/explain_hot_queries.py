@@ -0,0 +1,168 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from book.management.benchmarking import Rollback, seed
+from book.models import Book, Borrowing, Payment
+from book.pagination import BookPagination, BorrowingPagination
+
+
+HOT_INDEXES = (
+    "borrowing_active_due_idx",
+    "borrowing_user_returned_idx",
+    "payment_pending_borrowing_idx",
+    "book_daily_fee_id_idx",
+    "borrowing_borrow_date_id_idx",
+)
+
+
+def deep_page(queryset, pagination, depth: int):
+    """The page `depth` rows in, as requested through a cursor."""
+    ordering = pagination.ordering
+    queryset = queryset.order_by(*ordering)
+    position = queryset.values_list(
+        *(field.lstrip("-") for field in ordering)
+    )[depth : depth + 1].first()
+    if position is None:
+        return queryset[: pagination.page_size + 1]
+    return queryset.filter(pagination().seek(ordering, position))[
+        : pagination.page_size + 1
+    ]
+
+
+def hot_queries():
+    today = datetime.date.today()
+    user_id = Borrowing.objects.values_list("user_id", flat=True)[:1]
+    return {
+        "book page at a deep cursor": deep_page(
+            Book.objects.all(), BookPagination, 40_000
+        ),
+        "borrowing page at a deep cursor": deep_page(
+            Borrowing.objects.all(), BorrowingPagination, 1_000_000
+        ),
+        "overdue sweep": Borrowing.objects.filter(
+            actual_return_date__isnull=True,
+            expected_return_date__lte=today + datetime.timedelta(days=1),
+        ).order_by(),
+        "active borrowings of a user": Borrowing.objects.filter(
+            user_id__in=user_id, actual_return_date__isnull=True
+        ).order_by(),
+        "pending payments of a user": Payment.objects.filter(
+            borrowing__user_id__in=user_id, status="PENDING"
+        ).order_by()[:1],
+        "payment by session_id": Payment.objects.filter(
+            session_id="cs_seed_4242"
+        ).order_by(),
+    }
+
+
+def summarize(plan: dict) -> str:
+    """
+    Flattens a JSON plan into e.g. 'Index Scan (<index name>: <index
+    condition>)'.
+    """
+    nodes = []
+
+    def walk(node):
+        name = node["Node Type"]
+        if "Index Cond" in node:
+            name += f" ({node['Index Name']}: {node['Index Cond']})"
+        elif "Index Name" in node:
+            name += f" ({node['Index Name']})"
+        elif "Relation Name" in node:
+            name += f" ({node['Relation Name']})"
+        nodes.append(name)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    summary = " > ".join(nodes)
+    if "Execution Time" in plan:
+        summary += f" [{plan['Execution Time']:.2f} ms]"
+    return summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic dataset inside a transaction that is rolled back, "
+        "and prints the EXPLAIN plans of the hot borrowing/payment filters "
+        "with and without their indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--borrowings",
+            type=int,
+            default=10_000_000,
+            help="Borrowings (and payments) to seed, 0 to use existing data.",
+        )
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--books", type=int, default=50_000)
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run EXPLAIN ANALYZE to include execution times.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This benchmark needs PostgreSQL.")
+
+        try:
+            with transaction.atomic():
+                if options["borrowings"]:
+                    self.stdout.write("Seeding...")
+                    seed(
+                        options["users"],
+                        options["books"],
+                        options["borrowings"],
+                    )
+
+                with connection.cursor() as cursor:
+                    for model in (Book, Borrowing, Payment):
+                        cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+                after = self.explain_all(options["analyze"])
+                self.drop_hot_indexes()
+                before = self.explain_all(options["analyze"])
+
+                for name in after:
+                    self.stdout.write(self.style.MIGRATE_HEADING(name))
+                    self.stdout.write(f"  without indexes: {before[name]}")
+                    self.stdout.write(f"  with indexes:    {after[name]}")
+
+                raise Rollback
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS("Done, data rolled back."))
+
+    def explain_all(self, analyze):
+        return {
+            name: summarize(
+                json.loads(queryset.explain(format="json", analyze=analyze))[
+                    0
+                ]
+            )
+            for name, queryset in hot_queries().items()
+        }
+
+    def drop_hot_indexes(self):
+        table = Payment._meta.db_table
+        with connection.cursor() as cursor:
+            # Deferred foreign key checks of the seeded rows would block
+            # ALTER TABLE, so run them now.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            constraints = connection.introspection.get_constraints(
+                cursor, table
+            )
+            for name, info in constraints.items():
+                if info["columns"] == ["session_id"]:
+                    if info["unique"]:
+                        cursor.execute(
+                            f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'
+                        )
+                    else:
+                        cursor.execute(f'DROP INDEX "{name}"')
+            for name in HOT_INDEXES:
+                cursor.execute(f'DROP INDEX "{name}"')
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book.bulk import (
+    IMPORT_BATCH_SIZE,
+    detect_format,
+    import_books,
+    read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates and updates books from a .csv or .ndjson file with the "
+        "columns id, title, author, cover, inventory and daily_fee. "
+        "Rows with an id update that book, rows without one create a book."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "ndjson"),
+            help="Defaults to the one of the file extension.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=IMPORT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fmt = options["format"] or detect_format(options["path"])
+        except ValueError as error:
+            raise CommandError(error)
+
+        try:
+            with open(options["path"], "rb") as stream:
+                report = import_books(
+                    read_rows(stream, fmt), options["batch_size"]
+                )
+        except OSError as error:
+            raise CommandError(error)
+
+        for error in report["errors"]:
+            self.stderr.write(
+                f"Row {error['row']}: {json.dumps(error['errors'])}"
+            )
+        self.stdout.write(
+            f"{report['created']} created, {report['updated']} updated, "
+            f"{report['failed']} failed."
+        )
@@ -0,0 +1,249 @@
+import datetime
+import itertools
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from book.models import Book, Borrowing, Payment
+from book.pricing import FinePolicy, fine, rental_fee
+
+
+HISTORY_DAYS = 3 * 365
+NOON = datetime.time(12)
+
+
+def bulk_create_dated(model, objects: list, name: str) -> list:
+    """
+    bulk_create keeping the objects' own `name` dates, which auto_now_add
+    stamps with today on insert: they are written back in one UPDATE.
+    """
+    dates = [getattr(obj, name) for obj in objects]
+    objects = model.objects.bulk_create(objects)
+    field = model._meta.get_field(name)
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {connection.ops.quote_name(field.column)}"
+            f" = dates.value FROM unnest(%s::bigint[],"
+            f" %s::{field.db_type(connection)}[]) AS dates(id, value)"
+            f" WHERE {table}.id = dates.id",
+            [[obj.pk for obj in objects], dates],
+        )
+    for obj, date in zip(objects, dates):
+        setattr(obj, name, date)
+    return objects
+
+
+def at_noon(day: datetime.date) -> datetime.datetime:
+    return timezone.make_aware(datetime.datetime.combine(day, NOON))
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    """Cumulative weights where the item of rank k is picked ~ 1 / k**s."""
+    return list(
+        itertools.accumulate(
+            1 / rank**exponent for rank in range(1, count + 1)
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generates users, books, borrowings and payments. "
+        "The same --seed on the same database produces the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--books", type=int, default=5_000)
+        parser.add_argument("--borrowings", type=int, default=100_000)
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Exponent of the book popularity distribution, 0 = uniform.",
+        )
+        parser.add_argument(
+            "--active-ratio",
+            type=float,
+            default=0.05,
+            help="Share of borrowings that are not returned yet.",
+        )
+        parser.add_argument(
+            "--overdue-ratio",
+            type=float,
+            default=0.2,
+            help="Share of active borrowings past their return date "
+            "(and of returned ones returned late, with a fine).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        for ratio in ("active_ratio", "overdue_ratio"):
+            if not 0 <= options[ratio] <= 1:
+                raise CommandError(f"--{ratio.replace('_', '-')} is 0..1")
+        if options["borrowings"] and not (
+            options["users"] and options["books"]
+        ):
+            raise CommandError("Borrowings need at least one user and book.")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.today = datetime.date.today()
+
+        with transaction.atomic():
+            user_ids = self.create_users(options["users"])
+            books = self.create_books(options["books"])
+            borrowings, payments = self.create_borrowings(
+                options["borrowings"],
+                user_ids,
+                books,
+                zipf_weights(len(books), options["zipf"]),
+                options["active_ratio"],
+                options["overdue_ratio"],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(user_ids)} users, {len(books)} books, "
+                f"{borrowings} borrowings and {payments} payments."
+            )
+        )
+
+    def bulk_create(self, model, objects):
+        created = []
+        for start in range(0, len(objects), self.batch_size):
+            created += model.objects.bulk_create(
+                objects[start : start + self.batch_size]
+            )
+        return created
+
+    def create_users(self, count):
+        User = get_user_model()
+        offset = User.objects.count()
+        # Hashing is deliberately slow, so every seeded user shares one hash.
+        password = make_password("seed-password")
+        users = self.bulk_create(
+            User,
+            [
+                User(
+                    email=f"seed{offset + i}@library.test",
+                    first_name=f"Reader{offset + i}",
+                    password=password,
+                )
+                for i in range(count)
+            ],
+        )
+        return [user.id for user in users]
+
+    def create_books(self, count):
+        rng = self.rng
+        return self.bulk_create(
+            Book,
+            [
+                Book(
+                    title=f"Book {i}",
+                    author=f"Author {rng.randrange(max(count // 5, 1))}",
+                    cover=rng.choice(Book.CoverChoices.values),
+                    inventory=rng.randint(0, 20),
+                    daily_fee=Decimal(rng.randint(10, 500)) / 100,
+                )
+                for i in range(count)
+            ],
+        )
+
+    def create_borrowings(
+        self, count, user_ids, books, weights, active_ratio, overdue_ratio
+    ):
+        """
+        Generated batch by batch, so memory stays flat for large counts;
+        every borrowing gets a paid PAYMENT, late returns a paid FINE.
+        """
+        rng = self.rng
+        policy = FinePolicy.from_settings()
+        borrowing_total = payment_total = 0
+
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            picked = rng.choices(books, cum_weights=weights, k=size)
+            borrowings = []
+            for book in picked:
+                period = rng.randint(3, 30)
+                active = rng.random() < active_ratio
+                overdue = rng.random() < overdue_ratio
+                if active and overdue:
+                    borrow_date = self.today - datetime.timedelta(
+                        days=period + rng.randint(1, 60)
+                    )
+                elif active:
+                    borrow_date = self.today - datetime.timedelta(
+                        days=rng.randint(0, period)
+                    )
+                else:
+                    borrow_date = self.today - datetime.timedelta(
+                        days=rng.randint(period, HISTORY_DAYS)
+                    )
+                expected = borrow_date + datetime.timedelta(days=period)
+                if active:
+                    returned = None
+                elif overdue:
+                    returned = expected + datetime.timedelta(
+                        days=rng.randint(1, 14)
+                    )
+                else:
+                    returned = borrow_date + datetime.timedelta(
+                        days=rng.randint(0, period)
+                    )
+                borrowings.append(
+                    Borrowing(
+                        borrow_date=borrow_date,
+                        expected_return_date=expected,
+                        actual_return_date=min(returned, self.today)
+                        if returned
+                        else None,
+                        book=book,
+                        user_id=rng.choice(user_ids),
+                    )
+                )
+
+            borrowings = bulk_create_dated(
+                Borrowing, borrowings, "borrow_date"
+            )
+
+            payments = []
+            for borrowing in borrowings:
+                payments.append(
+                    Payment(
+                        borrowing=borrowing,
+                        status="PAID",
+                        type="PAYMENT",
+                        money_to_pay=rental_fee(borrowing),
+                        created_at=at_noon(borrowing.borrow_date),
+                    )
+                )
+                amount = borrowing.actual_return_date and fine(
+                    borrowing, policy
+                )
+                if amount:
+                    payments.append(
+                        Payment(
+                            borrowing=borrowing,
+                            status="PAID",
+                            type="FINE",
+                            money_to_pay=amount,
+                            created_at=at_noon(borrowing.actual_return_date),
+                        )
+                    )
+            bulk_create_dated(Payment, payments, "created_at")
+
+            borrowing_total += len(borrowings)
+            payment_total += len(payments)
+            self.stdout.write(f"{borrowing_total}/{count} borrowings...")
+
+        return borrowing_total, payment_total
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0010_alter_borrowing_options"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="book",
+            options={"ordering": ["-daily_fee", "id"]},
+        ),
+        migrations.AlterModelOptions(
+            name="borrowing",
+            options={"ordering": ["-borrow_date", "id"]},
+        ),
+        migrations.AlterModelOptions(
+            name="payment",
+            options={"ordering": ["id"]},
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["-daily_fee", "id"], name="book_daily_fee_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["-borrow_date", "id"],
+                name="borrowing_borrow_date_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["user", "-borrow_date", "id"],
+                name="borrowing_user_date_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:06
+
+from django.db import migrations, models
+
+
+# Statement-level triggers see all rows of a bulk insert/update at once
+# through transition tables and apply the net change with one upsert,
+# ordered by key to avoid deadlocks. Updates that move no book between
+# facets (e.g. inventory 5 -> 4) change nothing and take no row locks.
+FACET_UPSERT = """
+    WITH changes AS ({changes}),
+    deltas AS (
+        SELECT 'cover' AS facet, cover AS value, delta FROM changes
+        UNION ALL
+        SELECT 'author', author, delta FROM changes
+        UNION ALL
+        SELECT 'available', CASE WHEN available THEN 'true' ELSE 'false' END,
+               delta
+        FROM changes
+    )
+    INSERT INTO book_bookfacet (facet, value, count)
+    SELECT facet, value, sum(delta) FROM deltas
+    GROUP BY facet, value
+    HAVING sum(delta) <> 0
+    ORDER BY facet, value
+    ON CONFLICT (facet, value)
+    DO UPDATE SET count = book_bookfacet.count + EXCLUDED.count;
+"""
+
+ADDED_ROWS = """
+    SELECT cover, author, inventory > 0 AS available, 1 AS delta FROM {}
+"""
+REMOVED_ROWS = """
+    SELECT cover, author, inventory > 0 AS available, -1 AS delta
+    FROM old_rows
+"""
+UPDATED_ROWS = ADDED_ROWS.format("new_rows") + "UNION ALL" + REMOVED_ROWS
+
+FACET_TRIGGERS = f"""
+CREATE FUNCTION book_facet_refresh() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {FACET_UPSERT.format(changes=ADDED_ROWS.format("new_rows"))}
+    ELSIF TG_OP = 'DELETE' THEN
+        {FACET_UPSERT.format(changes=REMOVED_ROWS)}
+    ELSE
+        {FACET_UPSERT.format(changes=UPDATED_ROWS)}
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER book_facet_insert AFTER INSERT ON book_book
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION book_facet_refresh();
+
+CREATE TRIGGER book_facet_update AFTER UPDATE ON book_book
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION book_facet_refresh();
+
+CREATE TRIGGER book_facet_delete AFTER DELETE ON book_book
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION book_facet_refresh();
+
+{FACET_UPSERT.format(changes=ADDED_ROWS.format("book_book"))}
+"""
+
+DROP_FACET_TRIGGERS = """
+DROP TRIGGER book_facet_insert ON book_book;
+DROP TRIGGER book_facet_update ON book_book;
+DROP TRIGGER book_facet_delete ON book_book;
+DROP FUNCTION book_facet_refresh();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0017_book_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookFacet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("facet", models.CharField(max_length=20)),
+                ("value", models.CharField(max_length=255)),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["facet", "-count"],
+                        name="book_facet_count_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="bookfacet",
+            constraint=models.UniqueConstraint(
+                fields=("facet", "value"), name="book_facet_value_unique"
+            ),
+        ),
+        migrations.RunSQL(FACET_TRIGGERS, DROP_FACET_TRIGGERS),
+    ]
@@ -0,0 +1,67 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+TOUCHED_TABLES = ("book_book", "book_borrowing", "book_payment")
+
+# Queryset updates bypass auto_now, so the database bumps updated_at
+# whenever a row really changes and the statement did not set it itself.
+TOUCH_TRIGGERS = """
+CREATE FUNCTION touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+        NEW.updated_at := clock_timestamp();
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+""" + "".join(
+    f"""
+CREATE TRIGGER {table}_touch BEFORE UPDATE ON {table}
+FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW)
+EXECUTE FUNCTION touch_updated_at();
+"""
+    for table in TOUCHED_TABLES
+)
+
+DROP_TOUCH_TRIGGERS = (
+    "".join(
+        f"DROP TRIGGER {table}_touch ON {table};\n"
+        for table in TOUCHED_TABLES
+    )
+    + "DROP FUNCTION touch_updated_at();"
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0018_book_facets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="borrowing",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(TOUCH_TRIGGERS, DROP_TOUCH_TRIGGERS),
+    ]
@@ -0,0 +1,164 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# Existing payments are dated the day their borrowing started, or was
+# returned for fines (local midnight), rather than the day of this
+# migration. The rollups, created empty here, are then first computed
+# from these dates.
+BACKFILL_PAYMENT_CREATED_AT = """
+UPDATE book_payment AS payment
+SET created_at = (
+    CASE WHEN payment.type = 'FINE'
+    THEN COALESCE(borrowing.actual_return_date, borrowing.borrow_date)
+    ELSE borrowing.borrow_date END
+)::timestamp AT TIME ZONE %s
+FROM book_borrowing AS borrowing
+WHERE borrowing.id = payment.borrowing_id
+"""
+
+
+def backfill_payment_created_at(apps, schema_editor):
+    schema_editor.execute(BACKFILL_PAYMENT_CREATED_AT, [settings.TIME_ZONE])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0020_payment_shared_session"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BorrowingDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("started", models.PositiveIntegerField(default=0)),
+                ("returned", models.PositiveIntegerField(default=0)),
+                ("returned_late", models.PositiveIntegerField(default=0)),
+                (
+                    "overdue",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                (
+                    "projected_fines",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=14, null=True
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["day"],
+            },
+        ),
+        migrations.CreateModel(
+            name="PaymentDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PAID", "Paid"),
+                            ("PENDING", "Pending"),
+                            ("EXPIRED", "Expired"),
+                        ],
+                        max_length=7,
+                    ),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("PAYMENT", "Payment"), ("FINE", "Fine")],
+                        max_length=7,
+                    ),
+                ),
+                ("count", models.PositiveIntegerField()),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, max_digits=14),
+                ),
+            ],
+            options={
+                "ordering": ["day", "status", "type"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["actual_return_date"], name="borrowing_returned_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["updated_at"], name="borrowing_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["created_at"], name="payment_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["updated_at"], name="payment_updated_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="paymentdailyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "status", "type"),
+                name="payment_rollup_day_unique",
+            ),
+        ),
+        migrations.RunPython(
+            backfill_payment_created_at, migrations.RunPython.noop
+        ),
+    ]
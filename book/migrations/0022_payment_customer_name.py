@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0021_analytics_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="customer_name",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
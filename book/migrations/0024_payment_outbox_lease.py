@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0023_reconciliation_runs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="paymentoutbox",
+            name="leased_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
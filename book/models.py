@@ -1,4 +1,8 @@
+import uuid
+
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
@@ -12,9 +16,30 @@ class Book(models.Model):
     cover = models.CharField(max_length=10, choices=CoverChoices.choices)
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=6, decimal_places=2)
+    # Weighted title (A) and author (B) lexemes, maintained by a database
+    # trigger, so bulk inserts and queryset updates keep it current too.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Also bumped by a trigger on queryset updates (e.g. inventory).
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ["-daily_fee"]
+        ordering = ["-daily_fee", "id"]
+        indexes = [
+            models.Index(
+                fields=["-daily_fee", "id"], name="book_daily_fee_id_idx"
+            ),
+            GinIndex(fields=["search_vector"], name="book_search_vector_idx"),
+            GinIndex(
+                fields=["title"],
+                name="book_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                fields=["author"],
+                name="book_author_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
 
     @property
     def is_available(self) -> bool:
@@ -27,6 +52,33 @@ class Book(models.Model):
         )
 
 
+class BookFacet(models.Model):
+    """
+    Number of books per cover, author and availability, kept current by
+    database triggers on the book table (see migration 0018), so facet
+    counts never need a GROUP BY over the catalog.
+    """
+
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["facet", "value"], name="book_facet_value_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["facet", "-count"], name="book_facet_count_idx"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.facet}={self.value}: {self.count}"
+
+
 class Borrowing(models.Model):
     borrow_date = models.DateField(auto_now_add=True)
     expected_return_date = models.DateField()
@@ -39,9 +91,34 @@ class Borrowing(models.Model):
         on_delete=models.CASCADE,
         related_name="borrowings",
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ["-borrow_date"]
+        ordering = ["-borrow_date", "id"]
+        indexes = [
+            models.Index(
+                fields=["-borrow_date", "id"],
+                name="borrowing_borrow_date_id_idx",
+            ),
+            models.Index(
+                fields=["user", "-borrow_date", "id"],
+                name="borrowing_user_date_id_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_active_due_idx",
+            ),
+            models.Index(
+                fields=["user", "actual_return_date"],
+                name="borrowing_user_returned_idx",
+            ),
+            models.Index(
+                fields=["actual_return_date"],
+                name="borrowing_returned_idx",
+            ),
+            models.Index(fields=["updated_at"], name="borrowing_updated_idx"),
+        ]
 
     @property
     def is_active(self) -> bool:
@@ -54,6 +131,38 @@ class Borrowing(models.Model):
         )
 
 
+class PaymentOutbox(models.Model):
+    """
+    A Stripe checkout session that still has to be created for its payments.
+    Written in the same transaction as the payments and processed by a
+    celery worker, so the request never waits for Stripe.
+    """
+
+    idempotency_key = models.UUIDField(
+        default=uuid.uuid4, unique=True, editable=False
+    )
+    success_url = models.URLField(max_length=512)
+    cancel_url = models.URLField(max_length=512)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # Claimed by a worker calling Stripe until then.
+    leased_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(processed_at__isnull=True),
+                name="outbox_unprocessed_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"outbox #{self.id} (processed: {self.processed_at})"
+
+
 class Payment(models.Model):
     class StatusChoices(models.TextChoices):
         PAID = "PAID"
@@ -70,5 +179,142 @@ class Payment(models.Model):
         "Borrowing", on_delete=models.CASCADE, related_name="payments"
     )
     session_url = models.URLField(max_length=512, null=True, blank=True)
-    session_id = models.CharField(max_length=255, null=True, blank=True)
+    # Shared by the payments of a multi-book checkout.
+    session_id = models.CharField(
+        max_length=255, null=True, blank=True, db_index=True
+    )
     money_to_pay = models.DecimalField(max_digits=6, decimal_places=2)
+    # Known once paid, so the success page needs no Stripe call again.
+    customer_name = models.CharField(max_length=255, null=True, blank=True)
+    outbox = models.ForeignKey(
+        PaymentOutbox,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="payments",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["borrowing"],
+                condition=models.Q(status="PENDING"),
+                name="payment_pending_borrowing_idx",
+            ),
+            # Reconciliation only ever matches sessions to pending payments.
+            models.Index(
+                fields=["session_id"],
+                condition=models.Q(status="PENDING"),
+                name="payment_pending_session_idx",
+            ),
+            models.Index(fields=["created_at"], name="payment_created_idx"),
+            models.Index(fields=["updated_at"], name="payment_updated_idx"),
+        ]
+
+
+class Notification(models.Model):
+    class StatusChoices(models.TextChoices):
+        PENDING = "PENDING"
+        SENT = "SENT"
+        FAILED = "FAILED"
+
+    text = models.TextField()
+    status = models.CharField(
+        max_length=7,
+        choices=StatusChoices.choices,
+        default=StatusChoices.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.status}: {self.text[:50]}"
+
+
+class PaymentDailyRollup(models.Model):
+    """
+    Number and sum of the payments created on a day, per status and type,
+    kept current by the refresh_analytics_rollups task.
+    """
+
+    day = models.DateField()
+    status = models.CharField(
+        max_length=7, choices=Payment.StatusChoices.choices
+    )
+    type = models.CharField(max_length=7, choices=Payment.TypeChoices.choices)
+    count = models.PositiveIntegerField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        ordering = ["day", "status", "type"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "status", "type"],
+                name="payment_rollup_day_unique",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day} {self.status} {self.type}: {self.amount}"
+
+
+class BorrowingDailyRollup(models.Model):
+    """
+    Borrowings started and returned on a day, kept current by the
+    refresh_analytics_rollups task, along with the active overdue ones and
+    their projected fines as of the task's last run on that day.
+    """
+
+    day = models.DateField(unique=True)
+    started = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+    returned_late = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(null=True, blank=True)
+    projected_fines = models.DecimalField(
+        max_digits=14, decimal_places=2, null=True, blank=True
+    )
+
+    class Meta:
+        ordering = ["day"]
+
+    def __str__(self) -> str:
+        return f"{self.day}: +{self.started} -{self.returned}"
+
+
+class RollupWatermark(models.Model):
+    """Up to when the rows a rollup is computed from have been read."""
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.value}"
+
+
+class ReconciliationRun(models.Model):
+    """
+    A pass over the Stripe checkout sessions created since
+    `created_since`; the next one starts from `next_created_since`.
+    """
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_since = models.DateTimeField()
+    next_created_since = models.DateTimeField(null=True, blank=True)
+    pages = models.PositiveIntegerField(default=0)
+    sessions = models.PositiveIntegerField(default=0)
+    matched = models.PositiveIntegerField(default=0)
+    paid = models.PositiveIntegerField(default=0)
+    expired = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+
+    def __str__(self) -> str:
+        return f"Reconciliation from {self.created_since}"
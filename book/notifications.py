@@ -0,0 +1,15 @@
+from django.db import transaction
+
+from book.models import Notification
+from book.tasks import deliver_notification
+
+
+def queue_notification(text: str) -> Notification:
+    """
+    Records a notification and leaves its delivery to a celery worker,
+    dispatched once the current transaction commits, so callers never
+    wait for (or fail because of) Telegram.
+    """
+    notification = Notification.objects.create(text=text)
+    transaction.on_commit(lambda: deliver_notification.delay(notification.id))
+    return notification
@@ -0,0 +1,166 @@
+import datetime
+import json
+from base64 import b64decode, b64encode
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the whole ordering tuple instead of
+    the first field plus an offset, so every page is a single range scan
+    over the matching composite index no matter how deep the client goes.
+
+    The ordering must consist of non-nullable fields and end with a unique
+    one (usually "id"), otherwise rows sharing a position could be skipped.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+
+        reverse, position = self.decode_cursor(request) or (False, None)
+        ordering = (
+            tuple(_flip(field) for field in self.ordering)
+            if reverse
+            else self.ordering
+        )
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek(ordering, position))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        return self.page
+
+    def seek(self, ordering, position):
+        """
+        Builds a <= x AND ((a < x) OR (a = x AND b < y) OR ...) for the
+        given ordering, i.e. "strictly after position" in lexicographic
+        order. The OR chain alone can not start an index scan, the
+        redundant bound on the first field is the scan's Index Cond.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        if len(ordering) > 1:
+            name = ordering[0].lstrip("-")
+            lookup = "lte" if ordering[0].startswith("-") else "gte"
+            condition = Q(**{f"{name}__{lookup}": position[0]}) & condition
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(True, self.get_position(self.page[0]))
+
+    def get_position(self, instance):
+        return [
+            getattr(instance, field.lstrip("-")) for field in self.ordering
+        ]
+
+    def encode_cursor(self, reverse, position):
+        payload = {"r": int(reverse), "p": [_dump(v) for v in position]}
+        encoded = b64encode(
+            json.dumps(payload, separators=(",", ":")).encode("ascii")
+        ).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            payload = json.loads(b64decode(encoded.encode("ascii")))
+            reverse = bool(payload["r"])
+            position = [
+                self.parse_value(field, value)
+                for field, value in zip(
+                    self.ordering, payload["p"], strict=True
+                )
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, position
+
+    def parse_value(self, field, value):
+        """
+        Turns a JSON cursor value back into a python one using the model
+        field, or the output field of an annotation (e.g. a search rank).
+        """
+        name = field.lstrip("-")
+        if name in self.annotations:
+            return self.annotations[name].output_field.to_python(value)
+        try:
+            model_field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        return model_field.to_python(value)
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _dump(value):
+    if isinstance(value, (Decimal, datetime.date)):
+        return str(value)
+    return value
+
+
+class BookPagination(KeysetPagination):
+    ordering = ("-daily_fee", "id")
+    search_ordering = ("-rank", "id")
+
+    def get_ordering(self, request, queryset, view):
+        if "rank" in queryset.query.annotations:
+            return self.search_ordering
+        return super().get_ordering(request, queryset, view)
+
+
+class BorrowingPagination(KeysetPagination):
+    ordering = ("-borrow_date", "id")
+
+
+class PaymentPagination(KeysetPagination):
+    ordering = ("id",)
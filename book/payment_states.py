@@ -0,0 +1,52 @@
+from django.utils import timezone
+
+from book.models import Payment
+
+
+PENDING = Payment.StatusChoices.PENDING
+PAID = Payment.StatusChoices.PAID
+EXPIRED = Payment.StatusChoices.EXPIRED
+
+# An expired payment is renewed (back to pending) with a new session,
+# a paid one never changes again.
+TRANSITIONS = {
+    PENDING: (PAID, EXPIRED),
+    EXPIRED: (PENDING,),
+    PAID: (),
+}
+
+
+def sources(target: str) -> list[str]:
+    """The statuses a payment can move to `target` from."""
+    return [
+        status for status, targets in TRANSITIONS.items() if target in targets
+    ]
+
+
+def transition(payments, target: str, **fields) -> int:
+    """
+    Moves the payments of the queryset to `target` (setting `fields` too)
+    in one UPDATE guarded by their current status, so concurrent webhooks,
+    redirects and reconciliation runs never move a payment backwards or
+    apply the same transition twice. Unlike QuerySet.update, it keeps
+    updated_at current. Returns the number of moved payments.
+    """
+    fields = {"updated_at": timezone.now(), **fields}
+    return payments.filter(status__in=sources(target)).update(
+        status=target, **fields
+    )
+
+
+def transition_payment(payment, target: str, **fields) -> bool:
+    """
+    Like transition, for one loaded payment, which is updated in place
+    (no re-fetch) when it moved. False if its status did not allow it.
+    """
+    fields = {"status": target, "updated_at": timezone.now(), **fields}
+    moved = Payment.objects.filter(
+        pk=payment.pk, status__in=sources(target)
+    ).update(**fields)
+    if moved:
+        for name, value in fields.items():
+            setattr(payment, name, value)
+    return bool(moved)
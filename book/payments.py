@@ -1,109 +1,236 @@
-import stripe
-from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 from django.urls import reverse_lazy
 from rest_framework.exceptions import ValidationError
 
-from book.models import Payment
+from book.models import Payment, PaymentOutbox
+from book.payment_states import (
+    EXPIRED,
+    PAID,
+    PENDING,
+    transition,
+    transition_payment,
+)
+from book.pricing import fine, rental_fee
+from book.stripe_gateway import get_gateway
+from book.tasks import create_checkout_session
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
+def payment_amount(borrowing, type):
+    if type == "PAYMENT":
+        return rental_fee(borrowing)
+
+    if type == "FINE":
+        return fine(borrowing)
 
-FINE_MULTIPLIER = 2
+    raise ValidationError(
+        f"'type' argument must be either PAYMENT or FINE, not {type}"
+    )
 
 
 def create_payment(request, borrowing, type):
-    if type == "PAYMENT":
-        borrowing_days = (
-            borrowing.expected_return_date - borrowing.borrow_date
-        ).days
-        money_to_pay = borrowing_days * borrowing.book.daily_fee
-
-    elif type == "FINE":
-        overdue_days = (
-            borrowing.actual_return_date - borrowing.expected_return_date
-        ).days
-        money_to_pay = (
-            overdue_days * borrowing.book.daily_fee * FINE_MULTIPLIER
-        )
+    return create_payments(request, [borrowing], type)[0]
+
+
+def create_payments(request, borrowings, type):
+    """
+    Creates a pending payment for each of the borrowings with a single
+    INSERT, all of them paid through one checkout session.
+    """
+    return insert_payments(
+        request,
+        [
+            [
+                Payment(
+                    borrowing=borrowing,
+                    status=PENDING,
+                    type=type,
+                    money_to_pay=payment_amount(borrowing, type),
+                )
+                for borrowing in borrowings
+            ]
+        ],
+    )
+
 
-    else:
-        raise ValidationError(
-            f"'type' argument must be either PAYMENT or FINE, not {type}"
+def recover_payment(request, payment) -> bool:
+    """
+    Renews an expired payment with a new checkout session: one INSERT of
+    the outbox entry and one conditional UPDATE of the payment, which is
+    updated in place. False if it is not expired (anymore).
+    """
+    with transaction.atomic():
+        [entry] = _create_outbox_entries(request, 1)
+        if not transition_payment(
+            payment, PENDING, session_id=None, session_url=None, outbox=entry
+        ):
+            entry.delete()
+            return False
+        _dispatch(entry)
+
+    return True
+
+
+def insert_payments(request, groups):
+    """
+    Inserts the (unsaved) payments with a checkout session to be created
+    per group, handed to a celery worker once the current transaction
+    commits. Two INSERTs however many groups there are: the outbox
+    entries, then the payments pointing at them.
+    """
+    # Usually part of a larger transaction, which fails as a whole anyway.
+    with transaction.atomic(savepoint=False):
+        entries = _create_outbox_entries(request, len(groups))
+        for entry, payments in zip(entries, groups):
+            for payment in payments:
+                payment.outbox = entry
+        payments = Payment.objects.bulk_create(
+            [payment for payments in groups for payment in payments]
         )
+        _dispatch(*entries)
+
+    return payments
 
-    payment = Payment.objects.create(
-        borrowing=borrowing,
-        status="PENDING",
-        type=type,
-        money_to_pay=money_to_pay,
-    )
 
-    price = int(money_to_pay * 100)
+def _create_outbox_entries(request, count):
+    """
+    Stripe redirects back with the id of the session in the success url,
+    so it does not depend on the payments, which may not exist yet.
+    """
     success_url = request.build_absolute_uri(
-        reverse_lazy("book:payment-success", kwargs={"pk": payment.id})
+        reverse_lazy("book:payment-checkout-success")
     )
     cancel_url = request.build_absolute_uri(
-        reverse_lazy("book:payment-cancel", kwargs={"pk": payment.id})
+        reverse_lazy("book:payment-checkout-cancel")
     )
-    session = stripe.checkout.Session.create(
-        line_items=[
-            {
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {
-                        "name": borrowing.book,
-                    },
-                    "unit_amount": price,
-                },
-                "quantity": 1,
-            }
-        ],
-        mode="payment",
-        success_url=success_url,
-        cancel_url=cancel_url,
-        customer_creation="always",
+    return PaymentOutbox.objects.bulk_create(
+        [
+            PaymentOutbox(
+                # Appended unquoted, for Stripe to replace.
+                success_url=f"{success_url}?session_id={{CHECKOUT_SESSION_ID}}",
+                cancel_url=cancel_url,
+            )
+            for _ in range(count)
+        ]
     )
 
-    payment.session_id = session.id
-    payment.save()
-    payment.session_url = session.url
-    payment.save()
 
-    return session.url
+def _dispatch(*entries):
+    def dispatch():
+        for entry in entries:
+            create_checkout_session.delay(entry.id)
+
+    transaction.on_commit(dispatch)
+
+
+def create_fines(request, borrowings):
+    """
+    Creates the fines of returned overdue borrowings with a single INSERT,
+    with the amounts they are annotated with (see pricing.annotate_fees).
+    Each user pays their fines through one checkout session, created in
+    the background like any other.
+    """
+    by_user = {}
+    for borrowing in borrowings:
+        by_user.setdefault(borrowing.user_id, []).append(borrowing)
+
+    if not by_user:
+        return []
+
+    return insert_payments(
+        request,
+        [
+            [
+                Payment(
+                    borrowing=borrowing,
+                    status=PENDING,
+                    type="FINE",
+                    money_to_pay=borrowing.fine,
+                )
+                for borrowing in user_borrowings
+            ]
+            for user_borrowings in by_user.values()
+        ],
+    )
 
 
-def recover_payment(request, payment):
-    price = int(payment.money_to_pay * 100)
-    success_url = request.build_absolute_uri(
-        reverse_lazy("book:payment-success", kwargs={"pk": payment.id})
+# A paid session never changes again (an open one may be paid any moment).
+PAID_SESSION_CACHE_TIMEOUT = 60 * 60 * 24
+CUSTOMER_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_checkout_session(session_id: str) -> dict:
+    """
+    The payment status, url and customer of a checkout session, cached
+    once paid. Concurrent lookups of a session are coalesced by the
+    gateway, so a burst of redirects and refreshes calls Stripe once.
+    """
+    key = f"book:stripe:session:{session_id}"
+    session = cache.get(key)
+    if session is None:
+        found = get_gateway().retrieve_checkout_session(session_id)
+        details = found.get("customer_details") or {}
+        session = {
+            "payment_status": found.payment_status,
+            "url": found.url,
+            "customer": found.customer,
+            "customer_name": details.get("name"),
+        }
+        if session["payment_status"] == "paid":
+            cache.set(key, session, PAID_SESSION_CACHE_TIMEOUT)
+    return session
+
+
+def get_customer_name(customer_id: str) -> str:
+    key = f"book:stripe:customer:{customer_id}"
+    name = cache.get(key)
+    if name is None:
+        name = get_gateway().retrieve_customer(customer_id).name or ""
+        cache.set(key, name, CUSTOMER_CACHE_TIMEOUT)
+    return name
+
+
+def mark_session_paid(session_id: str, customer_name: str) -> int:
+    """
+    Pays the pending payments of a checkout session and records who paid,
+    also on the ones a webhook already marked paid.
+    Returns the number of newly paid payments.
+    """
+    payments = Payment.objects.filter(session_id=session_id)
+    paid = transition(payments, PAID, customer_name=customer_name)
+    payments.filter(status=PAID, customer_name__isnull=True).update(
+        customer_name=customer_name, updated_at=timezone.now()
     )
-    cancel_url = request.build_absolute_uri(
-        reverse_lazy("book:payment-cancel", kwargs={"pk": payment.id})
-    )
-    session = stripe.checkout.Session.create(
-        line_items=[
-            {
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {
-                        "name": payment.borrowing.book,
-                    },
-                    "unit_amount": price,
-                },
-                "quantity": 1,
-            }
-        ],
-        mode="payment",
-        success_url=success_url,
-        cancel_url=cancel_url,
-        customer_creation="always",
+    return paid
+
+
+def get_checkout_url(request, payment):
+    return request.build_absolute_uri(
+        reverse_lazy("book:payment-checkout", kwargs={"pk": payment.id})
     )
 
-    payment.session_id = session.id
-    payment.save()
-    payment.session_url = session.url
-    payment.save()
-    payment.status = "PENDING"
-    payment.save()
 
-    return payment
+def apply_checkout_session_event(event) -> int:
+    """
+    Updates the payments of the event's checkout session by its (indexed)
+    session_id with a single UPDATE. Redeliveries and out-of-order events
+    are harmless: only pending payments change their status.
+    Returns the number of updated payments.
+    """
+    session = event["data"]["object"]
+    payments = Payment.objects.filter(session_id=session["id"])
+
+    if event["type"] in (
+        "checkout.session.completed",
+        "checkout.session.async_payment_succeeded",
+    ):
+        if session["payment_status"] != "paid":
+            return 0
+        details = session.get("customer_details") or {}
+        return transition(payments, PAID, customer_name=details.get("name"))
+
+    if event["type"] == "checkout.session.expired":
+        return transition(payments, EXPIRED)
+
+    return 0
@@ -0,0 +1,161 @@
+import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import (
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Func,
+    IntegerField,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Least, Round
+
+from book.models import Borrowing
+
+
+CENT = Decimal("0.01")
+FINE_MULTIPLIER = 2
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+class FinePolicy(NamedTuple):
+    """
+    A fine is the daily fee times `multiplier` per overdue day. The first
+    `grace_days` are free, `tiers` raise the multiplier from the n-th
+    charged day on, e.g. ((8, Decimal(3)),), and `cap` limits the fine
+    of a single borrowing.
+    """
+
+    multiplier: Decimal = Decimal(FINE_MULTIPLIER)
+    grace_days: int = 0
+    tiers: tuple[tuple[int, Decimal], ...] = ()
+    cap: Decimal | None = None
+
+    @classmethod
+    def from_settings(cls) -> "FinePolicy":
+        options = getattr(settings, "FINE_POLICY", {})
+        cap = options.get("cap")
+        return cls(
+            multiplier=Decimal(
+                str(options.get("multiplier", FINE_MULTIPLIER))
+            ),
+            grace_days=int(options.get("grace_days", 0)),
+            tiers=tuple(
+                (int(day), Decimal(str(multiplier)))
+                for day, multiplier in options.get("tiers", ())
+            ),
+            cap=None if cap is None else Decimal(str(cap)),
+        )
+
+    def bands(self):
+        """
+        (first day, last day or None, multiplier) of every charged day,
+        e.g. ((1, 7, 2), (8, None, 3)) for a tier from the 8th day on.
+        """
+        starts = [(1, self.multiplier), *sorted(self.tiers)]
+        return tuple(
+            (start, next_start - 1 if next_start else None, multiplier)
+            for (start, multiplier), (next_start, _) in zip(
+                starts, [*starts[1:], (None, None)]
+            )
+        )
+
+
+def fine_amount(
+    daily_fee: Decimal, overdue_days: int, policy: FinePolicy
+) -> Decimal:
+    days = max(overdue_days - policy.grace_days, 0)
+    amount = Decimal(0)
+    for start, end, multiplier in policy.bands():
+        last = days if end is None else min(days, end)
+        amount += multiplier * max(last - start + 1, 0)
+    amount *= daily_fee
+    if policy.cap is not None:
+        amount = min(amount, policy.cap)
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def rental_fee(borrowing) -> Decimal:
+    days = (borrowing.expected_return_date - borrowing.borrow_date).days
+    return days * borrowing.book.daily_fee
+
+
+def fine(borrowing, policy: FinePolicy | None = None, as_of=None) -> Decimal:
+    """The fine of a returned borrowing, or of an active one as of today."""
+    returned = borrowing.actual_return_date or as_of or datetime.date.today()
+    return fine_amount(
+        borrowing.book.daily_fee,
+        (returned - borrowing.expected_return_date).days,
+        policy or FinePolicy.from_settings(),
+    )
+
+
+class DaysBetween(Func):
+    """Whole days from the second date to the first (PostgreSQL date - date)."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = IntegerField()
+
+
+def rental_fee_expression():
+    return ExpressionWrapper(
+        DaysBetween("expected_return_date", "borrow_date")
+        * F("book__daily_fee"),
+        output_field=MONEY,
+    )
+
+
+def fine_expression(policy: FinePolicy | None = None, as_of=None):
+    """
+    The same as fine(), as a single SQL expression over a borrowing and
+    its book, so a whole queryset is priced by the database at once.
+    """
+    policy = policy or FinePolicy.from_settings()
+    returned = Coalesce(
+        "actual_return_date", Value(as_of or datetime.date.today())
+    )
+    days = Greatest(
+        DaysBetween(returned, "expected_return_date") - policy.grace_days,
+        Value(0),
+    )
+
+    charged_days = Value(Decimal(0), output_field=MONEY)
+    for start, end, multiplier in policy.bands():
+        last = days if end is None else Least(days, Value(end))
+        charged_days = charged_days + Value(
+            multiplier, output_field=MONEY
+        ) * Greatest(last - (start - 1), Value(0))
+
+    amount = ExpressionWrapper(
+        charged_days * F("book__daily_fee"), output_field=MONEY
+    )
+    if policy.cap is not None:
+        amount = Least(amount, Value(policy.cap, output_field=MONEY))
+    return Round(amount, 2, output_field=MONEY)
+
+
+def annotate_fees(queryset, policy: FinePolicy | None = None, as_of=None):
+    """Annotates borrowings with their `rental_fee` and `fine`."""
+    return queryset.annotate(
+        rental_fee=rental_fee_expression(),
+        fine=fine_expression(policy, as_of),
+    )
+
+
+def outstanding_fines(policy: FinePolicy | None = None, as_of=None):
+    """Sum of the fines the active borrowings would get if returned now."""
+    policy = policy or FinePolicy.from_settings()
+    as_of = as_of or datetime.date.today()
+    overdue = Borrowing.objects.filter(
+        actual_return_date__isnull=True,
+        expected_return_date__lt=as_of
+        - datetime.timedelta(days=policy.grace_days),
+    )
+    total = overdue.aggregate(total=Sum(fine_expression(policy, as_of)))
+    return total["total"] or Decimal("0.00")
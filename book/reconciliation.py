@@ -0,0 +1,125 @@
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from book.models import Payment, ReconciliationRun
+from book.payment_states import EXPIRED, PAID, PENDING
+from book.stripe_gateway import get_gateway
+
+
+RECONCILIATION_PAGE_SIZE = 100
+# A session lives for at most 24 hours: where the very first run starts.
+RECONCILIATION_LOOKBACK = datetime.timedelta(hours=25)
+# Sessions created just before a run may not be listed by it yet.
+RECONCILIATION_OVERLAP = datetime.timedelta(minutes=5)
+
+
+def _final_status(session) -> str | None:
+    """
+    The status a session settles its payments in, None if it leaves them
+    alone (still open, or complete without a successful payment).
+    """
+    if session.status == "expired":
+        return EXPIRED
+    if session.status == "complete" and session.payment_status == "paid":
+        return PAID
+    return None
+
+
+def _created(session) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(
+        session.created, datetime.timezone.utc
+    )
+
+
+def apply_sessions(sessions) -> dict:
+    """
+    Moves the pending payments of settled sessions to their final status,
+    locked and written back in one bulk UPDATE. Returns the counts.
+    """
+    targets = {}
+    for session in sessions:
+        target = _final_status(session)
+        if target is not None:
+            details = session.get("customer_details") or {}
+            targets[session.id] = (target, details.get("name"))
+    counts = {"matched": 0, PAID: 0, EXPIRED: 0}
+    if not targets:
+        return counts
+
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(session_id__in=targets, status=PENDING)
+            .only("id", "session_id", "status", "customer_name")
+        )
+        now = timezone.now()
+        changed = []
+        for payment in payments:
+            target, name = targets[payment.session_id]
+            payment.status = target
+            payment.updated_at = now
+            if target == PAID and name:
+                payment.customer_name = name
+            changed.append(payment)
+            counts[target] += 1
+        counts["matched"] = len(changed)
+        Payment.objects.bulk_update(
+            changed, ["status", "customer_name", "updated_at"]
+        )
+    return counts
+
+
+def reconcile_payments(timeout=None) -> ReconciliationRun:
+    """
+    Settles the payments whose webhooks got lost. Pages through the
+    sessions created since the watermark of the last finished run,
+    applying every page as it arrives, and records the run. The next
+    watermark is the creation time of the oldest session still open, so
+    every session is listed until it is no longer open and never again
+    after that.
+
+    Runs that fail midway keep what they applied but leave the watermark
+    where it was, the next run lists the same sessions again.
+    """
+    last = ReconciliationRun.objects.filter(finished_at__isnull=False).first()
+    now = timezone.now()
+    run = ReconciliationRun.objects.create(
+        created_since=last.next_created_since
+        if last is not None
+        else now - RECONCILIATION_LOOKBACK
+    )
+
+    oldest_open = None
+    pages = get_gateway().checkout_session_pages(
+        created={"gte": int(run.created_since.timestamp())},
+        limit=RECONCILIATION_PAGE_SIZE,
+        timeout=timeout,
+    )
+    try:
+        for page in pages:
+            counts = apply_sessions(page)
+            run.pages += 1
+            run.sessions += len(page)
+            run.matched += counts["matched"]
+            run.paid += counts[PAID]
+            run.expired += counts[EXPIRED]
+            for session in page:
+                # Complete but unpaid (failed or not required) sessions
+                # never change again either, they must not hold it back.
+                if session.status == "open":
+                    created = _created(session)
+                    if oldest_open is None or created < oldest_open:
+                        oldest_open = created
+    except Exception as error:
+        run.error = str(error)
+        run.save()
+        raise
+
+    run.next_created_since = oldest_open or max(
+        run.created_since, now - RECONCILIATION_OVERLAP
+    )
+    run.finished_at = timezone.now()
+    run.save()
+    return run
@@ -0,0 +1,35 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest
+
+
+SEARCH_CONFIG = "english"
+
+
+def search_books(queryset, text: str):
+    """
+    Matches books whose title or author contain the words of `text`
+    (stemmed full-text search over the indexed search_vector) or resemble
+    them (pg_trgm word similarity, which catches typos), annotated with a
+    `rank` to order by: full-text relevance plus the best similarity.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    similarity = Greatest(
+        TrigramWordSimilarity(text, "title"),
+        TrigramWordSimilarity(text, "author"),
+    )
+    # Cast to double precision, so a rank read back from a cursor
+    # compares equal to the one computed by the database.
+    rank = Cast(
+        SearchRank(F("search_vector"), query) + similarity,
+        output_field=FloatField(),
+    )
+    return queryset.filter(
+        Q(search_vector=query)
+        | Q(title__trigram_word_similar=text)
+        | Q(author__trigram_word_similar=text)
+    ).annotate(rank=rank)
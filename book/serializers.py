@@ -1,11 +1,23 @@
-import asyncio
 import datetime
 
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from book.models import Book, Borrowing, Payment
-from book.telegram_bot import send_notification
+from book.inventory import take_copies, take_copy
+from book.models import (
+    Book,
+    Borrowing,
+    BorrowingDailyRollup,
+    Payment,
+    PaymentDailyRollup,
+)
+from book.notifications import queue_notification
+
+
+MAX_CHECKOUT_BOOKS = 10
+MAX_RETURN_BORROWINGS = 500
+MAX_ANALYTICS_DAYS = 366
 
 
 class BookSerializer(serializers.ModelSerializer):
@@ -48,18 +60,93 @@ class BorrowSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         book = validated_data.get("book")
-        book.inventory -= 1
-        book.save()
-
-        notification = (
-            f"A new borrowing! {validated_data.get('user')}, "
-            f"please don't forget to bring "
-            f"'{validated_data.get('book')}' back on "
-            f"{validated_data.get('expected_return_date')}!"
-        )
-        asyncio.run(send_notification(text=notification))
+        with transaction.atomic(savepoint=False):
+            if not take_copy(book.id):
+                raise ValidationError(
+                    {"book": f"Sorry {book} is not available at the moment"}
+                )
+            borrowing = super().create(validated_data)
+            queue_notification(
+                text=(
+                    f"A new borrowing! {validated_data.get('user')}, "
+                    f"please don't forget to bring "
+                    f"'{book}' back on "
+                    f"{validated_data.get('expected_return_date')}!"
+                )
+            )
+
+        return borrowing
+
+
+class BatchBorrowSerializer(serializers.Serializer):
+    books = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=MAX_CHECKOUT_BOOKS,
+    )
+    expected_return_date = serializers.DateField()
+
+    @staticmethod
+    def validate_books(value):
+        if len(set(value)) != len(value):
+            raise ValidationError("Each book can only be borrowed once")
+        return value
+
+    @staticmethod
+    def validate_expected_return_date(value):
+        return BorrowSerializer.validate_expected_return_date(value)
+
+    def create(self, validated_data):
+        """
+        Borrows all the books or none of them, with a single insert.
+        """
+        user = validated_data["user"]
+        return_date = validated_data["expected_return_date"]
+        with transaction.atomic():
+            books, unavailable = take_copies(validated_data["books"])
+            if unavailable:
+                raise ValidationError(
+                    {
+                        "books": [
+                            f"Sorry, book {book_id} is not available "
+                            f"at the moment"
+                            for book_id in unavailable
+                        ]
+                    }
+                )
+            borrowings = Borrowing.objects.bulk_create(
+                [
+                    Borrowing(
+                        book=book,
+                        user=user,
+                        expected_return_date=return_date,
+                    )
+                    for book in books
+                ]
+            )
+            titles = ", ".join(f"'{book}'" for book in books)
+            queue_notification(
+                text=(
+                    f"A new borrowing! {user}, please don't forget to "
+                    f"bring {titles} back on {return_date}!"
+                )
+            )
+
+        return borrowings
 
-        return super().create(validated_data)
+
+class BulkReturnSerializer(serializers.Serializer):
+    borrowings = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=MAX_RETURN_BORROWINGS,
+    )
+
+
+class FineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ("id", "borrowing", "status", "money_to_pay")
 
 
 class PaymentNestedListSerializer(serializers.ModelSerializer):
@@ -126,3 +213,38 @@ class PaymentDetailSerializer(serializers.ModelSerializer):
             "session_id",
             "money_to_pay",
         )
+
+
+class AnalyticsPeriodSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        end = attrs.get("end") or datetime.date.today()
+        start = attrs.get("start") or end - datetime.timedelta(days=29)
+        if start > end:
+            raise ValidationError("start must not be after end")
+        if (end - start).days >= MAX_ANALYTICS_DAYS:
+            raise ValidationError(
+                f"The period is limited to {MAX_ANALYTICS_DAYS} days"
+            )
+        return {"start": start, "end": end}
+
+
+class PaymentDailyRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PaymentDailyRollup
+        fields = ("day", "status", "type", "count", "amount")
+
+
+class BorrowingDailyRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BorrowingDailyRollup
+        fields = (
+            "day",
+            "started",
+            "returned",
+            "returned_late",
+            "overdue",
+            "projected_fines",
+        )
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from book.autocomplete import record_change_on_commit
+from book.cache import invalidate_catalog_on_commit
+from book.models import Book
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalog_on_book_change(sender, **kwargs):
+    invalidate_catalog_on_commit()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def update_autocomplete_on_book_change(sender, instance, **kwargs):
+    record_change_on_commit(instance.id)
@@ -0,0 +1,347 @@
+import concurrent.futures
+import os
+import threading
+import time
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+
+# Failures that say Stripe is unreachable or struggling, as opposed to
+# errors about our request (card declined, invalid parameters...).
+OUTAGE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+
+class CircuitOpenError(stripe.error.APIConnectionError):
+    """
+    Raised without calling Stripe while the circuit is open. A connection
+    error, so callers retrying those (e.g. celery autoretry) back off.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` outages in a row, so calls fail fast
+    instead of tying up workers on a struggling Stripe. After
+    `reset_timeout` seconds one trial call goes through: it closes the
+    circuit again on success or keeps it open for another period.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return
+        raise CircuitOpenError("Stripe is unavailable, not calling it.")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+class PooledRequestsClient(stripe.http_client.RequestsClient):
+    """
+    The SDK's requests client with one session, and so one connection
+    pool, shared by all threads; the timeout of a call can be overridden
+    for the current thread, retries are bounded per client.
+    """
+
+    def __init__(
+        self, timeout: float, pool_size: int, max_retries: int, **kwargs
+    ):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        super().__init__(timeout=timeout, session=session, **kwargs)
+        self.max_retries = max_retries
+
+    @property
+    def _timeout(self):
+        return getattr(self._thread_local, "timeout", None) or (
+            self.default_timeout
+        )
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self.default_timeout = value
+
+    def _max_network_retries(self):
+        # Backed off exponentially with jitter (and Retry-After) by the SDK.
+        return self.max_retries
+
+    def close(self):
+        self._session.close()
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls: while a call for a key is in flight, other
+    threads asking for the same key wait for it and share its result (or
+    exception) instead of making the call again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = concurrent.futures.Future()
+        if not leader:
+            return call.result()
+
+        try:
+            result = function()
+        except BaseException as error:
+            call.set_exception(error)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = {}
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, error: Exception | None):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if error is not None:
+            name = type(error).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": dict(self.errors),
+            "avg_ms": round(self.total_seconds / self.calls * 1000, 1)
+            if self.calls
+            else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 1),
+        }
+
+
+class StripeGateway:
+    """
+    Every Stripe API call of the project goes through here: over a pooled
+    HTTP client, with a timeout, bounded retries, a circuit breaker and
+    latency/error stats per operation (see metrics()).
+    """
+
+    def __init__(
+        self,
+        api_key: str | None,
+        api_base: str = "https://api.stripe.com",
+        timeout: float = 5.0,
+        pool_size: int = 10,
+        max_retries: int = 2,
+        breaker: CircuitBreaker | None = None,
+        http_client: stripe.http_client.HTTPClient | None = None,
+    ):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.http_client = http_client or PooledRequestsClient(
+            timeout=timeout, pool_size=pool_size, max_retries=max_retries
+        )
+        self.breaker = breaker or CircuitBreaker()
+        self.pid = os.getpid()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._flights = SingleFlight()
+
+    def install(self):
+        """Makes the SDK use this gateway's key, API and HTTP client."""
+        stripe.api_key = self.api_key
+        stripe.api_base = self.api_base
+        stripe.default_http_client = self.http_client
+        return self
+
+    def call(self, operation: str, function, *args, timeout=None, **kwargs):
+        """
+        Calls `function` (an SDK method) unless the circuit is open.
+        `timeout` overrides the client's for this call only.
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError as error:
+            self._record(operation, 0.0, error)
+            raise
+        local = getattr(self.http_client, "_thread_local", None)
+        if local is not None:
+            local.timeout = timeout
+        error = None
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            if local is not None:
+                local.timeout = None
+            if isinstance(error, OUTAGE_ERRORS):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            self._record(operation, time.perf_counter() - start, error)
+
+    def _record(self, operation, seconds, error):
+        with self._stats_lock:
+            stats = self._stats.setdefault(operation, OperationStats())
+            stats.record(seconds, error)
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            operations = {
+                operation: stats.as_dict()
+                for operation, stats in sorted(self._stats.items())
+            }
+        return {"circuit": self.breaker.state, "operations": operations}
+
+    def create_checkout_session(self, timeout=None, **params):
+        return self.call(
+            "checkout.session.create",
+            stripe.checkout.Session.create,
+            timeout=timeout,
+            **params,
+        )
+
+    def retrieve(self, operation: str, function, id: str, timeout=None):
+        """A lookup by id, shared by concurrent identical lookups."""
+        return self._flights.do(
+            (operation, id),
+            lambda: self.call(operation, function, id, timeout=timeout),
+        )
+
+    def retrieve_checkout_session(self, session_id: str, timeout=None):
+        return self.retrieve(
+            "checkout.session.retrieve",
+            stripe.checkout.Session.retrieve,
+            session_id,
+            timeout=timeout,
+        )
+
+    def retrieve_customer(self, customer_id: str, timeout=None):
+        return self.retrieve(
+            "customer.retrieve",
+            stripe.Customer.retrieve,
+            customer_id,
+            timeout=timeout,
+        )
+
+    def checkout_session_pages(self, timeout=None, **params):
+        """
+        Yields the pages of sessions, every page being a call of its own
+        (the SDK's auto_paging_iter would bypass the gateway).
+        """
+        while True:
+            page = self.call(
+                "checkout.session.list",
+                stripe.checkout.Session.list,
+                timeout=timeout,
+                **params,
+            )
+            if page.data:
+                yield page.data
+            if not page.has_more or not page.data:
+                return
+            params["starting_after"] = page.data[-1].id
+
+    def list_checkout_sessions(self, timeout=None, **params):
+        for page in self.checkout_session_pages(timeout=timeout, **params):
+            yield from page
+
+    def close(self):
+        self.http_client.close()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> StripeGateway:
+    """
+    Returns the gateway of this process, creating it on first use
+    (and again in forked children, whose pool must not be shared).
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None or _gateway.pid != os.getpid():
+            options = settings.STRIPE_CIRCUIT_BREAKER
+            _gateway = StripeGateway(
+                api_key=settings.STRIPE_SECRET_KEY,
+                api_base=settings.STRIPE_API_BASE,
+                timeout=settings.STRIPE_TIMEOUT,
+                pool_size=settings.STRIPE_CONNECTION_POOL_SIZE,
+                max_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+                breaker=CircuitBreaker(
+                    failure_threshold=options["failure_threshold"],
+                    reset_timeout=options["reset_timeout"],
+                ),
+            ).install()
+    return _gateway
+
+
+@receiver(setting_changed)
+def reset_gateway(setting, **kwargs):
+    global _gateway
+    if not setting.startswith("STRIPE_"):
+        return
+    with _gateway_lock:
+        if _gateway is not None:
+            _gateway.close()
+            _gateway = None
@@ -1,68 +1,251 @@
+import concurrent.futures
 import datetime
-import asyncio
+from itertools import islice
 
 import stripe
 from celery import shared_task
-from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
 
-from book.models import Borrowing, Payment
+from book.analytics import refresh_rollups
+from book.models import Borrowing, Notification, PaymentOutbox
+from book.reconciliation import reconcile_payments as reconcile
+from book.stripe_gateway import get_gateway
 from book.telegram_bot import send_notification
 
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_RELAY_DELAY = datetime.timedelta(minutes=1)
+# Longer than a Stripe call can take with its retries.
+OUTBOX_LEASE = datetime.timedelta(minutes=5)
+# Unlike requests, background Stripe calls keep no one waiting.
+STRIPE_TASK_TIMEOUT = 30
+NOTIFICATION_TIMEOUT = 60
+NOTIFICATION_MAX_RETRIES = 5
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_BATCH_TIMEOUT = 60 * 10
+OVERDUE_SWEEP_CHUNK_SIZE = 2000
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _overdue_notification(borrowing, today):
+    if borrowing.expected_return_date > today:
+        return (
+            f"{borrowing.user} !\n We are expecting you to return "
+            f"'{borrowing.book}' tomorrow, "
+            f"on {borrowing.expected_return_date} - "
+            f"please pay attention in order to avoid a fine."
+        )
+    return (
+        f"{borrowing.user} !\n You are supposed to return "
+        f"'{borrowing.book}' on {borrowing.expected_return_date}, "
+        f"but you still haven't. Please do not be silly and take "
+        f"actions on this issue."
+    )
 
 
 @shared_task
 def check_for_overdue_borrowings():
-    active_borrowings = Borrowing.objects.filter(
-        actual_return_date__isnull=True
+    """
+    Streams overdue borrowings and the ones due tomorrow in a single query
+    (users and books joined in), handing their notifications to
+    send_notification_batch subtasks batch by batch, so memory and query
+    count stay flat however many borrowings there are.
+    """
+    today = datetime.date.today()
+    borrowings = (
+        Borrowing.objects.filter(
+            actual_return_date__isnull=True,
+            expected_return_date__lte=today + datetime.timedelta(days=1),
+        )
+        .select_related("user", "book")
+        .only(
+            "expected_return_date",
+            "user__email",
+            "book__title",
+            "book__author",
+            "book__cover",
+        )
+        .order_by()
     )
-    tomorrow_overdues = active_borrowings.filter(
-        expected_return_date=(
-            datetime.date.today() + datetime.timedelta(days=1)
+    notifications = (
+        _overdue_notification(borrowing, today)
+        for borrowing in borrowings.iterator(
+            chunk_size=OVERDUE_SWEEP_CHUNK_SIZE
         )
     )
-    overdue_borrowings = active_borrowings.filter(
-        expected_return_date__lte=(datetime.date.today())
+
+    notified = 0
+    for batch in _chunks(notifications, NOTIFICATION_BATCH_SIZE):
+        send_notification_batch.delay(batch)
+        notified += len(batch)
+
+    if not notified:
+        send_notification_batch.delay(["No borrowings overdue today!"])
+
+    return notified
+
+
+@shared_task
+def send_notification_batch(texts):
+    futures = [send_notification(text=text) for text in texts]
+    done, not_done = concurrent.futures.wait(
+        futures, timeout=NOTIFICATION_BATCH_TIMEOUT
     )
+    failed = sum(1 for future in done if future.exception())
+    return {"sent": len(done) - failed, "failed": failed + len(not_done)}
 
-    if not overdue_borrowings and not tomorrow_overdues:
-        return asyncio.run(
-            send_notification(text="No borrowings overdue today!")
-        )
 
-    for tomorrow_borrow in tomorrow_overdues:
-        notification = (
-            f"{tomorrow_borrow.user} !\n We are expecting you to return "
-            f"'{tomorrow_borrow.book}' tomorrow, "
-            f"on {tomorrow_borrow.expected_return_date} - "
-            f"please pay attention in order to avoid a fine."
+@shared_task
+def reconcile_payments():
+    """
+    Reconciliation fallback for missed "checkout.session.completed" and
+    "checkout.session.expired" webhooks, see book.reconciliation.
+    """
+    run = reconcile(timeout=STRIPE_TASK_TIMEOUT)
+    return {
+        "pages": run.pages,
+        "sessions": run.sessions,
+        "matched": run.matched,
+        "paid": run.paid,
+        "expired": run.expired,
+    }
+
+
+def _line_item(payment):
+    return {
+        "price_data": {
+            "currency": "usd",
+            "product_data": {
+                "name": str(payment.borrowing.book),
+            },
+            "unit_amount": int(payment.money_to_pay * 100),
+        },
+        "quantity": 1,
+    }
+
+
+@shared_task(
+    autoretry_for=(
+        stripe.error.APIConnectionError,
+        stripe.error.APIError,
+        stripe.error.RateLimitError,
+    ),
+    retry_backoff=True,
+    retry_jitter=True,
+    max_retries=OUTBOX_MAX_ATTEMPTS,
+)
+def create_checkout_session(outbox_id):
+    """
+    Creates the Stripe checkout session of an outbox entry and stores it on
+    its payments. The entry is leased with a single UPDATE and Stripe is
+    called outside of any transaction, so a slow Stripe holds no database
+    connection in a transaction. The idempotency key makes retries and
+    duplicate deliveries end up with the very same session.
+    """
+    now = timezone.now()
+    leased = (
+        PaymentOutbox.objects.filter(id=outbox_id, processed_at__isnull=True)
+        .filter(Q(leased_until__isnull=True) | Q(leased_until__lte=now))
+        .update(leased_until=now + OUTBOX_LEASE)
+    )
+    if not leased:
+        return None
+
+    entry = PaymentOutbox.objects.get(id=outbox_id)
+    payments = entry.payments.select_related("borrowing__book")
+    try:
+        session = get_gateway().create_checkout_session(
+            timeout=STRIPE_TASK_TIMEOUT,
+            line_items=[_line_item(payment) for payment in payments],
+            mode="payment",
+            success_url=entry.success_url,
+            cancel_url=entry.cancel_url,
+            customer_creation="always",
+            idempotency_key=str(entry.idempotency_key),
         )
-        asyncio.run(send_notification(text=notification))
-
-    for over_borrow in overdue_borrowings:
-        notification = (
-            f"{over_borrow.user} !\n You are supposed to return "
-            f"'{over_borrow.book}' on {over_borrow.expected_return_date}, "
-            f"but you still haven't. Please do not be silly and take "
-            f"actions on this issue."
+    except stripe.error.StripeError as error:
+        PaymentOutbox.objects.filter(id=outbox_id).update(
+            attempts=F("attempts") + 1,
+            last_error=str(error),
+            leased_until=None,
         )
-        asyncio.run(send_notification(text=notification))
+        raise
 
+    with transaction.atomic():
+        if PaymentOutbox.objects.filter(
+            id=outbox_id, processed_at__isnull=True
+        ).update(processed_at=timezone.now(), leased_until=None):
+            entry.payments.update(
+                session_id=session.id, session_url=session.url
+            )
+
+    return session.id
+
+
+@shared_task
+def relay_payment_outbox():
+    """
+    Picks up entries whose task got lost (e.g. the broker was down when
+    the transaction committed) or ran out of retries.
+    """
+    now = timezone.now()
+    stale_entries = (
+        PaymentOutbox.objects.filter(
+            processed_at__isnull=True,
+            attempts__lt=OUTBOX_MAX_ATTEMPTS,
+            created_at__lte=now - OUTBOX_RELAY_DELAY,
+        )
+        .exclude(leased_until__gt=now)
+        .values_list("id", flat=True)[:500]
+    )
 
-def get_expired_sessions():
-    sessions = stripe.checkout.Session.list().data
-    return [
-        session.id
-        for session in sessions
-        if session.status == "expired" and session.payment_status == "unpaid"
-    ]
+    for outbox_id in stale_entries:
+        create_checkout_session.delay(outbox_id)
 
 
 @shared_task
-def mark_expired_payments():
-    expired_sessions = get_expired_sessions()
-    for payment in Payment.objects.all():
-        if payment.session_id in expired_sessions:
-            payment.status = "EXPIRED"
-            payment.save()
+def refresh_analytics_rollups():
+    return refresh_rollups()
+
+
+@shared_task(bind=True, max_retries=NOTIFICATION_MAX_RETRIES)
+def deliver_notification(self, notification_id):
+    """
+    Sends a recorded notification and stores the outcome on it.
+    Failed deliveries are retried with an exponential countdown.
+    """
+    notification = Notification.objects.filter(
+        id=notification_id,
+        status__in=[
+            Notification.StatusChoices.PENDING,
+            Notification.StatusChoices.FAILED,
+        ],
+    ).first()
+    if notification is None:
+        return
+
+    try:
+        send_notification(text=notification.text).result(
+            timeout=NOTIFICATION_TIMEOUT
+        )
+    except Exception as error:
+        Notification.objects.filter(id=notification_id).update(
+            status=Notification.StatusChoices.FAILED,
+            attempts=F("attempts") + 1,
+            error=str(error),
+        )
+        raise self.retry(exc=error, countdown=2**self.request.retries * 10)
+
+    Notification.objects.filter(id=notification_id).update(
+        status=Notification.StatusChoices.SENT,
+        attempts=F("attempts") + 1,
+        error="",
+        sent_at=timezone.now(),
+    )
@@ -1,7 +1,235 @@
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import threading
+
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.request import HTTPXRequest
+
+
+MESSAGE_LIMIT = 4096
+SEPARATOR = "\n\n"
+
+
+class RateLimiter:
+    """Spaces calls evenly, so that at most `rate` happen per `period`."""
+
+    def __init__(self, rate: int, period: float = 60.0):
+        self.interval = period / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Holds every caller back, e.g. when Telegram asks us to."""
+        now = asyncio.get_running_loop().time()
+        self._next_slot = max(self._next_slot, now + seconds)
+
+
+class TelegramDispatcher:
+    """
+    Sends notifications through one long-lived Bot (and its connection pool)
+    driven by an event loop in a background thread.
+
+    Queued texts are joined into as few Telegram messages as fit the message
+    size limit and sent concurrently, but no faster than the rate limit;
+    RetryAfter responses pause all senders for the requested time.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        chat_id: str,
+        base_url: str = "https://api.telegram.org/bot",
+        messages_per_minute: int = 20,
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        bot: Bot | None = None,
+    ):
+        self.token = token
+        self.chat_id = chat_id
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.messages_per_minute = messages_per_minute
+        self._bot = bot
+        self._startup_error = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="telegram-dispatcher", daemon=True
+        )
+        self.pid = os.getpid()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+        return self
+
+    def notify(self, text: str) -> concurrent.futures.Future:
+        """
+        Queues a text from any thread. The returned future resolves once
+        the message carrying it has been delivered (or failed for good).
+        """
+        future = concurrent.futures.Future()
+        self._loop.call_soon_threadsafe(
+            self._queue.put_nowait, (text, future)
+        )
+        return future
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Waits until everything queued so far is delivered."""
+        waiter = asyncio.run_coroutine_threadsafe(
+            self._queue.join(), self._loop
+        )
+        try:
+            waiter.result(timeout)
+        except concurrent.futures.TimeoutError:
+            waiter.cancel()
+            return False
+        return True
+
+    def close(self, timeout: float | None = 10):
+        if not self._thread.is_alive():
+            return
+        self.flush(timeout)
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(
+            timeout
+        )
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._limiter = RateLimiter(self.messages_per_minute)
+        try:
+            if self._bot is None:
+                self._bot = Bot(
+                    token=self.token,
+                    base_url=self.base_url,
+                    request=HTTPXRequest(
+                        connection_pool_size=self.concurrency
+                    ),
+                )
+        except Exception as error:
+            self._startup_error = error
+            self._ready.set()
+            return
+        self._workers = [
+            self._loop.create_task(self._work())
+            for _ in range(self.concurrency)
+        ]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _shutdown(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if isinstance(self._bot, Bot):
+            await self._bot.request.shutdown()
+
+    async def _work(self):
+        carried = None
+        while True:
+            batch = [carried or await self._queue.get()]
+            carried = None
+            length = len(batch[0][0])
+
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                length += len(SEPARATOR) + len(item[0])
+                if length > MESSAGE_LIMIT:
+                    carried = item
+                    break
+                batch.append(item)
+
+            await self._deliver(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _deliver(self, batch):
+        text = SEPARATOR.join(text for text, _ in batch)
+        try:
+            for start in range(0, len(text), MESSAGE_LIMIT):
+                await self._send(text[start : start + MESSAGE_LIMIT])
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+        else:
+            for _, future in batch:
+                future.set_result(True)
+
+    async def _send(self, text: str):
+        for attempt in range(1, self.max_attempts + 1):
+            await self._limiter.acquire()
+            try:
+                return await self._bot.send_message(
+                    chat_id=self.chat_id, text=text
+                )
+            except RetryAfter as error:
+                if attempt == self.max_attempts:
+                    raise
+                self._limiter.pause(error.retry_after)
+            except BadRequest:
+                raise
+            except NetworkError:
+                if attempt == self.max_attempts:
+                    raise
+                await asyncio.sleep(min(2**attempt, 30))
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> TelegramDispatcher:
+    """
+    Returns the dispatcher of this process, starting it on first use
+    (and again in forked children, e.g. celery's prefork workers).
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher.pid != os.getpid():
+            _dispatcher = TelegramDispatcher(
+                token=settings.TELEGRAM_BOT_TOKEN,
+                chat_id=settings.TELEGRAM_CHAT_ID,
+                base_url=settings.TELEGRAM_API_URL,
+                messages_per_minute=settings.TELEGRAM_MESSAGES_PER_MINUTE,
+            ).start()
+            atexit.register(_dispatcher.close)
+    return _dispatcher
+
+
+def send_notification(text: str) -> concurrent.futures.Future:
+    return get_dispatcher().notify(text)
+
+
+def flush_notifications(timeout: float | None = None) -> bool:
+    return get_dispatcher().flush(timeout)
 
 
-async def send_notification(text: str):
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-    await bot.send_message(chat_id=settings.TELEGRAM_CHAT_ID, text=text)
+@receiver(setting_changed)
+def reset_dispatcher(setting, **kwargs):
+    global _dispatcher
+    if not setting.startswith("TELEGRAM_"):
+        return
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.close()
+            _dispatcher = None
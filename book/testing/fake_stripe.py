@@ -0,0 +1,301 @@
+import hashlib
+import hmac
+import itertools
+import json
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+SESSION_PATH = re.compile(r"^/v1/checkout/sessions/(?P<id>[\w-]+)$")
+EXPIRE_PATH = re.compile(r"^/v1/checkout/sessions/(?P<id>[\w-]+)/expire$")
+CUSTOMER_PATH = re.compile(r"^/v1/customers/(?P<id>[\w-]+)$")
+UNIT_AMOUNT = re.compile(
+    r"^line_items\[(\d+)\]\[price_data\]\[unit_amount\]$"
+)
+ERROR_TYPES = {429: "rate_limit_error", 500: "api_error", 503: "api_error"}
+
+
+def sign(payload: str, secret: str, timestamp: int | None = None) -> str:
+    """A Stripe-Signature header for the payload, as Stripe computes it."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+class FakeStripeServer:
+    """
+    A local stand-in for the part of the Stripe API the project uses:
+    checkout sessions (create, retrieve, list page by page, expire) and
+    customers (retrieve), answering after an injected latency, so payment
+    flows can be tested and benchmarked offline. Point STRIPE_API_BASE at
+    `api_base`. pay() and expire() play the customer's side and event()
+    / send_event() emit the matching signed webhook events.
+
+    Its sessions and customers can be saved as a JSON fixture and loaded
+    into another server with `fixtures=`, e.g. to replay a recorded state.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        status: int = 200,
+        webhook_secret: str = "whsec_test",
+        fixtures: str | None = None,
+    ):
+        self.latency = latency
+        self.status = status
+        self.webhook_secret = webhook_secret
+        self.sessions = {}
+        self.customers = {}
+        self.requests = []
+        self._idempotent = {}
+        # Unique across servers, so ids cached by one test never match
+        # the objects of another.
+        self._prefix = uuid.uuid4().hex[:8]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        if fixtures is not None:
+            self.load(fixtures)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+
+    @property
+    def api_base(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def load(self, path: str):
+        with open(path) as file:
+            fixtures = json.load(file)
+        with self._lock:
+            for session in fixtures.get("sessions", ()):
+                self.sessions[session["id"]] = session
+            for customer in fixtures.get("customers", ()):
+                self.customers[customer["id"]] = customer
+
+    def save(self, path: str):
+        with self._lock:
+            fixtures = {
+                "sessions": list(self.sessions.values()),
+                "customers": list(self.customers.values()),
+            }
+        with open(path, "w") as file:
+            json.dump(fixtures, file, indent=2)
+
+    def pay(
+        self,
+        session_id: str,
+        name: str = "Jane Reader",
+        customer_details: bool = True,
+    ) -> dict:
+        """
+        Completes the session as its customer would. Without
+        `customer_details`, the name is only on the customer object.
+        """
+        with self._lock:
+            customer_id = f"cus_{self._prefix}{next(self._ids)}"
+            customer = {
+                "id": customer_id,
+                "object": "customer",
+                "name": name,
+                "email": f"{customer_id}@library.test",
+            }
+            self.customers[customer_id] = customer
+            session = self.sessions[session_id]
+            session.update(
+                status="complete", payment_status="paid", customer=customer_id
+            )
+            if customer_details:
+                session["customer_details"] = {
+                    "name": name,
+                    "email": customer["email"],
+                }
+            return dict(session)
+
+    def expire(self, session_id: str) -> dict:
+        with self._lock:
+            session = self.sessions[session_id]
+            if session["status"] == "open":
+                session["status"] = "expired"
+            return dict(session)
+
+    def event(self, type: str, session_id: str) -> tuple[str, str]:
+        """The payload of a webhook event and its Stripe-Signature."""
+        with self._lock:
+            session = dict(self.sessions[session_id])
+        payload = json.dumps(
+            {
+                "id": f"evt_{self._prefix}{next(self._ids)}",
+                "object": "event",
+                "type": type,
+                "created": int(time.time()),
+                "data": {"object": session},
+            }
+        )
+        return payload, sign(payload, self.webhook_secret)
+
+    def send_event(self, type: str, session_id: str, url: str) -> int:
+        """POSTs the event to a webhook endpoint, returns its status."""
+        payload, signature = self.event(type, session_id)
+        request = urllib.request.Request(
+            url,
+            data=payload.encode(),
+            headers={
+                "Content-Type": "application/json",
+                "Stripe-Signature": signature,
+            },
+        )
+        with urllib.request.urlopen(request) as response:
+            return response.status
+
+    def _create_session(self, params: dict, idempotency_key: str | None):
+        with self._lock:
+            if idempotency_key in self._idempotent:
+                return self.sessions[self._idempotent[idempotency_key]]
+            session_id = f"cs_test_{self._prefix}{next(self._ids)}"
+            amounts = [
+                int(value)
+                for key, value in params.items()
+                if UNIT_AMOUNT.match(key)
+            ]
+            session = {
+                "id": session_id,
+                "object": "checkout.session",
+                "url": f"https://checkout.stripe.com/c/pay/{session_id}",
+                "status": "open",
+                "payment_status": "unpaid",
+                "customer": None,
+                "customer_details": None,
+                "mode": params.get("mode"),
+                "success_url": params.get("success_url"),
+                "cancel_url": params.get("cancel_url"),
+                "amount_total": sum(amounts),
+                "currency": "usd",
+                "created": int(time.time()),
+                "expires_at": int(time.time()) + 24 * 60 * 60,
+            }
+            self.sessions[session_id] = session
+            if idempotency_key:
+                self._idempotent[idempotency_key] = session_id
+            return session
+
+    def _list_sessions(self, params: dict) -> dict:
+        with self._lock:
+            sessions = sorted(
+                self.sessions.values(),
+                key=lambda session: session["created"],
+                reverse=True,
+            )
+        if "status" in params:
+            sessions = [
+                s for s in sessions if s["status"] == params["status"]
+            ]
+        if "created[gte]" in params:
+            since = int(params["created[gte]"])
+            sessions = [s for s in sessions if s["created"] >= since]
+        if "starting_after" in params:
+            ids = [session["id"] for session in sessions]
+            sessions = sessions[ids.index(params["starting_after"]) + 1 :]
+        limit = int(params.get("limit", 10))
+        return {
+            "object": "list",
+            "url": "/v1/checkout/sessions",
+            "data": sessions[:limit],
+            "has_more": len(sessions) > limit,
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                self._serve("GET", url.path, dict(parse_qsl(url.query)))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode()
+                self._serve("POST", self.path, dict(parse_qsl(body)))
+
+            def _serve(self, method, path, params):
+                with fake._lock:
+                    fake.requests.append((method, path))
+                time.sleep(fake.latency)
+                if fake.status != 200:
+                    return self._error(
+                        fake.status,
+                        ERROR_TYPES.get(fake.status, "invalid_request_error"),
+                        "Injected failure",
+                    )
+
+                if method == "POST" and path == "/v1/checkout/sessions":
+                    return self._reply(
+                        fake._create_session(
+                            params, self.headers.get("Idempotency-Key")
+                        )
+                    )
+                if method == "GET" and path == "/v1/checkout/sessions":
+                    return self._reply(fake._list_sessions(params))
+
+                match = EXPIRE_PATH.match(path)
+                if method == "POST" and match:
+                    return self._found("checkout.session", match["id"])
+                match = SESSION_PATH.match(path)
+                if method == "GET" and match:
+                    return self._found("checkout.session", match["id"])
+                match = CUSTOMER_PATH.match(path)
+                if method == "GET" and match:
+                    return self._found("customer", match["id"])
+
+                self._error(404, "invalid_request_error", "Unrecognized URL")
+
+            def _found(self, object, id):
+                objects = (
+                    fake.customers if object == "customer" else fake.sessions
+                )
+                if id not in objects:
+                    return self._error(
+                        404,
+                        "invalid_request_error",
+                        f"No such {object}: {id}",
+                    )
+                if self.path.endswith("/expire"):
+                    return self._reply(fake.expire(id))
+                self._reply(objects[id])
+
+            def _error(self, status, type, message):
+                self._reply(
+                    {"error": {"type": type, "message": message}}, status
+                )
+
+            def _reply(self, payload, status=200):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Request-Id", "req_fake")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeTelegramServer:
+    """
+    A local stand-in for the Bot API's sendMessage, answering after an
+    injected latency, so notification paths can be tested and benchmarked
+    offline. Point TELEGRAM_API_URL at `base_url`.
+    """
+
+    def __init__(self, latency: float = 0.0, status: int = 200):
+        self.latency = latency
+        self.status = status
+        self.messages = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/bot"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _record(self, message: dict) -> int:
+        with self._lock:
+            self.messages.append(message)
+            return len(self.messages)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode()
+                if self.headers.get("Content-Type", "").startswith(
+                    "application/json"
+                ):
+                    params = json.loads(body or "{}")
+                else:
+                    params = {
+                        key: values[0]
+                        for key, values in parse_qs(body).items()
+                    }
+
+                time.sleep(fake.latency)
+                if fake.status != 200:
+                    return self._reply(
+                        fake.status,
+                        {
+                            "ok": False,
+                            "error_code": fake.status,
+                            "description": "Bad Request: chat not found",
+                        },
+                    )
+
+                message_id = fake._record(params)
+                self._reply(
+                    200,
+                    {
+                        "ok": True,
+                        "result": {
+                            "message_id": message_id,
+                            "date": int(time.time()),
+                            "chat": {
+                                "id": int(params.get("chat_id", 0)),
+                                "type": "supergroup",
+                            },
+                            "text": params.get("text", ""),
+                        },
+                    },
+                )
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
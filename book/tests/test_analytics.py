@@ -0,0 +1,195 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from book.analytics import ROLLUP_WATERMARK, refresh_rollups
+from book.models import (
+    Book,
+    Borrowing,
+    BorrowingDailyRollup,
+    Payment,
+    PaymentDailyRollup,
+    RollupWatermark,
+)
+
+
+ANALYTICS_URL = reverse("book:analytics")
+TODAY = timezone.localdate()
+YESTERDAY = TODAY - datetime.timedelta(days=1)
+
+
+def sample_user(**params):
+    return get_user_model().objects.create_user(
+        email=f"{uuid.uuid4()}hwa@gmail.com", password="jewaifj@!3e", **params
+    )
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Blue Seas",
+        "author": "Sasha Brul",
+        "inventory": 10,
+        "cover": "HARD",
+        "daily_fee": Decimal("10.00"),
+    }
+    defaults.update(**params)
+    return Book.objects.create(**defaults)
+
+
+def sample_borrowing(**params):
+    defaults = {
+        "expected_return_date": TODAY + datetime.timedelta(days=2),
+        "book": sample_book(),
+        "user": sample_user(),
+    }
+    defaults.update(**params)
+    return Borrowing.objects.create(**defaults)
+
+
+def sample_payment(borrowing, **params):
+    defaults = {
+        "status": Payment.StatusChoices.PENDING,
+        "type": Payment.TypeChoices.PAYMENT,
+        "money_to_pay": Decimal("20.00"),
+    }
+    defaults.update(**params)
+    return Payment.objects.create(borrowing=borrowing, **defaults)
+
+
+def payment_rollups():
+    return {
+        (rollup.day, rollup.status, rollup.type): (
+            rollup.count,
+            rollup.amount,
+        )
+        for rollup in PaymentDailyRollup.objects.all()
+    }
+
+
+class RefreshRollupsTests(APITestCase):
+    def setUp(self):
+        self.borrowing = sample_borrowing()
+        self.payment = sample_payment(self.borrowing)
+        sample_payment(self.borrowing, status=Payment.StatusChoices.PAID)
+        sample_payment(self.borrowing, status=Payment.StatusChoices.PAID)
+
+    def test_first_run_builds_every_day(self):
+        result = refresh_rollups()
+
+        self.assertEqual(result, {"payment_rollups": 2, "borrowing_days": 1})
+        self.assertEqual(
+            payment_rollups(),
+            {
+                (TODAY, "PAID", "PAYMENT"): (2, Decimal("40.00")),
+                (TODAY, "PENDING", "PAYMENT"): (1, Decimal("20.00")),
+            },
+        )
+        rollup = BorrowingDailyRollup.objects.get()
+        self.assertEqual((rollup.started, rollup.returned), (1, 0))
+        self.assertEqual((rollup.overdue, rollup.projected_fines), (0, 0))
+        self.assertTrue(
+            RollupWatermark.objects.filter(name=ROLLUP_WATERMARK).exists()
+        )
+
+    def test_only_changed_days_are_recomputed(self):
+        refresh_rollups()
+        PaymentDailyRollup.objects.create(
+            day=YESTERDAY, status="PAID", type="PAYMENT", count=7, amount=1
+        )
+
+        self.payment.status = Payment.StatusChoices.PAID
+        self.payment.save()
+        self.borrowing.actual_return_date = TODAY
+        self.borrowing.save()
+        result = refresh_rollups()
+
+        self.assertEqual(result, {"payment_rollups": 1, "borrowing_days": 1})
+        self.assertEqual(
+            payment_rollups(),
+            {
+                (TODAY, "PAID", "PAYMENT"): (3, Decimal("60.00")),
+                # Untouched days keep their rollups.
+                (YESTERDAY, "PAID", "PAYMENT"): (7, Decimal("1.00")),
+            },
+        )
+        rollup = BorrowingDailyRollup.objects.get()
+        self.assertEqual((rollup.started, rollup.returned), (1, 1))
+
+    def test_rows_older_than_the_watermark_are_skipped(self):
+        refresh_rollups()
+        Payment.objects.update(
+            updated_at=timezone.now() - datetime.timedelta(days=1)
+        )
+
+        result = refresh_rollups()
+
+        self.assertEqual(result, {"payment_rollups": 0, "borrowing_days": 1})
+
+    def test_overdue_snapshot(self):
+        sample_borrowing(
+            borrow_date=TODAY - datetime.timedelta(days=5),
+            expected_return_date=YESTERDAY,
+        )
+
+        refresh_rollups()
+
+        rollup = BorrowingDailyRollup.objects.get(day=TODAY)
+        self.assertEqual(rollup.overdue, 1)
+        self.assertEqual(rollup.projected_fines, Decimal("20.00"))
+
+
+class AnalyticsViewTests(APITestCase):
+    def setUp(self):
+        borrowing = sample_borrowing()
+        sample_payment(borrowing, status=Payment.StatusChoices.PAID)
+        sample_payment(borrowing, type=Payment.TypeChoices.FINE)
+        refresh_rollups()
+        self.client.force_authenticate(sample_user(is_staff=True))
+
+    def test_reads_only_the_rollups(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(ANALYTICS_URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["start"], TODAY - datetime.timedelta(29)
+        )
+        self.assertEqual(
+            response.data["revenue"],
+            [{"day": TODAY, "amount": Decimal("20.00")}],
+        )
+        self.assertEqual(response.data["outstanding_fines"], Decimal("20.00"))
+        self.assertEqual(response.data["overdue"], 0)
+        self.assertEqual(len(response.data["payments"]), 2)
+        self.assertEqual(len(response.data["borrowings"]), 1)
+        self.assertIsNotNone(response.data["refreshed_at"])
+
+    def test_period(self):
+        response = self.client.get(
+            ANALYTICS_URL, {"start": YESTERDAY, "end": YESTERDAY}
+        )
+
+        self.assertEqual(response.data["revenue"], [])
+        self.assertEqual(response.data["payments"], [])
+
+    def test_invalid_period(self):
+        for params in (
+            {"start": TODAY, "end": YESTERDAY},
+            {"start": TODAY - datetime.timedelta(days=400)},
+            {"end": "yesterday"},
+        ):
+            response = self.client.get(ANALYTICS_URL, params)
+
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(sample_user())
+
+        response = self.client.get(ANALYTICS_URL)
+
+        self.assertEqual(response.status_code, 403)
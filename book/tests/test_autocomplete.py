@@ -0,0 +1,155 @@
+import datetime
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from book.autocomplete import PrefixIndex, get_index, reset_index
+from book.models import Book, Borrowing
+
+
+AUTOCOMPLETE_URL = reverse("book:book-autocomplete")
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Blue Seas",
+        "author": "Sasha Brul",
+        "inventory": 10,
+        "cover": "HARD",
+        "daily_fee": Decimal("10.00"),
+    }
+    defaults.update(**params)
+    return Book.objects.create(**defaults)
+
+
+def borrow(book, times):
+    user = get_user_model().objects.create_user(
+        email=f"{uuid.uuid4()}hwa@gmail.com", password="jewaifj@!3e"
+    )
+    for _ in range(times):
+        Borrowing.objects.create(
+            book=book,
+            user=user,
+            expected_return_date=datetime.date.today(),
+        )
+
+
+class AutocompleteTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hobbit = sample_book(
+            title="The Hobbit", author="J. R. R. Tolkien"
+        )
+        cls.hobbits = sample_book(title="Hobbits", author="Anon")
+        cls.ring = sample_book(
+            title="The Fellowship of the Ring", author="J. R. R. Tolkien"
+        )
+        borrow(cls.hobbit, 3)
+        borrow(cls.ring, 1)
+
+    def setUp(self) -> None:
+        cache.clear()
+        reset_index()
+
+    def suggest(self, text, **params):
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": text, **params})
+        self.assertEqual(res.status_code, 200)
+        return [(s["kind"], s["text"]) for s in res.data["results"]]
+
+    def test_matches_any_word_most_borrowed_first(self):
+        self.assertEqual(
+            self.suggest("hob"),
+            [("title", "The Hobbit"), ("title", "Hobbits")],
+        )
+
+    def test_authors_are_suggested_once(self):
+        self.assertEqual(
+            self.suggest("tolk"), [("author", "J. R. R. Tolkien")]
+        )
+
+    def test_case_and_spacing_are_ignored(self):
+        self.assertEqual(
+            self.suggest("  FELLOWSHIP   of "),
+            [("title", "The Fellowship of the Ring")],
+        )
+
+    def test_limit(self):
+        self.assertEqual(len(self.suggest("t", limit=1)), 1)
+        self.assertEqual(
+            self.client.get(
+                AUTOCOMPLETE_URL, {"q": "t", "limit": "x"}
+            ).status_code,
+            400,
+        )
+
+    def test_book_writes_are_applied_incrementally(self):
+        index = get_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sample_book(title="Hobbit Cookbook", author="Chef")
+            self.ring.title = "The Return of the King"
+            self.ring.save()
+            self.hobbits.delete()
+
+        with self.assertNumQueries(1):
+            titles = self.suggest("hob")
+        self.assertIs(get_index(), index)
+        self.assertEqual(
+            titles, [("title", "The Hobbit"), ("title", "Hobbit Cookbook")]
+        )
+        self.assertEqual(
+            self.suggest("return"), [("title", "The Return of the King")]
+        )
+        self.assertEqual(self.suggest("fellowship"), [])
+
+    def test_index_is_served_while_the_cache_is_down(self):
+        get_index()
+
+        with mock.patch(
+            "book.autocomplete.autocomplete_version", return_value=None
+        ):
+            with self.assertNumQueries(0):
+                self.assertEqual(len(self.suggest("hob")), 2)
+            reset_index()
+            self.assertEqual(len(self.suggest("hob")), 2)
+
+        # Replaced by a versioned index once the cache is back.
+        self.assertIsNotNone(get_index().version)
+
+    def test_index_is_shared_through_the_cache(self):
+        get_index()
+        reset_index()
+
+        with self.assertNumQueries(0):
+            self.suggest("hob")
+
+
+class PrefixIndexTests(TestCase):
+    def test_wide_and_narrow_prefixes_rank_the_same_way(self):
+        rows = [
+            (i, f"Title {i:04}", f"Author {i % 7}", (i * 37) % 101)
+            for i in range(1, 1001)
+        ]
+        index = PrefixIndex(rows, version=0)
+
+        def ranked(prefix):
+            matching = [
+                row for row in rows if row[1].lower().startswith(prefix)
+            ]
+            matching.sort(key=lambda row: (-row[3], row[0]))
+            return [row[1] for row in matching[:5]]
+
+        # "t" takes the popularity walk, "title 01" ranks its range.
+        for prefix in ("t", "title 01"):
+            titles = [
+                s["text"]
+                for s in index.suggest(prefix, limit=5)
+                if s["kind"] == "title"
+            ]
+            self.assertEqual(titles, ranked(prefix), prefix)
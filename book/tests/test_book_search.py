@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from book.models import Book
+
+
+BOOK_URL = reverse("book:book-list")
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Blue Seas",
+        "author": "Sasha Brul",
+        "inventory": 10,
+        "cover": "HARD",
+        "daily_fee": Decimal("10.00"),
+    }
+    defaults.update(**params)
+    return Book.objects.create(**defaults)
+
+
+def search(client, text, **params):
+    res = client.get(BOOK_URL, {"q": text, **params})
+    return [book["title"] for book in res.data["results"]]
+
+
+class BookSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+        sample_book(title="The Fellowship of the Ring", author="Tolkien")
+        sample_book(title="Dune", author="Frank Herbert")
+        sample_book(title="Hobbits and Other Small Folk", author="Anon")
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_search_by_title_words_is_stemmed(self):
+        self.assertCountEqual(
+            search(self.client, "hobbits"),
+            ["The Hobbit", "Hobbits and Other Small Folk"],
+        )
+
+    def test_search_by_author(self):
+        self.assertCountEqual(
+            search(self.client, "tolkien"),
+            ["The Hobbit", "The Fellowship of the Ring"],
+        )
+
+    def test_typos_fall_back_to_trigram_similarity(self):
+        self.assertIn("The Hobbit", search(self.client, "hobit"))
+        self.assertEqual(search(self.client, "Herbet"), ["Dune"])
+
+    def test_best_match_comes_first(self):
+        titles = search(self.client, "the hobbit tolkien")
+
+        self.assertEqual(titles[0], "The Hobbit")
+
+    def test_no_match_returns_empty_page(self):
+        self.assertEqual(search(self.client, "quantum chromodynamics"), [])
+
+    def test_search_vector_follows_title_changes(self):
+        book = Book.objects.get(title="Dune")
+        book.title = "Children of Dune"
+        book.save()
+        Book.objects.filter(id=book.id).update(title="Dune Messiah")
+
+        self.assertEqual(search(self.client, "messiah"), ["Dune Messiah"])
+        self.assertEqual(search(self.client, "children"), [])
+
+    def test_results_are_paginated_by_rank_without_duplicates(self):
+        for i in range(7):
+            sample_book(title=f"Tolkien Companion {i}", author="Tolkien")
+        expected = search(self.client, "tolkien", page_size=100)
+
+        seen = []
+        res = self.client.get(BOOK_URL, {"q": "tolkien", "page_size": 2})
+        while True:
+            seen.extend(book["title"] for book in res.data["results"])
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+
+        self.assertEqual(len(expected), 9)
+        self.assertEqual(seen, expected)
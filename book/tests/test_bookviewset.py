@@ -1,9 +1,16 @@
+import json
 from decimal import Decimal
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
 from django.urls import reverse
 from rest_framework.test import APITestCase
 
+from book.inventory import take_copy
+from book.pagination import BookPagination
 from book.serializers import BookListSerializer
 from book.models import Book
 
@@ -190,9 +197,278 @@ class AdminBookAPITests(APITestCase):
         res = self.client.get(BOOK_URL)
         serializer = BookListSerializer(list(Book.objects.all()), many=True)
         self.assertEquals(res.status_code, 200)
-        self.assertEquals(res.data, serializer.data)
+        self.assertEquals(res.data["results"], serializer.data)
 
     def test_delete_works(self):
         res = self.client.delete(get_detail_url(self.book.id))
         self.assertEquals(res.status_code, 204)
         self.assertFalse(Book.objects.filter(title="Blue Seas").exists())
+
+
+class BookPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            sample_book(title=f"Book {i}", daily_fee=Decimal(fee))
+            for i, fee in enumerate(["1.00", "2.00", "2.00", "2.00", "3.00"])
+        ]
+
+    def test_pages_follow_ordering_without_gaps_or_duplicates(self):
+        expected = [
+            book.id
+            for book in sorted(self.books, key=lambda b: (-b.daily_fee, b.id))
+        ]
+        seen = []
+        url = BOOK_URL + "?page_size=2"
+        while url:
+            res = self.client.get(url)
+            self.assertEquals(res.status_code, 200)
+            self.assertLessEqual(len(res.data["results"]), 2)
+            seen.extend(book["id"] for book in res.data["results"])
+            url = res.data["next"]
+
+        self.assertEquals(seen, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get(BOOK_URL, {"page_size": 2})
+        second = self.client.get(first.data["next"])
+        res = self.client.get(second.data["previous"])
+
+        self.assertEquals(res.data["results"], first.data["results"])
+        self.assertIsNone(first.data["previous"])
+
+    def test_invalid_cursor_returns_404(self):
+        res = self.client.get(BOOK_URL, {"cursor": "garbage"})
+        self.assertEquals(res.status_code, 404)
+
+    def test_deep_cursor_starts_an_index_scan_at_its_position(self):
+        ordering = BookPagination.ordering
+        queryset = Book.objects.order_by(*ordering).filter(
+            BookPagination().seek(ordering, [Decimal("2.00"), 0])
+        )
+        with connection.cursor() as cursor:
+            # Too few rows for the planner to prefer the index otherwise.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_bitmapscan = off")
+            [plan] = json.loads(queryset.explain(format="json"))
+
+        scan = plan["Plan"]
+        while "Index Name" not in scan:
+            [scan] = scan["Plans"]
+        self.assertEquals(scan["Index Name"], "book_daily_fee_id_idx")
+        self.assertIn("daily_fee <=", scan["Index Cond"])
+
+
+class CatalogCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = sample_book()
+        cls.superuser = get_user_model().objects.create_superuser(
+            email="admin@admin.com", password="foiawejf@13142"
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_second_request_is_served_from_cache(self):
+        res = self.client.get(BOOK_URL)
+        self.assertEquals(res["X-Cache"], "MISS")
+
+        res = self.client.get(BOOK_URL)
+        self.assertEquals(res["X-Cache"], "HIT")
+        self.assertEquals(res.data["results"][0]["id"], self.book.id)
+
+    def test_catalog_version_is_read_once_per_request(self):
+        self.client.get(BOOK_URL)
+
+        with mock.patch(
+            "book.cache.cache.get_or_set", wraps=cache.get_or_set
+        ) as get_or_set:
+            res = self.client.get(BOOK_URL)
+
+        self.assertEquals(res["X-Cache"], "HIT")
+        self.assertEquals(get_or_set.call_count, 1)
+
+    def test_query_strings_are_cached_separately(self):
+        self.client.get(BOOK_URL)
+        res = self.client.get(BOOK_URL, {"page_size": 1})
+        self.assertEquals(res["X-Cache"], "MISS")
+
+    def test_book_update_invalidates_cache(self):
+        self.client.get(BOOK_URL)
+        self.client.force_authenticate(self.superuser)
+        self.client.patch(get_detail_url(self.book.id), {"title": "Red Sun"})
+
+        res = self.client.get(BOOK_URL)
+        self.assertEquals(res["X-Cache"], "MISS")
+        self.assertEquals(res.data["results"][0]["title"], "Red Sun")
+
+
+class BookFilterAndFacetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        sample_book(title="A", author="Tolkien", cover="HARD", inventory=2)
+        sample_book(
+            title="B",
+            author="Tolkien",
+            cover="SOFT",
+            inventory=0,
+            daily_fee=Decimal("1.00"),
+        )
+        sample_book(
+            title="C",
+            author="Herbert",
+            cover="SOFT",
+            inventory=1,
+            daily_fee=Decimal("3.00"),
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def titles(self, **params):
+        res = self.client.get(BOOK_URL, params)
+        self.assertEquals(res.status_code, 200)
+        return sorted(book["title"] for book in res.data["results"])
+
+    def test_filters(self):
+        self.assertEquals(self.titles(cover="SOFT"), ["B", "C"])
+        self.assertEquals(self.titles(author="Tolkien"), ["A", "B"])
+        self.assertEquals(self.titles(available="TRUE"), ["A", "C"])
+        self.assertEquals(self.titles(available="false"), ["B"])
+        self.assertEquals(self.titles(min_fee="2", max_fee="5"), ["C"])
+        self.assertEquals(
+            self.titles(cover="SOFT", available="true", max_fee="3"), ["C"]
+        )
+
+    def test_invalid_filters_return_400(self):
+        for params in (
+            {"cover": "PAPER"},
+            {"min_fee": "x"},
+            {"max_fee": "NaN"},
+        ):
+            res = self.client.get(BOOK_URL, params)
+            self.assertEquals(res.status_code, 400, params)
+
+    def test_facets_come_with_the_page(self):
+        with self.assertNumQueries(2):
+            res = self.client.get(BOOK_URL, {"author": "Herbert"})
+
+        self.assertEquals(
+            res.data["facets"],
+            {
+                "cover": {"HARD": 1, "SOFT": 2},
+                "available": {"true": 2, "false": 1},
+                "author": {"Tolkien": 2, "Herbert": 1},
+            },
+        )
+
+    def test_facets_follow_book_writes(self):
+        take_copy(Book.objects.get(title="C").id)
+        Book.objects.filter(title="A").update(cover="SOFT", author="Herbert")
+        Book.objects.get(title="B").delete()
+        Book.objects.bulk_create(
+            [
+                Book(
+                    title="D",
+                    author="Le Guin",
+                    cover="HARD",
+                    inventory=3,
+                    daily_fee=Decimal("2.00"),
+                )
+            ]
+        )
+
+        facets = self.client.get(BOOK_URL).data["facets"]
+
+        self.assertEquals(facets["cover"], {"HARD": 1, "SOFT": 2})
+        self.assertEquals(facets["available"], {"true": 2, "false": 1})
+        self.assertEquals(facets["author"], {"Herbert": 2, "Le Guin": 1})
+        for facet, expected in (
+            ("cover", Book.objects.values("cover").annotate(n=Count("id"))),
+            ("author", Book.objects.values("author").annotate(n=Count("id"))),
+        ):
+            self.assertEquals(
+                {row[facet]: row["n"] for row in expected}, facets[facet]
+            )
+
+
+class BookConditionalRequestTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = sample_book()
+        cls.superuser = get_user_model().objects.create_superuser(
+            email="admin@admin.com", password="foiawejf@13142"
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_authenticate(self.superuser)
+        self.url = get_detail_url(self.book.id)
+
+    def test_detail_returns_304_for_current_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEquals(res.status_code, 304)
+
+    def test_inventory_changes_change_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        take_copy(self.book.id)
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEquals(res.status_code, 200)
+        self.assertEquals(res.data["inventory"], 9)
+
+    def test_list_returns_304_until_the_catalog_changes(self):
+        self.client.logout()
+        etag = self.client.get(BOOK_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(res.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sample_book(title="Red Sun")
+        res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(res.status_code, 200)
+
+    def test_list_has_no_etag_while_the_cache_is_down(self):
+        self.client.logout()
+
+        with mock.patch("book.views.catalog_version", return_value=None):
+            res = self.client.get(
+                BOOK_URL, HTTP_IF_NONE_MATCH='"catalog-None"'
+            )
+
+        self.assertEquals(res.status_code, 200)
+        self.assertNotIn("ETag", res)
+        self.assertIn("facets", res.data)
+
+    def test_update_with_current_etag_succeeds(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        # One locked lookup by id, not the whole table, then the update.
+        with self.assertNumQueries(5):
+            res = self.client.patch(
+                self.url, {"title": "Red Sun"}, HTTP_IF_MATCH=etag
+            )
+
+        self.assertEquals(res.status_code, 200)
+        self.assertNotEquals(res["ETag"], etag)
+        self.assertEquals(self.client.get(self.url)["ETag"], res["ETag"])
+
+    def test_update_with_stale_etag_returns_412(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.client.patch(self.url, {"inventory": 3})
+
+        res = self.client.patch(
+            self.url, {"title": "Red Sun"}, HTTP_IF_MATCH=etag
+        )
+
+        self.assertEquals(res.status_code, 412)
+        self.book.refresh_from_db()
+        self.assertEquals(self.book.title, "Blue Seas")
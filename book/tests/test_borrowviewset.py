@@ -3,6 +3,9 @@ import uuid
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from django.urls import reverse
 
@@ -11,6 +14,8 @@ from book.serializers import BorrowListSerializer
 
 
 BORROW_URL = reverse("book:borrow-list")
+CHECKOUT_URL = reverse("book:borrow-checkout")
+BULK_RETURN_URL = reverse("book:borrow-bulk-return")
 
 
 def sample_user():
@@ -125,8 +130,8 @@ class AuthenticatedBorrowingApiTests(APITestCase):
         my_serializer = BorrowListSerializer([self.borrowing], many=True)
 
         self.assertEqual(res.status_code, 200)
-        self.assertNotIn(other_serializer.data, res.data)
-        self.assertEqual(my_serializer.data, res.data)
+        self.assertNotIn(other_serializer.data, res.data["results"])
+        self.assertEqual(my_serializer.data, res.data["results"])
 
     def test_retrieve_not_your_borrowings_forbidden(self):
         other_borrowing = sample_borrowing()
@@ -179,7 +184,7 @@ class AuthenticatedBorrowingApiTests(APITestCase):
         res = self.client.post(BORROW_URL, payload)
         book.refresh_from_db()
 
-        self.assertEqual(res.status_code, 302)
+        self.assertEqual(res.status_code, 202)
         self.assertEqual(book_inventory_before_borrowing, book.inventory + 1)
         self.assertTrue(
             Borrowing.objects.filter(
@@ -188,6 +193,28 @@ class AuthenticatedBorrowingApiTests(APITestCase):
                 expected_return_date=expected_return_date,
             ).exists()
         )
+        payment = Payment.objects.get(id=res.data.get("id"))
+        self.assertEqual(payment.status, "PENDING")
+        self.assertIsNone(payment.session_url)
+        self.assertIsNone(payment.outbox.processed_at)
+        self.assertTrue(res["Location"].endswith(f"{payment.id}/checkout/"))
+
+    def test_create_queries(self):
+        book = sample_book()
+        payload = {
+            "expected_return_date": datetime.date.today()
+            + datetime.timedelta(days=2),
+            "book": book.id,
+        }
+
+        # Pending payments check, book lookup, savepoint, inventory,
+        # borrowing, notification, outbox entry, payment and the savepoint
+        # release: nothing is fetched back or updated afterwards.
+        with self.assertNumQueries(9):
+            res = self.client.post(BORROW_URL, payload)
+
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(res.data["money_to_pay"], "20.00")
 
     def test_create_forbidden_when_user_has_pending_payments(self):
         Payment.objects.create(
@@ -253,11 +280,11 @@ class AdminBorrowApiTests(APITestCase):
 
         res = self.client.get(BORROW_URL, data={"is_active": "True"})
         self.assertEqual(res.status_code, 200)
-        self.assertEqual(res.data, active_borrows_serializer.data)
+        self.assertEqual(res.data["results"], active_borrows_serializer.data)
 
         res = self.client.get(BORROW_URL, data={"user_id": alice.id})
         self.assertEqual(res.status_code, 200)
-        self.assertEqual(res.data, alice_borrows_serializer.data)
+        self.assertEqual(res.data["results"], alice_borrows_serializer.data)
 
     def test_retrieve_other_borrowings_allowed(self):
         borrow = sample_borrowing()
@@ -322,3 +349,272 @@ class AdminBorrowApiTests(APITestCase):
         self.assertTrue(
             Payment.objects.filter(borrowing=borrowing, type="FINE").exists()
         )
+
+
+class BorrowingConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.borrowing = sample_borrowing()
+        cls.payment = Payment.objects.create(
+            borrowing=cls.borrowing,
+            status="PENDING",
+            type="PAYMENT",
+            money_to_pay=Decimal("20.00"),
+        )
+
+    def setUp(self) -> None:
+        self.client.force_authenticate(self.borrowing.user)
+        self.url = get_detail_url(self.borrowing.id)
+
+    def test_unchanged_borrowing_returns_304_without_serializing(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res["ETag"], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)["Last-Modified"]
+
+        res = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_nested_changes_change_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        # Queryset updates bypass auto_now, a trigger bumps updated_at.
+        Payment.objects.filter(id=self.payment.id).update(status="PAID")
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["payments"][0]["status"], "PAID")
+
+        Book.objects.filter(id=self.borrowing.book_id).update(inventory=0)
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(res.data["book"]["is_available"])
+
+    def test_other_users_get_403_not_304(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.client.force_authenticate(sample_user())
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 403)
+
+
+class BatchCheckoutTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = sample_user()
+        cls.books = [sample_book(title=f"Book {i}") for i in range(5)]
+
+    def setUp(self) -> None:
+        self.client.force_authenticate(self.user)
+        self.payload = {
+            "books": [book.id for book in self.books[:3]],
+            "expected_return_date": (
+                datetime.date.today() + datetime.timedelta(days=2)
+            ),
+        }
+
+    def test_borrows_all_books_with_one_checkout_session(self):
+        res = self.client.post(CHECKOUT_URL, self.payload, format="json")
+
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(len(res.data), 3)
+        payments = Payment.objects.filter(id__in=[p["id"] for p in res.data])
+        self.assertEqual(
+            {payment.money_to_pay for payment in payments},
+            {Decimal("20.00")},
+        )
+        self.assertEqual(len({payment.outbox_id for payment in payments}), 1)
+        self.assertTrue(
+            res["Location"].endswith(f"{res.data[0]['id']}/checkout/")
+        )
+        self.assertEqual(
+            set(
+                Book.objects.filter(id__in=self.payload["books"]).values_list(
+                    "inventory", flat=True
+                )
+            ),
+            {9},
+        )
+
+    def test_query_count_does_not_grow_with_books(self):
+        with CaptureQueriesContext(connection) as two_books:
+            self.client.post(
+                CHECKOUT_URL,
+                {**self.payload, "books": self.payload["books"][:2]},
+                format="json",
+            )
+        Payment.objects.update(status="PAID")
+
+        with CaptureQueriesContext(connection) as five_books:
+            self.client.post(
+                CHECKOUT_URL,
+                {**self.payload, "books": [b.id for b in self.books]},
+                format="json",
+            )
+
+        self.assertEqual(len(five_books), len(two_books))
+
+    def test_nothing_is_borrowed_if_a_book_is_unavailable(self):
+        Book.objects.filter(id=self.books[1].id).update(inventory=0)
+
+        res = self.client.post(CHECKOUT_URL, self.payload, format="json")
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(len(res.data["books"]), 1)
+        self.assertFalse(Borrowing.objects.filter(user=self.user).exists())
+        self.assertEqual(Book.objects.get(id=self.books[0].id).inventory, 10)
+
+    def test_duplicate_books_rejected(self):
+        self.payload["books"] = [self.books[0].id] * 2
+
+        res = self.client.post(CHECKOUT_URL, self.payload, format="json")
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_forbidden_when_user_has_pending_payments(self):
+        self.client.post(CHECKOUT_URL, self.payload, format="json")
+
+        res = self.client.post(CHECKOUT_URL, self.payload, format="json")
+
+        self.assertEqual(res.status_code, 403)
+
+
+class BulkReturnTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = get_user_model().objects.create_superuser(
+            email="admin@admin.com", password="fejawi!3h2i1u"
+        )
+        cls.book = sample_book(inventory=0)
+        cls.reader, cls.other_reader = sample_user(), sample_user()
+
+    def setUp(self) -> None:
+        self.client.force_authenticate(self.superuser)
+
+    def borrow(self, user, days_overdue=-1):
+        # borrow_date is set on insert, so the expected date is moved.
+        return sample_borrowing(
+            book=self.book,
+            user=user,
+            expected_return_date=(
+                datetime.date.today() - datetime.timedelta(days=days_overdue)
+            ),
+        )
+
+    def bulk_return(self, borrowings):
+        with self.captureOnCommitCallbacks():
+            res = self.client.post(
+                BULK_RETURN_URL,
+                {"borrowings": [borrowing.id for borrowing in borrowings]},
+                format="json",
+            )
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def test_returns_borrowings_and_puts_copies_back(self):
+        borrowings = [self.borrow(self.reader) for _ in range(3)]
+
+        data = self.bulk_return(borrowings)
+
+        self.assertEqual(data["returned"], [b.id for b in borrowings])
+        self.assertEqual(data["fines"], [])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 3)
+        self.assertFalse(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+
+    def test_returned_and_unknown_borrowings_are_skipped(self):
+        returned = self.borrow(self.reader)
+        Borrowing.objects.filter(id=returned.id).update(
+            actual_return_date=datetime.date.today()
+        )
+        active = self.borrow(self.reader)
+
+        data = self.client.post(
+            BULK_RETURN_URL,
+            {"borrowings": [returned.id, active.id, 0]},
+            format="json",
+        ).data
+
+        self.assertEqual(data["returned"], [active.id])
+        self.assertEqual(data["skipped"], [returned.id, 0])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+    def test_overdue_borrowings_are_fined_with_a_session_per_user(self):
+        overdue = [
+            self.borrow(self.reader, days_overdue=2),
+            self.borrow(self.reader, days_overdue=3),
+            self.borrow(self.other_reader, days_overdue=1),
+        ]
+        on_time = self.borrow(self.other_reader)
+
+        data = self.bulk_return([*overdue, on_time])
+
+        self.assertEqual(
+            {
+                fine["borrowing"]: fine["money_to_pay"]
+                for fine in data["fines"]
+            },
+            {
+                overdue[0].id: "40.00",
+                overdue[1].id: "60.00",
+                overdue[2].id: "20.00",
+            },
+        )
+        fines = Payment.objects.filter(type="FINE")
+        self.assertEqual(fines.values("outbox").distinct().count(), 2)
+        self.assertEqual(
+            len(
+                {
+                    fine.outbox_id
+                    for fine in fines
+                    if fine.borrowing.user == self.reader
+                }
+            ),
+            1,
+        )
+
+    @override_settings(FINE_POLICY={"grace_days": 2})
+    def test_no_fines_within_grace_days(self):
+        late = self.borrow(self.reader, days_overdue=2)
+        single = self.borrow(self.reader, days_overdue=2)
+
+        data = self.bulk_return([late])
+        res = self.client.get(get_detail_url(single.id) + "return/")
+
+        self.assertEqual(data["fines"], [])
+        self.assertIn("returned", res.data)
+        self.assertFalse(Payment.objects.filter(type="FINE").exists())
+
+    def test_query_count_does_not_grow_with_borrowings(self):
+        few = [self.borrow(self.reader, days_overdue=1)]
+        many = [
+            self.borrow(user, days_overdue=1)
+            for user in (self.reader, self.other_reader) * 3
+        ]
+
+        with CaptureQueriesContext(connection) as few_queries:
+            self.bulk_return(few)
+        with CaptureQueriesContext(connection) as many_queries:
+            self.bulk_return(many)
+
+        self.assertEqual(len(many_queries), len(few_queries))
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.reader)
+        borrowing = self.borrow(self.reader)
+
+        res = self.client.post(
+            BULK_RETURN_URL, {"borrowings": [borrowing.id]}, format="json"
+        )
+
+        self.assertEqual(res.status_code, 403)
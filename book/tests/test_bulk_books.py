@@ -0,0 +1,231 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from book.autocomplete import reset_index, suggest
+from book.facets import facet_counts
+from book.models import Book
+
+
+IMPORT_URL = reverse("book:book-bulk-import")
+EXPORT_URL = reverse("book:book-bulk-export")
+
+CSV_HEADER = "id,title,author,cover,inventory,daily_fee\n"
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Blue Seas",
+        "author": "Sasha Brul",
+        "inventory": 10,
+        "cover": "HARD",
+        "daily_fee": Decimal("10.00"),
+    }
+    defaults.update(**params)
+    return Book.objects.create(**defaults)
+
+
+def upload(name, content, encoding="utf-8"):
+    return SimpleUploadedFile(name, content.encode(encoding))
+
+
+class BulkImportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = sample_book()
+        cls.admin = get_user_model().objects.create_superuser(
+            email="admin@admin.com", password="foiawejf@13142"
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        reset_index()
+        self.client.force_authenticate(self.admin)
+
+    def import_file(self, name, content, encoding="utf-8"):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                IMPORT_URL,
+                {"file": upload(name, content, encoding)},
+                format="multipart",
+            )
+        self.assertEqual(res.status_code, 200, res.data)
+        return res.data
+
+    def test_csv_creates_updates_and_reports_invalid_rows(self):
+        report = self.import_file(
+            "books.csv",
+            CSV_HEADER
+            + ",The Hobbit,Tolkien,SOFT,3,1.50\n"
+            + f"{self.book.id},Blue Seas,Sasha Brul,HARD,0,12.00\n"
+            + ",Broken,Nobody,PAPER,-1,1\n"
+            + "999999,Ghost,Nobody,HARD,1,1\n",
+        )
+
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(report["updated"], 1)
+        self.assertEqual(report["failed"], 2)
+        self.assertEqual([error["row"] for error in report["errors"]], [3, 4])
+        self.assertEqual(
+            set(report["errors"][0]["errors"]), {"cover", "inventory"}
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(self.book.daily_fee, Decimal("12.00"))
+        self.assertTrue(Book.objects.filter(title="The Hobbit").exists())
+
+    def test_ndjson(self):
+        report = self.import_file(
+            "books.ndjson",
+            json.dumps(
+                {
+                    "title": "Dune",
+                    "author": "Frank Herbert",
+                    "cover": "HARD",
+                    "inventory": 2,
+                    "daily_fee": "3.00",
+                }
+            )
+            + "\n\nnot json\n[1]\n",
+        )
+
+        self.assertEqual(report["created"], 1)
+        self.assertEqual([error["row"] for error in report["errors"]], [3, 4])
+
+    def test_files_that_are_not_utf8_are_reported(self):
+        report = self.import_file(
+            "books.csv",
+            CSV_HEADER
+            + ",The Hobbit,Tolkien,SOFT,3,1.50\n"
+            + ",Les Misérables,Victor Hugo,HARD,1,2.00\n"
+            + ",Dune,Frank Herbert,HARD,2,3.00\n",
+            encoding="latin-1",
+        )
+
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(report["failed"], 1)
+        [error] = report["errors"]
+        self.assertEqual(error["row"], 2)
+        self.assertIn("Invalid CSV", error["errors"]["non_field_errors"][0])
+
+        report = self.import_file(
+            "books.ndjson",
+            '{"title": "Les Misérables"}\n'
+            + json.dumps(
+                {
+                    "title": "Dune",
+                    "author": "Frank Herbert",
+                    "cover": "HARD",
+                    "inventory": 2,
+                    "daily_fee": "3.00",
+                }
+            )
+            + "\n",
+            encoding="latin-1",
+        )
+
+        self.assertEqual(report["created"], 1)
+        self.assertEqual([error["row"] for error in report["errors"]], [1])
+
+    def test_bulk_writes_refresh_derived_data(self):
+        suggest("dune")
+        self.client.get(reverse("book:book-list"))
+
+        self.import_file(
+            "books.csv",
+            CSV_HEADER
+            + ",Dune,Frank Herbert,SOFT,2,3.00\n"
+            + f"{self.book.id},Blue Seas,Sasha Brul,SOFT,10,10.00\n",
+        )
+
+        self.assertEqual(facet_counts()["cover"], {"HARD": 0, "SOFT": 2})
+        self.assertEqual([s["text"] for s in suggest("dune")], ["Dune"])
+        res = self.client.get(reverse("book:book-list"), {"q": "dune"})
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_rejects_unknown_file_types(self):
+        res = self.client.post(
+            IMPORT_URL, {"file": upload("books.xls", "")}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@user.com", password="foiawejf@13142"
+            )
+        )
+
+        self.assertEqual(self.client.post(IMPORT_URL).status_code, 403)
+        self.assertEqual(self.client.get(EXPORT_URL).status_code, 403)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False
+        ) as file:
+            file.write(CSV_HEADER + ",Dune,Frank Herbert,SOFT,2,3.00\n")
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+
+        call_command("import_books", file.name, stdout=out)
+
+        self.assertIn("1 created, 0 updated, 0 failed.", out.getvalue())
+        self.assertTrue(Book.objects.filter(title="Dune").exists())
+
+
+class BulkExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [sample_book(title=f"Book {i}") for i in range(5)]
+        cls.admin = get_user_model().objects.create_superuser(
+            email="admin@admin.com", password="foiawejf@13142"
+        )
+
+    def setUp(self) -> None:
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, 200)
+        return b"".join(res.streaming_content).decode("utf-8")
+
+    def test_csv(self):
+        lines = self.export().splitlines()
+
+        self.assertEqual(lines[0], CSV_HEADER.strip())
+        self.assertEqual(
+            lines[1], f"{self.books[0].id},Book 0,Sasha Brul,HARD,10,10.00"
+        )
+        self.assertEqual(len(lines), 6)
+
+    def test_ndjson_round_trips_through_import(self):
+        content = self.export(output="ndjson")
+        self.assertEqual(
+            json.loads(content.splitlines()[-1])["title"], "Book 4"
+        )
+
+        res = self.client.post(
+            IMPORT_URL,
+            {"file": upload("books.ndjson", content)},
+            format="multipart",
+        )
+
+        self.assertEqual(res.data["updated"], 5)
+        self.assertEqual(res.data["failed"], 0)
+        self.assertEqual(Book.objects.count(), 5)
+
+    def test_unknown_output(self):
+        res = self.client.get(EXPORT_URL, {"output": "xml"})
+
+        self.assertEqual(res.status_code, 400)
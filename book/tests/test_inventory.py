@@ -0,0 +1,140 @@
+import datetime
+import threading
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from book.inventory import return_copy, take_copies, take_copy
+from book.models import Book, Borrowing
+
+
+def sample_user():
+    return get_user_model().objects.create_user(
+        email=f"{uuid.uuid4()}hwa@gmail.com", password="jewaifj@!3e"
+    )
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Blue Seas",
+        "author": "Sasha Brul",
+        "inventory": 10,
+        "cover": "HARD",
+        "daily_fee": Decimal("10.00"),
+    }
+    defaults.update(**params)
+    return Book.objects.create(**defaults)
+
+
+class ConcurrentBorrowTests(TransactionTestCase):
+    THREADS = 25
+
+    def borrow_concurrently(self, book):
+        users = [sample_user() for _ in range(self.THREADS)]
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        def borrow(user):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    taken = take_copy(book.id)
+                    if taken:
+                        Borrowing.objects.create(
+                            book=book,
+                            user=user,
+                            expected_return_date=(
+                                datetime.date.today()
+                                + datetime.timedelta(days=2)
+                            ),
+                        )
+                results.append(taken)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=borrow, args=(user,)) for user in users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def test_last_copy_is_borrowed_only_once(self):
+        book = sample_book(inventory=1)
+        results = self.borrow_concurrently(book)
+        book.refresh_from_db()
+
+        self.assertEqual(len(results), self.THREADS)
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(book.inventory, 0)
+        self.assertEqual(Borrowing.objects.filter(book=book).count(), 1)
+
+    def test_no_updates_are_lost(self):
+        book = sample_book(inventory=10)
+        results = self.borrow_concurrently(book)
+        book.refresh_from_db()
+
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(book.inventory, 0)
+        self.assertEqual(Borrowing.objects.filter(book=book).count(), 10)
+
+
+class InventoryTests(TransactionTestCase):
+    def test_take_copy_refuses_when_out_of_stock(self):
+        book = sample_book(inventory=0)
+        self.assertFalse(take_copy(book.id))
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_return_copy_increments_inventory(self):
+        book = sample_book(inventory=0)
+        return_copy(book.id)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 1)
+
+    def test_take_copies_takes_all_or_nothing(self):
+        first, empty = sample_book(), sample_book(inventory=0)
+
+        with transaction.atomic():
+            _, unavailable = take_copies([first.id, empty.id, 0])
+
+        self.assertEqual(unavailable, [empty.id, 0])
+        first.refresh_from_db()
+        self.assertEqual(first.inventory, 10)
+
+    def test_overlapping_checkouts_do_not_deadlock(self):
+        books = [sample_book(inventory=20) for _ in range(4)]
+        ids = [book.id for book in books]
+        barrier = threading.Barrier(10)
+        errors = []
+
+        def checkout(book_ids):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    take_copies(book_ids)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        # Half of the threads ask for the books in the opposite order.
+        threads = [
+            threading.Thread(target=checkout, args=(ids[:: 1 - i % 2 * 2],))
+            for i in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for book in books:
+            book.refresh_from_db()
+            self.assertEqual(book.inventory, 10)
@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from telegram import Bot
+from telegram.error import BadRequest
+
+from book.models import Book, Notification
+from book.notifications import queue_notification
+from book.tasks import deliver_notification
+from book.testing.fake_telegram import FakeTelegramServer
+
+
+BORROW_URL = reverse("book:borrow-list")
+BOT_TOKEN = "123456:fake-token"
+
+
+def sample_user():
+    return get_user_model().objects.create_user(
+        email=f"{uuid.uuid4()}hwa@gmail.com", password="jewaifj@!3e"
+    )
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Blue Seas",
+        "author": "Sasha Brul",
+        "inventory": 10,
+        "cover": "HARD",
+        "daily_fee": Decimal("10.00"),
+    }
+    defaults.update(**params)
+    return Book.objects.create(**defaults)
+
+
+def telegram_settings(server):
+    return {
+        "TELEGRAM_API_URL": server.base_url,
+        "TELEGRAM_BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_MESSAGES_PER_MINUTE": 60 * 1000,
+    }
+
+
+class NotificationDeliveryTests(TestCase):
+    def test_delivered_notification_is_marked_sent(self):
+        with FakeTelegramServer() as server, self.settings(
+            **telegram_settings(server)
+        ):
+            notification = queue_notification("Hello there")
+            deliver_notification(notification.id)
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, "SENT")
+        self.assertEqual(notification.attempts, 1)
+        self.assertIsNotNone(notification.sent_at)
+        self.assertEqual(server.messages[0]["text"], "Hello there")
+
+    def test_failed_delivery_is_recorded(self):
+        with FakeTelegramServer(status=400) as server, self.settings(
+            **telegram_settings(server)
+        ):
+            notification = queue_notification("Hello there")
+            with self.assertRaises(BadRequest):
+                deliver_notification(notification.id)
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, "FAILED")
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn("Chat not found", notification.error)
+
+
+class BorrowNotificationLatencyTests(APITestCase):
+    """
+    Benchmarks borrowing against a slow local Telegram: the request used to
+    wait for sendMessage, now it only records the notification.
+    """
+
+    TELEGRAM_LATENCY = 0.5
+
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+
+    def test_borrowing_does_not_wait_for_telegram(self):
+        with FakeTelegramServer(
+            latency=self.TELEGRAM_LATENCY
+        ) as server, self.settings(**telegram_settings(server)):
+            start = time.perf_counter()
+            asyncio.run(
+                Bot(token=BOT_TOKEN, base_url=server.base_url).send_message(
+                    chat_id=1, text="A new borrowing!"
+                )
+            )
+            synchronous_send = time.perf_counter() - start
+
+            payload = {
+                "book": sample_book().id,
+                "expected_return_date": (
+                    datetime.date.today() + datetime.timedelta(days=2)
+                ),
+            }
+            with self.captureOnCommitCallbacks() as callbacks:
+                start = time.perf_counter()
+                res = self.client.post(BORROW_URL, payload)
+                borrowing = time.perf_counter() - start
+
+            self.assertEqual(res.status_code, 202)
+            self.assertGreaterEqual(synchronous_send, self.TELEGRAM_LATENCY)
+            self.assertLess(borrowing, self.TELEGRAM_LATENCY)
+            self.assertEqual(len(server.messages), 1)
+            self.assertTrue(callbacks)
+
+            notification = Notification.objects.get()
+            self.assertEqual(notification.status, "PENDING")
+            deliver_notification(notification.id)
+            self.assertEqual(len(server.messages), 2)
@@ -1,21 +1,44 @@
 import datetime
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
 import uuid
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, APITestCase
 from django.urls import reverse
+from django.utils import timezone
 import stripe
 
-from book.models import Book, Borrowing, Payment
+from book.models import (
+    Book,
+    Borrowing,
+    Payment,
+    PaymentOutbox,
+    ReconciliationRun,
+)
+from book.payment_states import EXPIRED, PAID, transition
+from book.payments import get_checkout_session, recover_payment
 from book.serializers import PaymentListSerializer
+from book.stripe_gateway import get_gateway
+from book.tasks import create_checkout_session, reconcile_payments
+from book.testing.fake_stripe import FakeStripeServer
 
 
 PAYMENT_URL = reverse("book:payment-list")
 BORROW_URL = reverse("book:borrow-list")
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
+WEBHOOK_URL = reverse("book:stripe-webhook")
+WEBHOOK_SECRET = "whsec_test"
 
 
 def sample_user():
@@ -65,6 +88,15 @@ def get_detail_url(pk: int):
     return reverse("book:payment-detail", args=[pk])
 
 
+def stripe_settings(server):
+    return {
+        "STRIPE_API_BASE": server.api_base,
+        "STRIPE_SECRET_KEY": "sk_test_fake",
+        "STRIPE_WEBHOOK_SECRET": server.webhook_secret,
+        "STRIPE_MAX_NETWORK_RETRIES": 0,
+    }
+
+
 class UnauthenticatedPaymentApiTests(APITestCase):
     def test_list_forbidden(self):
         res = self.client.get(PAYMENT_URL)
@@ -136,8 +168,8 @@ class AuthenticatedPaymentApiTests(APITestCase):
 
         res = self.client.get(PAYMENT_URL)
         self.assertEqual(res.status_code, 200)
-        self.assertEqual(res.data, my_payments)
-        self.assertNotIn(alien_payments, res.data)
+        self.assertEqual(res.data["results"], my_payments)
+        self.assertNotIn(alien_payments, res.data["results"])
 
     def test_retrieving_only_your_payments_works(self):
         my_borrow = sample_borrowing(user=self.user)
@@ -174,18 +206,57 @@ class AuthenticatedPaymentApiTests(APITestCase):
             ),
             "book": book.id,
         }
-        self.client.post(BORROW_URL, borrowing_payload)
-        borrow = Borrowing.objects.get(book__title=book.title, user=self.user)
-        payment = Payment.objects.get(borrowing=borrow)
-        stripe.checkout.Session.expire(payment.session_id)
-        payment.status = "EXPIRED"  # simulating celery beat task
-        payment.save()
-        res = self.client.get(get_detail_url(payment.id) + "renew-session/")
+        with FakeStripeServer() as server, self.settings(
+            **stripe_settings(server)
+        ):
+            self.client.post(BORROW_URL, borrowing_payload)
+            borrow = Borrowing.objects.get(
+                book__title=book.title, user=self.user
+            )
+            payment = Payment.objects.get(borrowing=borrow)
+            create_checkout_session(payment.outbox_id)  # simulating celery
+            payment.refresh_from_db()
+            expired_session = payment.session_id
+            stripe.checkout.Session.expire(expired_session)
+            reconcile_payments()  # simulating celery beat
+            res = self.client.get(
+                get_detail_url(payment.id) + "renew-session/"
+            )
+
+            self.assertEqual(res.status_code, 200)
+            payment.refresh_from_db()
+            create_checkout_session(payment.outbox_id)
+            payment.refresh_from_db()
+
+        self.assertNotEqual(payment.session_id, expired_session)
+        self.assertEqual(
+            server.sessions[payment.session_id]["status"], "open"
+        )
 
-        self.assertEqual(res.status_code, 200)
-        payment.refresh_from_db()
-        session = stripe.checkout.Session.retrieve(payment.session_id)
-        self.assertEqual(session.status, "open")
+    def test_checkout_waits_for_session(self):
+        payment = sample_payment(borrowing=sample_borrowing(user=self.user))
+        res = self.client.get(get_detail_url(payment.id) + "checkout/")
+
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(res["Retry-After"], "1")
+
+    def test_checkout_redirects_to_session(self):
+        payment = sample_payment(
+            borrowing=sample_borrowing(user=self.user),
+            session_url="https://checkout.stripe.com/c/pay/cs_test",
+        )
+        res = self.client.get(get_detail_url(payment.id) + "checkout/")
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(res["Location"], payment.session_url)
+
+    def test_checkout_of_paid_payment_forbidden(self):
+        payment = sample_payment(
+            borrowing=sample_borrowing(user=self.user), status="PAID"
+        )
+        res = self.client.get(get_detail_url(payment.id) + "checkout/")
+
+        self.assertEqual(res.status_code, 403)
 
     def test_create_forbidden(self):
         sample_borrowing()
@@ -242,7 +313,7 @@ class AdminPaymentApiTests(APITestCase):
         res = self.client.get(PAYMENT_URL)
 
         self.assertEqual(res.status_code, 200)
-        self.assertEqual(res.data, payments)
+        self.assertEqual(res.data["results"], payments)
 
     def test_admin_can_retrieve_payments_of_others(self):
         payment = sample_payment()
@@ -282,3 +353,556 @@ class AdminPaymentApiTests(APITestCase):
         payment = sample_payment()
         res = self.client.delete(get_detail_url(payment.id))
         self.assertEqual(res.status_code, 405)
+
+
+def checkout_event(type, session_id, payment_status="unpaid"):
+    return json.dumps(
+        {
+            "id": f"evt_{uuid.uuid4().hex}",
+            "object": "event",
+            "type": type,
+            "data": {
+                "object": {
+                    "id": session_id,
+                    "object": "checkout.session",
+                    "payment_status": payment_status,
+                }
+            },
+        }
+    )
+
+
+def sign(payload: str, secret: str = WEBHOOK_SECRET):
+    timestamp = int(time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(APITestCase):
+    def post_event(self, payload, signature=None):
+        return self.client.generic(
+            "POST",
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature or sign(payload),
+        )
+
+    def test_expired_event_expires_pending_payment(self):
+        payment = sample_payment(session_id="cs_test_expired")
+        res = self.post_event(
+            checkout_event("checkout.session.expired", payment.session_id)
+        )
+        payment.refresh_from_db()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(payment.status, "EXPIRED")
+
+    def test_completed_event_marks_payment_paid(self):
+        payment = sample_payment(session_id="cs_test_paid")
+        res = self.post_event(
+            checkout_event(
+                "checkout.session.completed", payment.session_id, "paid"
+            )
+        )
+        payment.refresh_from_db()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(payment.status, "PAID")
+
+    def test_late_expired_event_does_not_touch_paid_payment(self):
+        payment = sample_payment(session_id="cs_test_late", status="PAID")
+        self.post_event(
+            checkout_event("checkout.session.expired", payment.session_id)
+        )
+        payment.refresh_from_db()
+
+        self.assertEqual(payment.status, "PAID")
+
+    def test_invalid_signature_rejected(self):
+        payment = sample_payment(session_id="cs_test_forged")
+        payload = checkout_event(
+            "checkout.session.completed", payment.session_id, "paid"
+        )
+        res = self.post_event(payload, signature=sign(payload, "whsec_fake"))
+        payment.refresh_from_db()
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(payment.status, "PENDING")
+
+
+class PaymentConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.payment = sample_payment()
+
+    def setUp(self) -> None:
+        self.client.force_authenticate(self.payment.borrowing.user)
+        self.url = get_detail_url(self.payment.id)
+
+    def test_unchanged_payment_returns_304(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_returned_borrowing_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        Borrowing.objects.filter(id=self.payment.borrowing_id).update(
+            actual_return_date=datetime.date.today()
+        )
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(res.data["borrowing"]["is_active"])
+
+
+class PaymentStateTests(APITestCase):
+    def setUp(self):
+        self.request = APIRequestFactory().get("/")
+
+    def test_transitions_are_guarded_by_status(self):
+        pending = sample_payment()
+        paid = sample_payment(status="PAID")
+        payments = Payment.objects.filter(id__in=[pending.id, paid.id])
+
+        self.assertEqual(transition(payments, EXPIRED), 1)
+        self.assertEqual(transition(payments, PAID), 0)
+        self.assertEqual(
+            dict(payments.values_list("id", "status")),
+            {pending.id: "EXPIRED", paid.id: "PAID"},
+        )
+
+    def test_transition_keeps_updated_at_current(self):
+        payment = sample_payment()
+
+        transition(Payment.objects.filter(id=payment.id), PAID)
+
+        self.assertGreater(
+            Payment.objects.get(id=payment.id).updated_at, payment.updated_at
+        )
+
+    def test_recover_payment_with_two_writes(self):
+        payment = sample_payment(
+            status="EXPIRED", session_id="cs_test_old", session_url=None
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            # The outbox entry, the payment and the savepoint around them.
+            with self.assertNumQueries(4):
+                self.assertTrue(recover_payment(self.request, payment))
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(payment.status, "PENDING")
+        self.assertIsNone(payment.session_id)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "PENDING")
+        self.assertIsNone(payment.session_id)
+        self.assertIsNone(payment.outbox.processed_at)
+
+    def test_recover_payment_only_renews_expired_payments(self):
+        payment = sample_payment(status="EXPIRED")
+        Payment.objects.filter(id=payment.id).update(status="PAID")
+
+        self.assertFalse(recover_payment(self.request, payment))
+
+        self.assertEqual(payment.status, "EXPIRED")
+        self.assertFalse(PaymentOutbox.objects.exists())
+
+
+class StripeFlowTests(APITestCase):
+    """The borrow, pay and confirm flow against a local fake Stripe."""
+
+    def setUp(self):
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        self.server = FakeStripeServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        settings_override = self.settings(**stripe_settings(self.server))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def checkout(self, *books):
+        res = self.client.post(
+            reverse("book:borrow-checkout"),
+            {
+                "books": [book.id for book in books],
+                "expected_return_date": datetime.date.today()
+                + datetime.timedelta(days=2),
+            },
+        )
+        payments = Payment.objects.filter(id__in=[p["id"] for p in res.data])
+        create_checkout_session(payments[0].outbox_id)
+        return list(payments)
+
+    def test_stripe_is_called_outside_of_any_transaction(self):
+        res = self.client.post(
+            reverse("book:borrow-checkout"),
+            {
+                "books": [sample_book().id],
+                "expected_return_date": datetime.date.today()
+                + datetime.timedelta(days=2),
+            },
+        )
+        payment = Payment.objects.get(id=res.data[0]["id"])
+        gateway = get_gateway()
+        create = gateway.create_checkout_session
+        # The test case's own atomic blocks.
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        def recording_create(**params):
+            depths.append(len(connection.atomic_blocks))
+            return create(**params)
+
+        with mock.patch.object(
+            gateway, "create_checkout_session", recording_create
+        ):
+            create_checkout_session(payment.outbox_id)
+
+        self.assertEqual(depths, [depth])
+        payment.refresh_from_db()
+        self.assertIsNotNone(payment.session_id)
+        self.assertIsNotNone(payment.outbox.processed_at)
+        self.assertIsNone(payment.outbox.leased_until)
+
+    def test_leased_outbox_entries_are_left_alone(self):
+        res = self.client.post(
+            reverse("book:borrow-checkout"),
+            {
+                "books": [sample_book().id],
+                "expected_return_date": datetime.date.today()
+                + datetime.timedelta(days=2),
+            },
+        )
+        payment = Payment.objects.get(id=res.data[0]["id"])
+        PaymentOutbox.objects.filter(id=payment.outbox_id).update(
+            leased_until=timezone.now() + datetime.timedelta(minutes=1)
+        )
+
+        self.assertIsNone(create_checkout_session(payment.outbox_id))
+        self.assertEqual(self.server.requests, [])
+
+    def test_success_without_a_session_yet_returns_202(self):
+        res = self.client.post(
+            reverse("book:borrow-checkout"),
+            {
+                "books": [sample_book().id],
+                "expected_return_date": datetime.date.today()
+                + datetime.timedelta(days=2),
+            },
+        )
+        payment_id = res.data[0]["id"]
+
+        res = self.client.get(get_detail_url(payment_id) + "success/")
+
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(res["Retry-After"], "1")
+        self.assertEqual(self.server.requests, [])
+
+    def test_stripe_redirects_with_the_session_id(self):
+        [payment] = self.checkout(sample_book())
+        success_url = self.server.sessions[payment.session_id]["success_url"]
+        self.assertTrue(
+            success_url.endswith(
+                "/payments/checkout-success/?session_id={CHECKOUT_SESSION_ID}"
+            )
+        )
+        self.server.pay(payment.session_id, name="Jane Reader")
+
+        res = self.client.get(
+            success_url.replace("{CHECKOUT_SESSION_ID}", payment.session_id)
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, "Thank you, Jane Reader!")
+        self.client.force_authenticate(sample_user())
+        res = self.client.get(
+            success_url.replace("{CHECKOUT_SESSION_ID}", payment.session_id)
+        )
+        self.assertEqual(res.status_code, 403)
+
+    def test_stripe_redirect_without_a_session_id_returns_404(self):
+        self.client.post(
+            reverse("book:borrow-checkout"),
+            {
+                "books": [sample_book().id],
+                "expected_return_date": datetime.date.today()
+                + datetime.timedelta(days=2),
+            },
+        )
+        self.client.force_authenticate(sample_user())
+        url = reverse("book:payment-checkout-success")
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(
+            self.client.get(url, {"session_id": ""}).status_code, 404
+        )
+
+    def test_success_marks_the_payments_of_the_session_paid(self):
+        payments = self.checkout(sample_book(), sample_book())
+        session_id = payments[0].session_id
+        self.assertEqual(
+            self.server.sessions[session_id]["amount_total"], 2 * 2000
+        )
+
+        res = self.client.get(get_detail_url(payments[0].id) + "success/")
+        self.assertEqual(res.status_code, 403)
+
+        self.server.pay(session_id, name="Jane Reader")
+        res = self.client.get(get_detail_url(payments[0].id) + "success/")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, "Thank you, Jane Reader!")
+        self.assertEqual(
+            set(
+                Payment.objects.filter(session_id=session_id).values_list(
+                    "status", flat=True
+                )
+            ),
+            {"PAID"},
+        )
+
+    def stripe_calls(self):
+        return len(self.server.requests)
+
+    def test_paid_payments_are_answered_without_stripe(self):
+        first, second = self.checkout(sample_book(), sample_book())
+        self.server.pay(first.session_id, name="Jane Reader")
+        self.client.get(get_detail_url(first.id) + "success/")
+        calls = self.stripe_calls()
+
+        for payment in (first, first, second):
+            res = self.client.get(get_detail_url(payment.id) + "success/")
+
+            self.assertEqual(res.data, "Thank you, Jane Reader!")
+        self.assertEqual(self.stripe_calls(), calls)
+        second.refresh_from_db()
+        self.assertEqual(second.customer_name, "Jane Reader")
+
+    def test_webhook_stores_the_customer_name(self):
+        [payment] = self.checkout(sample_book())
+        self.server.pay(payment.session_id, name="Jane Reader")
+        payload, signature = self.server.event(
+            "checkout.session.completed", payment.session_id
+        )
+        self.client.generic(
+            "POST",
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+        calls = self.stripe_calls()
+
+        res = self.client.get(get_detail_url(payment.id) + "success/")
+
+        self.assertEqual(res.data, "Thank you, Jane Reader!")
+        self.assertEqual(self.stripe_calls(), calls)
+
+    def test_customer_is_looked_up_once_without_customer_details(self):
+        [payment] = self.checkout(sample_book())
+        customer = self.server.pay(
+            payment.session_id, name="Jane Reader", customer_details=False
+        )["customer"]
+        # Paid through a webhook, which did not know the name.
+        Payment.objects.filter(id=payment.id).update(status="PAID")
+
+        res = self.client.get(get_detail_url(payment.id) + "success/")
+        self.client.get(get_detail_url(payment.id) + "success/")
+
+        self.assertEqual(res.data, "Thank you, Jane Reader!")
+        self.assertEqual(
+            [path for method, path in self.server.requests[1:]],
+            [
+                f"/v1/checkout/sessions/{payment.session_id}",
+                f"/v1/customers/{customer}",
+            ],
+        )
+
+    def test_only_paid_sessions_are_cached(self):
+        [payment] = self.checkout(sample_book())
+        calls = self.stripe_calls()
+
+        for _ in range(2):
+            self.assertEqual(
+                get_checkout_session(payment.session_id)["payment_status"],
+                "unpaid",
+            )
+        self.server.pay(payment.session_id)
+        for _ in range(2):
+            self.assertEqual(
+                get_checkout_session(payment.session_id)["payment_status"],
+                "paid",
+            )
+
+        self.assertEqual(self.stripe_calls(), calls + 3)
+
+    def test_webhook_event(self):
+        [payment] = self.checkout(sample_book())
+        self.server.pay(payment.session_id)
+        payload, signature = self.server.event(
+            "checkout.session.completed", payment.session_id
+        )
+
+        res = self.client.generic(
+            "POST",
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+        self.assertEqual(res.status_code, 200)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "PAID")
+
+    def test_reconciliation_settles_sessions_page_by_page(self):
+        payments = []
+        for _ in range(3):
+            self.client.force_authenticate(sample_user())
+            payments += self.checkout(sample_book())
+        self.server.expire(payments[0].session_id)
+        self.server.pay(payments[1].session_id, name="Jane Reader")
+
+        with mock.patch("book.reconciliation.RECONCILIATION_PAGE_SIZE", 1):
+            stats = reconcile_payments()
+
+        self.assertEqual(
+            stats,
+            {
+                "pages": 3,
+                "sessions": 3,
+                "matched": 2,
+                "paid": 1,
+                "expired": 1,
+            },
+        )
+        self.assertEqual(
+            [
+                Payment.objects.get(id=payment.id).status
+                for payment in payments
+            ],
+            ["EXPIRED", "PAID", "PENDING"],
+        )
+        self.assertEqual(
+            Payment.objects.get(id=payments[1].id).customer_name,
+            "Jane Reader",
+        )
+        self.assertEqual(
+            self.server.requests.count(("GET", "/v1/checkout/sessions")), 3
+        )
+
+    def test_reconciliation_applies_a_page_in_one_update(self):
+        payments = []
+        for _ in range(3):
+            self.client.force_authenticate(sample_user())
+            payments += self.checkout(sample_book())
+        for payment in payments:
+            self.server.expire(payment.session_id)
+
+        # The run's insert, one locking SELECT and one UPDATE for the
+        # page (in a transaction), the run's update.
+        with self.assertNumQueries(7):
+            stats = reconcile_payments()
+
+        self.assertEqual(stats["expired"], 3)
+
+    def test_reconciliation_resumes_from_the_oldest_open_session(self):
+        [settled] = self.checkout(sample_book())
+        self.server.expire(settled.session_id)
+        self.client.force_authenticate(sample_user())
+        [open_payment] = self.checkout(sample_book())
+        open_session = self.server.sessions[open_payment.session_id]
+        open_session["created"] -= 60
+        self.server.sessions[settled.session_id]["created"] -= 120
+
+        reconcile_payments()
+        run = ReconciliationRun.objects.get()
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(
+            run.next_created_since.timestamp(), open_session["created"]
+        )
+
+        self.server.pay(open_payment.session_id)
+        stats = reconcile_payments()
+
+        # The settled session is behind the watermark, no longer listed.
+        self.assertEqual(stats["sessions"], 1)
+        self.assertEqual(stats["paid"], 1)
+        open_payment.refresh_from_db()
+        self.assertEqual(open_payment.status, "PAID")
+
+    def test_complete_unpaid_sessions_do_not_hold_the_watermark(self):
+        [payment] = self.checkout(sample_book())
+        session = self.server.sessions[payment.session_id]
+        # e.g. a delayed payment that failed: complete, yet never paid.
+        session.update(status="complete", payment_status="unpaid")
+        session["created"] -= 60 * 60
+
+        reconcile_payments()
+        run = ReconciliationRun.objects.get()
+
+        self.assertGreater(
+            run.next_created_since.timestamp(), session["created"]
+        )
+        self.assertEqual(reconcile_payments()["sessions"], 0)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "PENDING")
+
+    def test_failed_reconciliation_keeps_the_watermark(self):
+        [payment] = self.checkout(sample_book())
+        self.server.expire(payment.session_id)
+        reconcile_payments()
+        watermark = ReconciliationRun.objects.get().next_created_since
+
+        self.server.status = 500
+        with self.assertRaises(stripe.error.APIError):
+            reconcile_payments()
+
+        failed = ReconciliationRun.objects.first()
+        self.assertIsNone(failed.finished_at)
+        self.assertEqual(failed.created_since, watermark)
+        self.assertIn("Injected failure", failed.error)
+
+
+class BenchmarkPaymentsCommandTests(TestCase):
+    def test_report_and_recorded_fixtures(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recorded = os.path.join(directory, "stripe.json")
+            reports = []
+            for confirm, fixtures in (
+                ("success", None),
+                ("webhook", recorded),
+            ):
+                out = StringIO()
+                call_command(
+                    "benchmark_payments",
+                    flows=3,
+                    latency=0,
+                    confirm=confirm,
+                    fixtures=fixtures,
+                    record=recorded,
+                    stdout=out,
+                )
+                reports.append(json.loads(out.getvalue()))
+            with open(recorded) as file:
+                sessions = json.load(file)["sessions"]
+
+        success, webhook = reports
+        self.assertEqual(success["flows"], 3)
+        self.assertEqual(
+            set(success["steps"]), {"borrow", "session", "confirm"}
+        )
+        # A session each, which the success page retrieves once.
+        self.assertEqual(success["stripe_requests"], 3 * 2)
+        self.assertEqual(webhook["stripe_requests"], 3)
+        self.assertEqual(len(sessions), 6)
+        self.assertFalse(Payment.objects.exists())
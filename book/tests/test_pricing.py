@@ -0,0 +1,145 @@
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from book.models import Book, Borrowing
+from book.pricing import (
+    FinePolicy,
+    annotate_fees,
+    fine,
+    fine_amount,
+    outstanding_fines,
+    rental_fee,
+)
+
+
+TODAY = datetime.date(2026, 3, 1)
+
+POLICIES = [
+    FinePolicy(),
+    FinePolicy(grace_days=2),
+    FinePolicy(
+        multiplier=Decimal("1.5"),
+        tiers=((4, Decimal("2.5")), (10, Decimal(4))),
+    ),
+    FinePolicy(grace_days=1, tiers=((3, Decimal(3)),), cap=Decimal("40")),
+]
+
+
+def sample_user():
+    return get_user_model().objects.create_user(
+        email=f"{uuid.uuid4()}hwa@gmail.com", password="jewaifj@!3e"
+    )
+
+
+class FineAmountTests(TestCase):
+    def test_default_policy_doubles_the_daily_fee(self):
+        self.assertEqual(
+            fine_amount(Decimal("1.25"), 3, FinePolicy()), Decimal("7.50")
+        )
+        self.assertEqual(
+            fine_amount(Decimal("1.25"), -3, FinePolicy()), Decimal("0.00")
+        )
+
+    def test_grace_days_tiers_and_cap(self):
+        policy = FinePolicy(grace_days=1, tiers=((3, Decimal(3)),))
+
+        # 1 free day, 2 days at 2x, 2 days at 3x.
+        self.assertEqual(fine_amount(Decimal(1), 5, policy), Decimal(10))
+        self.assertEqual(fine_amount(Decimal(1), 1, policy), Decimal(0))
+        self.assertEqual(
+            fine_amount(Decimal(1), 5, policy._replace(cap=Decimal("7.5"))),
+            Decimal("7.50"),
+        )
+
+    @override_settings(
+        FINE_POLICY={"grace_days": 3, "tiers": [(2, "2.5")], "cap": 9}
+    )
+    def test_policy_from_settings(self):
+        self.assertEqual(
+            FinePolicy.from_settings(),
+            FinePolicy(
+                grace_days=3, tiers=((2, Decimal("2.5")),), cap=Decimal(9)
+            ),
+        )
+
+
+class BatchPricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = sample_user()
+        books = [
+            Book.objects.create(
+                title=f"Book {fee}",
+                author="Sasha Brul",
+                inventory=1,
+                cover="HARD",
+                daily_fee=Decimal(fee),
+            )
+            for fee in ("0.25", "1.33", "7.99")
+        ]
+        borrowings = []
+        for book in books:
+            for overdue in range(-2, 16, 3):
+                expected = TODAY - datetime.timedelta(days=overdue)
+                borrowings += [
+                    Borrowing(
+                        book=book,
+                        user=user,
+                        expected_return_date=expected,
+                        actual_return_date=returned,
+                    )
+                    for returned in (None, expected, TODAY)
+                ]
+        Borrowing.objects.bulk_create(borrowings)
+
+    def test_sql_and_python_prices_agree(self):
+        for policy in POLICIES:
+            borrowings = annotate_fees(
+                Borrowing.objects.select_related("book"), policy, TODAY
+            )
+            for borrowing in borrowings:
+                self.assertEqual(
+                    borrowing.fine, fine(borrowing, policy, TODAY), policy
+                )
+                self.assertEqual(borrowing.rental_fee, rental_fee(borrowing))
+
+    def test_outstanding_fines(self):
+        for policy in POLICIES:
+            active = Borrowing.objects.filter(
+                actual_return_date__isnull=True
+            ).select_related("book")
+
+            self.assertEqual(
+                outstanding_fines(policy, TODAY),
+                sum(fine(borrowing, policy, TODAY) for borrowing in active),
+            )
+
+    def test_whole_queryset_is_priced_with_one_query(self):
+        with self.assertNumQueries(1):
+            list(annotate_fees(Borrowing.objects.all(), POLICIES[-1]))
+
+
+class BenchmarkPricingCommandTests(TestCase):
+    def test_report(self):
+        out = StringIO()
+
+        call_command(
+            "benchmark_pricing",
+            borrowings=300,
+            users=5,
+            books=5,
+            stdout=out,
+            stderr=StringIO(),
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["borrowings"], 300)
+        self.assertEqual(report["sql"]["totals"], report["python"]["totals"])
+        self.assertFalse(Borrowing.objects.exists())
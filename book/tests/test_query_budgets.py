@@ -0,0 +1,66 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from book.benchmark import (
+    ENDPOINTS,
+    count_queries,
+    make_clients,
+    measure,
+    prepare_fixtures,
+)
+
+
+def seed(borrowings):
+    call_command(
+        "seed_library",
+        users=3,
+        books=10,
+        borrowings=borrowings,
+        active_ratio=0.3,
+        seed=1,
+        stdout=StringIO(),
+    )
+
+
+class QueryBudgetTests(TestCase):
+    def query_counts(self):
+        fixtures = prepare_fixtures()
+        clients = make_clients(fixtures)
+        counts = {}
+        for endpoint in ENDPOINTS:
+            response, queries = count_queries(endpoint, clients, fixtures)
+            self.assertEqual(response.status_code, 200, endpoint.name)
+            counts[endpoint.name] = queries
+        return counts
+
+    def test_endpoints_stay_within_query_budget(self):
+        seed(borrowings=30)
+
+        for endpoint, queries in self.query_counts().items():
+            budget = next(
+                e.max_queries for e in ENDPOINTS if e.name == endpoint
+            )
+            self.assertLessEqual(queries, budget, endpoint)
+
+    def test_query_counts_do_not_grow_with_data(self):
+        seed(borrowings=6)
+        small = self.query_counts()
+
+        seed(borrowings=120)
+
+        self.assertEqual(self.query_counts(), small)
+
+    def test_measure_reports_latency_and_allocations(self):
+        seed(borrowings=10)
+        fixtures = prepare_fixtures()
+
+        result = measure(
+            ENDPOINTS[0], make_clients(fixtures), fixtures, repeat=3
+        )
+
+        self.assertEqual(result["endpoint"], "books-list")
+        self.assertEqual(result["status"], 200)
+        self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+        self.assertGreater(result["peak_kb"], 0)
@@ -0,0 +1,86 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase
+
+from book.models import Book, Borrowing, Payment
+
+
+def seed(**options):
+    defaults = {
+        "users": 20,
+        "books": 50,
+        "borrowings": 500,
+        "batch_size": 120,
+        "seed": 7,
+        "stdout": StringIO(),
+    }
+    defaults.update(options)
+    call_command("seed_library", **defaults)
+
+
+class SeedLibraryTests(TestCase):
+    def test_creates_requested_volumes(self):
+        seed()
+
+        self.assertEqual(get_user_model().objects.count(), 20)
+        self.assertEqual(Book.objects.count(), 50)
+        self.assertEqual(Borrowing.objects.count(), 500)
+        self.assertEqual(Payment.objects.filter(type="PAYMENT").count(), 500)
+        self.assertEqual(
+            Payment.objects.filter(type="FINE").count(),
+            Borrowing.objects.filter(
+                actual_return_date__gt=F("expected_return_date")
+            ).count(),
+        )
+
+    def test_borrow_dates_are_spread_over_history(self):
+        seed()
+
+        self.assertGreater(
+            Borrowing.objects.values("borrow_date").distinct().count(), 100
+        )
+        self.assertTrue(
+            Borrowing.objects.filter(
+                actual_return_date__isnull=True,
+                expected_return_date__lt=datetime.date.today(),
+            ).exists()
+        )
+        self.assertFalse(
+            Payment.objects.filter(type="PAYMENT")
+            .exclude(created_at__date=F("borrowing__borrow_date"))
+            .exists()
+        )
+
+    def test_popularity_is_skewed(self):
+        seed(zipf=1.5)
+
+        counts = list(
+            Book.objects.annotate(n=Count("borrowings"))
+            .order_by("-n")
+            .values_list("n", flat=True)
+        )
+        self.assertGreater(counts[0], 10 * counts[-1] + 10)
+
+    def test_same_seed_gives_same_data(self):
+        def snapshot():
+            return list(
+                Borrowing.objects.order_by("id").values_list(
+                    "borrow_date",
+                    "expected_return_date",
+                    "actual_return_date",
+                    "book__title",
+                )
+            )
+
+        seed(users=5, books=10, borrowings=100)
+        first = snapshot()
+        Borrowing.objects.all().delete()
+        Book.objects.all().delete()
+
+        seed(users=5, books=10, borrowings=100)
+
+        self.assertEqual(snapshot(), first)
@@ -0,0 +1,263 @@
+import concurrent.futures
+import threading
+import time
+import uuid
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from book.models import Book, Borrowing, Payment
+from book.stripe_gateway import (
+    CircuitBreaker,
+    CircuitOpenError,
+    PooledRequestsClient,
+    SingleFlight,
+    StripeGateway,
+    get_gateway,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeHTTPClient:
+    def __init__(self):
+        self._thread_local = threading.local()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def sample_gateway(**params):
+    defaults = {
+        "api_key": "sk_test",
+        "http_client": FakeHTTPClient(),
+        "breaker": CircuitBreaker(failure_threshold=2, clock=FakeClock()),
+    }
+    defaults.update(**params)
+    return StripeGateway(**defaults)
+
+
+def outage():
+    raise stripe.error.APIConnectionError("Connection refused")
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=30, clock=self.clock
+        )
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_one_trial_call_after_the_reset_timeout(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 30
+
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now = 60
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+
+
+class StripeGatewayTests(SimpleTestCase):
+    def test_outages_open_the_circuit_and_calls_fail_fast(self):
+        gateway = sample_gateway()
+        function = mock.Mock(side_effect=outage)
+
+        for _ in range(2):
+            with self.assertRaises(stripe.error.APIConnectionError):
+                gateway.call("customer.retrieve", function)
+        with self.assertRaises(CircuitOpenError):
+            gateway.call("customer.retrieve", function)
+
+        self.assertEqual(function.call_count, 2)
+        metrics = gateway.metrics()
+        self.assertEqual(metrics["circuit"], "open")
+        self.assertEqual(
+            metrics["operations"]["customer.retrieve"]["errors"],
+            {"APIConnectionError": 2, "CircuitOpenError": 1},
+        )
+
+    def test_request_errors_do_not_open_the_circuit(self):
+        gateway = sample_gateway()
+        function = mock.Mock(
+            side_effect=stripe.error.InvalidRequestError("No such", "id")
+        )
+
+        for _ in range(3):
+            with self.assertRaises(stripe.error.InvalidRequestError):
+                gateway.call("customer.retrieve", function)
+
+        self.assertEqual(gateway.metrics()["circuit"], "closed")
+        self.assertEqual(function.call_count, 3)
+
+    def test_timeout_applies_to_one_call(self):
+        gateway = sample_gateway()
+        seen = []
+
+        def function():
+            seen.append(gateway.http_client._thread_local.timeout)
+
+        gateway.call("checkout.session.create", function, timeout=30)
+        gateway.call("checkout.session.create", function)
+
+        self.assertEqual(seen, [30, None])
+        self.assertEqual(
+            gateway.metrics()["operations"]["checkout.session.create"][
+                "calls"
+            ],
+            2,
+        )
+
+    def test_list_checkout_sessions_pages_through_the_gateway(self):
+        gateway = sample_gateway()
+        pages = [
+            SimpleNamespace(
+                data=[SimpleNamespace(id="cs_1"), SimpleNamespace(id="cs_2")],
+                has_more=True,
+            ),
+            SimpleNamespace(
+                data=[SimpleNamespace(id="cs_3")], has_more=False
+            ),
+        ]
+
+        with mock.patch(
+            "stripe.checkout.Session.list", side_effect=pages
+        ) as list_sessions:
+            sessions = list(gateway.list_checkout_sessions(limit=2))
+
+        self.assertEqual([s.id for s in sessions], ["cs_1", "cs_2", "cs_3"])
+        self.assertEqual(
+            list_sessions.call_args_list[1].kwargs,
+            {"limit": 2, "starting_after": "cs_2"},
+        )
+        self.assertEqual(
+            gateway.metrics()["operations"]["checkout.session.list"]["calls"],
+            2,
+        )
+
+    def test_pooled_client(self):
+        client = PooledRequestsClient(timeout=5, pool_size=7, max_retries=1)
+
+        self.assertEqual(client._timeout, 5)
+        client._thread_local.timeout = 20
+        self.assertEqual(client._timeout, 20)
+        self.assertEqual(client._max_network_retries(), 1)
+        adapter = client._session.get_adapter("https://api.stripe.com")
+        self.assertEqual(adapter._pool_maxsize, 7)
+        client.close()
+
+    @override_settings(STRIPE_SECRET_KEY="sk_test_gateway")
+    def test_process_gateway_is_installed_in_the_sdk(self):
+        gateway = get_gateway()
+
+        self.assertIs(get_gateway(), gateway)
+        self.assertEqual(stripe.api_key, "sk_test_gateway")
+        self.assertIs(stripe.default_http_client, gateway.http_client)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_identical_lookups_share_one_call(self):
+        gateway = sample_gateway()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def retrieve(session_id):
+            calls.append(session_id)
+            started.set()
+            release.wait(5)
+            return {"id": session_id}
+
+        with mock.patch("stripe.checkout.Session.retrieve", retrieve):
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+            first = pool.submit(gateway.retrieve_checkout_session, "cs_1")
+            started.wait(5)
+            followers = [
+                pool.submit(gateway.retrieve_checkout_session, "cs_1")
+                for _ in range(3)
+            ]
+            time.sleep(0.05)
+            release.set()
+            results = [f.result(5) for f in [first, *followers]]
+            other = gateway.retrieve_checkout_session("cs_2")
+            pool.shutdown()
+
+        self.assertEqual(calls, ["cs_1", "cs_2"])
+        self.assertEqual(results, [{"id": "cs_1"}] * 4)
+        self.assertEqual(other, {"id": "cs_2"})
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flights = SingleFlight()
+
+        with self.assertRaises(ValueError):
+            flights.do("key", mock.Mock(side_effect=ValueError))
+
+        self.assertEqual(flights.do("key", lambda: 1), 1)
+
+
+class PaymentSuccessOutageTests(APITestCase):
+    def test_success_returns_503_while_stripe_is_unavailable(self):
+        user = get_user_model().objects.create_user(
+            email=f"{uuid.uuid4()}hwa@gmail.com", password="jewaifj@!3e"
+        )
+        book = Book.objects.create(
+            title="Blue Seas",
+            author="Sasha Brul",
+            inventory=10,
+            cover="HARD",
+            daily_fee=Decimal("10.00"),
+        )
+        payment = Payment.objects.create(
+            borrowing=Borrowing.objects.create(
+                expected_return_date="2099-01-01", book=book, user=user
+            ),
+            status="PENDING",
+            type="PAYMENT",
+            money_to_pay=Decimal("20.00"),
+            session_id="cs_test_outage",
+        )
+        self.client.force_authenticate(user)
+        gateway = sample_gateway()
+        gateway.breaker.record_failure()
+        gateway.breaker.record_failure()
+
+        with mock.patch("book.payments.get_gateway", return_value=gateway):
+            res = self.client.get(
+                reverse("book:payment-success", args=[payment.id])
+            )
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res["Retry-After"], "30")
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "PENDING")
@@ -0,0 +1,102 @@
+import datetime
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from book.models import Book, Borrowing
+from book.tasks import (
+    check_for_overdue_borrowings,
+    deliver_notification,
+    send_notification_batch,
+)
+
+
+def sample_user():
+    return get_user_model().objects.create_user(
+        email=f"{uuid.uuid4()}hwa@gmail.com", password="jewaifj@!3e"
+    )
+
+
+def sample_book(**params):
+    defaults = {
+        "title": "Blue Seas",
+        "author": "Sasha Brul",
+        "inventory": 10,
+        "cover": "HARD",
+        "daily_fee": Decimal("10.00"),
+    }
+    defaults.update(**params)
+    return Book.objects.create(**defaults)
+
+
+def sample_borrowing(**params):
+    defaults = {
+        "borrow_date": datetime.date.today(),
+        "expected_return_date": (
+            datetime.date.today() + datetime.timedelta(days=2)
+        ),
+        "actual_return_date": None,
+        "book": sample_book(),
+        "user": sample_user(),
+    }
+    defaults.update(**params)
+    return Borrowing.objects.create(**defaults)
+
+
+@mock.patch("book.tasks.send_notification_batch.delay")
+class OverdueSweepTests(TestCase):
+    def test_no_overdues_notification(self, send_batch):
+        sample_borrowing()
+        self.assertEqual(check_for_overdue_borrowings(), 0)
+        send_batch.assert_called_once_with(["No borrowings overdue today!"])
+
+    def test_overdue_and_tomorrow_borrowings_are_notified(self, send_batch):
+        today = datetime.date.today()
+        overdue = sample_borrowing(
+            expected_return_date=today - datetime.timedelta(days=1)
+        )
+        tomorrow = sample_borrowing(
+            expected_return_date=today + datetime.timedelta(days=1)
+        )
+        sample_borrowing()
+        sample_borrowing(
+            expected_return_date=today - datetime.timedelta(days=1),
+            actual_return_date=today,
+        )
+
+        self.assertEqual(check_for_overdue_borrowings(), 2)
+        texts = send_batch.call_args.args[0]
+        self.assertEqual(len(texts), 2)
+        self.assertTrue(
+            any(
+                str(overdue.user) in text and "still haven't" in text
+                for text in texts
+            )
+        )
+        self.assertTrue(
+            any(
+                str(tomorrow.user) in text and "tomorrow" in text
+                for text in texts
+            )
+        )
+
+    def test_sweep_runs_a_single_query(self, send_batch):
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        for _ in range(20):
+            sample_borrowing(expected_return_date=yesterday)
+
+        with mock.patch("book.tasks.NOTIFICATION_BATCH_SIZE", 5):
+            with self.assertNumQueries(1):
+                self.assertEqual(check_for_overdue_borrowings(), 20)
+
+        self.assertEqual(send_batch.call_count, 4)
+
+
+class NotificationRoutingTests(SimpleTestCase):
+    def test_telegram_tasks_share_one_queue(self):
+        for task in (send_notification_batch, deliver_notification):
+            route = task.app.amqp.router.route({}, task.name)
+            self.assertEqual(route["queue"].name, "telegram")
@@ -0,0 +1,85 @@
+import time
+
+from django.test import SimpleTestCase
+from telegram.error import BadRequest, RetryAfter
+
+from book.telegram_bot import MESSAGE_LIMIT, SEPARATOR, TelegramDispatcher
+
+
+class FakeBot:
+    def __init__(self, errors=()):
+        self.sent = []
+        self.errors = list(errors)
+
+    async def send_message(self, chat_id, text):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(text)
+
+
+def sample_dispatcher(bot, **params):
+    defaults = {
+        "token": "token",
+        "chat_id": "chat",
+        "messages_per_minute": 60 * 1000,
+        "concurrency": 1,
+        "bot": bot,
+    }
+    defaults.update(**params)
+    return TelegramDispatcher(**defaults).start()
+
+
+class TelegramDispatcherTests(SimpleTestCase):
+    def test_queued_texts_are_batched_into_few_messages(self):
+        bot = FakeBot()
+        dispatcher = sample_dispatcher(bot)
+        texts = [f"notification {i}" for i in range(500)]
+        futures = [dispatcher.notify(text) for text in texts]
+
+        self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertTrue(all(future.result() for future in futures))
+        self.assertLess(len(bot.sent), 10)
+        self.assertEqual(SEPARATOR.join(bot.sent), SEPARATOR.join(texts))
+        self.assertTrue(all(len(text) <= MESSAGE_LIMIT for text in bot.sent))
+        dispatcher.close()
+
+    def test_too_long_text_is_split(self):
+        bot = FakeBot()
+        dispatcher = sample_dispatcher(bot)
+        dispatcher.notify("a" * (MESSAGE_LIMIT + 10)).result(timeout=5)
+
+        self.assertEqual(
+            [len(text) for text in bot.sent], [MESSAGE_LIMIT, 10]
+        )
+        dispatcher.close()
+
+    def test_retry_after_is_honoured(self):
+        bot = FakeBot(errors=[RetryAfter(0), RetryAfter(0)])
+        dispatcher = sample_dispatcher(bot)
+
+        self.assertTrue(dispatcher.notify("hello").result(timeout=5))
+        self.assertEqual(bot.sent, ["hello"])
+        dispatcher.close()
+
+    def test_bad_request_fails_without_retries(self):
+        bot = FakeBot(errors=[BadRequest("chat not found")])
+        dispatcher = sample_dispatcher(bot)
+
+        with self.assertRaises(BadRequest):
+            dispatcher.notify("hello").result(timeout=5)
+        self.assertEqual(bot.sent, [])
+        dispatcher.close()
+
+    def test_rate_limit_is_respected(self):
+        bot = FakeBot()
+        dispatcher = sample_dispatcher(
+            bot, messages_per_minute=600, concurrency=3
+        )
+        start = time.monotonic()
+        for _ in range(3):
+            dispatcher.notify("a" * MESSAGE_LIMIT)
+        dispatcher.flush(timeout=5)
+
+        self.assertEqual(len(bot.sent), 3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        dispatcher.close()
@@ -1,7 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from book.views import BookViewSet, BorrowViewSet, PaymentViewSet
+from book.views import (
+    AnalyticsView,
+    BookAutocompleteView,
+    BookViewSet,
+    BorrowViewSet,
+    PaymentViewSet,
+    StripeWebhookView,
+)
 
 app_name = "book"
 
@@ -10,4 +17,17 @@ router.register("books", BookViewSet)
 router.register("borrowings", BorrowViewSet, basename="borrow")
 router.register("payments", PaymentViewSet, basename="payment")
 
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path(
+        "books/autocomplete/",
+        BookAutocompleteView.as_view(),
+        name="book-autocomplete",
+    ),
+    path("", include(router.urls)),
+    path("analytics/", AnalyticsView.as_view(), name="analytics"),
+    path(
+        "stripe/webhook/",
+        StripeWebhookView.as_view(),
+        name="stripe-webhook",
+    ),
+]
@@ -1,44 +1,107 @@
 import datetime
-import os
+from collections import Counter
+from decimal import Decimal, InvalidOperation
 
 import stripe
-from django.db.models import Q
-from django.http import HttpResponseRedirect
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.db.models.functions import Greatest
+from django.http import (
+    Http404,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import (
     ListModelMixin,
     CreateModelMixin,
     RetrieveModelMixin,
 )
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-
-from book.models import Book, Borrowing, Payment
-from book.payments import create_payment, recover_payment
+from rest_framework.views import APIView
+
+from book.analytics import ROLLUP_WATERMARK
+from book.autocomplete import suggest
+from book.bulk import detect_format, export_books, import_books, read_rows
+from book.cache import (
+    catalog_cache_key,
+    catalog_version,
+    get_cached_catalog,
+    set_cached_catalog,
+)
+from book.conditional import (
+    ConditionalRetrieveMixin,
+    set_validators,
+    version_etag,
+)
+from book.facets import facet_counts
+from book.inventory import return_copies, return_copy
+from book.models import (
+    Book,
+    Borrowing,
+    BorrowingDailyRollup,
+    Payment,
+    PaymentDailyRollup,
+    RollupWatermark,
+)
+from book.pagination import (
+    BookPagination,
+    BorrowingPagination,
+    PaymentPagination,
+)
+from book.payment_states import EXPIRED, PAID
+from book.payments import (
+    apply_checkout_session_event,
+    create_fines,
+    create_payment,
+    create_payments,
+    get_checkout_session,
+    get_checkout_url,
+    get_customer_name,
+    mark_session_paid,
+    recover_payment,
+)
 from book.permissions import (
     IsAdminOrListOnly,
     BorrowingIsAdminOrAuthenticatedOwner,
     PaymentIsAdminOrAuthenticatedOwner,
 )
+from book.pricing import fine, fine_expression
+from book.search import search_books
 from book.serializers import (
+    AnalyticsPeriodSerializer,
+    BatchBorrowSerializer,
     BookListSerializer,
     BookSerializer,
+    BorrowingDailyRollupSerializer,
     BorrowSerializer,
     BorrowListSerializer,
     BorrowDetailSerializer,
+    BulkReturnSerializer,
+    FineSerializer,
     PaymentListSerializer,
+    PaymentDailyRollupSerializer,
     PaymentDetailSerializer,
 )
+from book.stripe_gateway import OUTAGE_ERRORS
 
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+# Seconds clients are asked to wait while Stripe is unavailable.
+STRIPE_RETRY_AFTER = 30
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     permission_classes = [IsAdminOrListOnly]
+    pagination_class = BookPagination
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -46,19 +109,274 @@ class BookViewSet(viewsets.ModelViewSet):
 
         return BookSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != "list":
+            return queryset
+
+        params = self.request.query_params
+        text = params.get("q", "").strip()
+        cover = params.get("cover")
+        author = params.get("author")
+        available = params.get("available")
+
+        if text:
+            queryset = search_books(queryset, text)
+
+        if cover:
+            if cover not in Book.CoverChoices.values:
+                raise ValidationError(
+                    {"cover": f"Must be one of {Book.CoverChoices.values}"}
+                )
+            queryset = queryset.filter(cover=cover)
+
+        if author:
+            queryset = queryset.filter(author=author)
+
+        if available is not None:
+            if available.lower() == "true":
+                queryset = queryset.filter(inventory__gt=0)
+            else:
+                queryset = queryset.filter(inventory=0)
+
+        for param, lookup in (("min_fee", "gte"), ("max_fee", "lte")):
+            if params.get(param):
+                try:
+                    fee = Decimal(params[param])
+                except InvalidOperation:
+                    fee = None
+                if fee is None or not fee.is_finite():
+                    raise ValidationError({param: "Must be a number"})
+                queryset = queryset.filter(**{f"daily_fee__{lookup}": fee})
+
+        return queryset
+
+    def update(self, request, *args, **kwargs):
+        """
+        With an If-Match header (the ETag of a previous response) the book
+        is only updated if nobody changed it since, otherwise returns 412.
+        """
+        with transaction.atomic():
+            book = self.get_versioned_object(
+                self.get_version_queryset().select_for_update()
+            )
+            response = self.check_preconditions(book)
+            if response is not None:
+                return response
+
+            response = super().update(request, *args, **kwargs)
+
+        book = self.updated_book
+        return set_validators(
+            response, version_etag(book.pk, book.updated_at), book.updated_at
+        )
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.updated_book = serializer.instance
+
+    @extend_schema(
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {
+                    "file": {"type": "string", "format": "binary"}
+                },
+            }
+        },
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
+        Creates and updates books from an uploaded .csv or .ndjson file
+        with the columns id, title, author, cover, inventory and daily_fee.
+        Rows with an id update that book, rows without one create a book.
+        Invalid rows are skipped and listed with their errors.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "No file was submitted."})
+        try:
+            fmt = detect_format(upload.name)
+        except ValueError as error:
+            raise ValidationError({"file": str(error)})
+
+        return Response(import_books(read_rows(upload, fmt)))
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="output",
+                description="csv (default) or ndjson",
+                required=False,
+                type=str,
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="export")
+    def bulk_export(self, request):
+        """Streams the whole catalog as a CSV or NDJSON download."""
+        fmt = request.query_params.get("output", "csv")
+        if fmt not in ("csv", "ndjson"):
+            raise ValidationError({"output": "Must be csv or ndjson"})
+
+        response = StreamingHttpResponse(
+            export_books(fmt),
+            content_type="text/csv"
+            if fmt == "csv"
+            else "application/x-ndjson",
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="books.{fmt}"'
+        return response
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                description=(
+                    "Search by title and author, typos tolerated; "
+                    "results are ordered by relevance (ex. ?q=hobit)"
+                ),
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="cover",
+                description="Filter by cover, HARD or SOFT",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="author",
+                description="Filter by exact author name",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="available",
+                description=(
+                    "Filter by case-insensitive availability "
+                    "(bool) (ex. ?available=true)"
+                ),
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="min_fee",
+                description="Minimal daily fee (ex. ?min_fee=0.5)",
+                required=False,
+                type=float,
+            ),
+            OpenApiParameter(
+                name="max_fee",
+                description="Maximal daily fee (ex. ?max_fee=2)",
+                required=False,
+                type=float,
+            ),
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        """
+        The catalog is the same for everyone, so whole pages are cached
+        per url (search queries and filters included) until any book or
+        its inventory changes.
+        Pages come with catalog-wide facet counts per cover, availability
+        and author, which are precomputed rather than counted per request.
+        The ETag is the catalog version, so If-None-Match costs no query.
+        Without a version (the cache is unreachable) pages are neither
+        cached nor validated, a constant ETag would never go stale.
+        """
+        version = catalog_version()
+        if version is None:
+            response = super().list(request, *args, **kwargs)
+            response.data["facets"] = facet_counts(
+                request.query_params.get("author")
+            )
+            return response
+
+        etag = quote_etag(f"catalog-{version}")
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return set_validators(response, etag)
+
+        key = catalog_cache_key(request, version)
+        data = get_cached_catalog(key)
+        if data is not None:
+            return Response(data, headers={"X-Cache": "HIT", "ETag": etag})
+
+        response = super().list(request, *args, **kwargs)
+        response.data["facets"] = facet_counts(
+            request.query_params.get("author")
+        )
+        set_cached_catalog(key, response.data)
+        response["X-Cache"] = "MISS"
+        return set_validators(response, etag)
+
+
+class BookAutocompleteView(APIView):
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                description="Beginning of a word of a title or an author",
+                required=True,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="limit",
+                description="Number of suggestions, 1 to 20 (default 10)",
+                required=False,
+                type=int,
+            ),
+        ]
+    )
+    def get(self, request):
+        """
+        Type-ahead suggestions of titles and authors, most borrowed first,
+        served from an in-memory prefix index.
+        """
+        try:
+            limit = min(
+                max(int(request.query_params.get("limit", 10)), 1), 20
+            )
+        except ValueError:
+            return Response("limit must be a number", status=400)
+
+        return Response(
+            {"results": suggest(request.query_params.get("q", ""), limit)}
+        )
+
 
 class BorrowViewSet(
+    ConditionalRetrieveMixin,
     viewsets.GenericViewSet,
     ListModelMixin,
     CreateModelMixin,
     RetrieveModelMixin,
 ):
     permission_classes = [BorrowingIsAdminOrAuthenticatedOwner]
+    pagination_class = BorrowingPagination
 
     def get_serializer_class(self):
         if self.action == "create":
             return BorrowSerializer
 
+        if self.action == "checkout":
+            return BatchBorrowSerializer
+
+        if self.action == "bulk_return":
+            return BulkReturnSerializer
+
         if self.action == "list":
             return BorrowListSerializer
 
@@ -87,34 +405,91 @@ class BorrowViewSet(
                 )
 
         if self.action == "list":
-            queryset = queryset.select_related("user")
+            queryset = queryset.select_related("user", "book")
+
+        if self.action == "retrieve":
+            queryset = queryset.select_related(
+                "user", "book"
+            ).prefetch_related("payments")
 
         return queryset
 
+    def get_version_queryset(self):
+        return Borrowing.objects.select_related("user").annotate(
+            version=Greatest(
+                "updated_at",
+                "book__updated_at",
+                Max("payments__updated_at"),
+            )
+        )
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @staticmethod
+    def has_pending_payments(user) -> bool:
+        return Payment.objects.filter(
+            borrowing__in=user.borrowings.all(), status="PENDING"
+        ).exists()
+
     def create(self, request, *args, **kwargs):
         """
-        If the user does not have unpaid payment,
-        redirects to a stripe payment session.
+        If the user does not have unpaid payment, creates the borrowing
+        with a pending payment and returns it with status 202, while its
+        Stripe session is created in the background.
+        The Location header points to the payment's checkout page, which
+        redirects to Stripe as soon as the session is ready.
         Otherwise, return 403.
         """
-        if Payment.objects.filter(
-            borrowing__in=request.user.borrowings.all(), status="PENDING"
-        ).exists():
+        if self.has_pending_payments(request.user):
             return Response(
                 "You will be able to borrow new books once "
                 "you have completed all your payments",
                 status=403,
             )
 
-        response = super().create(request, *args, **kwargs)
-        borrowing = Borrowing.objects.get(id=response.data.get("id"))
-        return HttpResponseRedirect(
-            redirect_to=create_payment(
-                request=request, borrowing=borrowing, type="PAYMENT"
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The saved borrowing comes with its book and user already loaded.
+        with transaction.atomic():
+            self.perform_create(serializer)
+            payment = create_payment(
+                request=request, borrowing=serializer.instance, type="PAYMENT"
             )
+
+        return Response(
+            PaymentDetailSerializer(payment).data,
+            status=202,
+            headers={"Location": get_checkout_url(request, payment)},
+        )
+
+    @extend_schema(responses=PaymentDetailSerializer(many=True))
+    @action(methods=["POST"], detail=False, url_path="checkout")
+    def checkout(self, request):
+        """
+        Borrows several books at once, all of them or none, and returns
+        their pending payments with status 202. The payments share one
+        Stripe session with a line item per book, which the Location
+        header (the first payment's checkout page) redirects to.
+        Forbidden (403) while the user has an unpaid payment, like create.
+        """
+        if self.has_pending_payments(request.user):
+            return Response(
+                "You will be able to borrow new books once "
+                "you have completed all your payments",
+                status=403,
+            )
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            borrowings = serializer.save(user=request.user)
+            payments = create_payments(request, borrowings, "PAYMENT")
+
+        return Response(
+            PaymentDetailSerializer(payments, many=True).data,
+            status=202,
+            headers={"Location": get_checkout_url(request, payments[0])},
         )
 
     @action(
@@ -131,28 +506,83 @@ class BorrowViewSet(
         a fine payment is created.
         """
         borrowing = self.get_object()
-        if borrowing.actual_return_date:
+        today = datetime.date.today()
+        with transaction.atomic():
+            returned = Borrowing.objects.filter(
+                pk=borrowing.pk, actual_return_date__isnull=True
+            ).update(actual_return_date=today)
+            if returned:
+                return_copy(borrowing.book_id)
+
+        if not returned:
+            # Either returned earlier or by a concurrent request just now.
+            borrowing.refresh_from_db(fields=["actual_return_date"])
             return Response(
                 f"This book has been already "
                 f"returned on {borrowing.actual_return_date}!",
                 status=400,
             )
-        borrowing.actual_return_date = datetime.date.today()
-        borrowing.save()
+
+        borrowing.actual_return_date = today
         book = borrowing.book
-        book.inventory += 1
-        book.save()
 
-        if borrowing.actual_return_date <= borrowing.expected_return_date:
+        if not fine(borrowing):
             return Response(
                 f"{book.title} has been returned on "
                 f"{datetime.date.today()} successfully."
             )
 
+        payment = create_payment(request, borrowing, "FINE")
         return Response(
             f"Well, well, silly {borrowing.user}, "
             f"here is their fine: "
-            f"{create_payment(request, borrowing, 'FINE')}"
+            f"{get_checkout_url(request, payment)}"
+        )
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="return",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_return(self, request):
+        """
+        Returns many borrowings at once with today's date. Borrowings that
+        are unknown or returned already are listed as skipped. Overdue ones
+        get a fine, priced by the database while they are locked, whose
+        Stripe session is created in the background, one per user.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["borrowings"]
+        today = datetime.date.today()
+
+        with transaction.atomic():
+            borrowings = list(
+                Borrowing.objects.select_for_update(of=("self",))
+                .filter(id__in=ids, actual_return_date__isnull=True)
+                .annotate(fine=fine_expression(as_of=today))
+                .order_by("id")
+            )
+            Borrowing.objects.filter(
+                id__in=[borrowing.id for borrowing in borrowings]
+            ).update(actual_return_date=today)
+            return_copies(
+                Counter(borrowing.book_id for borrowing in borrowings)
+            )
+
+            fines = create_fines(
+                request,
+                [borrowing for borrowing in borrowings if borrowing.fine],
+            )
+
+        returned = {borrowing.id for borrowing in borrowings}
+        return Response(
+            {
+                "returned": sorted(returned),
+                "skipped": [pk for pk in ids if pk not in returned],
+                "fines": FineSerializer(fines, many=True).data,
+            }
         )
 
     @extend_schema(
@@ -180,9 +610,13 @@ class BorrowViewSet(
 
 
 class PaymentViewSet(
-    viewsets.GenericViewSet, ListModelMixin, RetrieveModelMixin
+    ConditionalRetrieveMixin,
+    viewsets.GenericViewSet,
+    ListModelMixin,
+    RetrieveModelMixin,
 ):
     permission_classes = [PaymentIsAdminOrAuthenticatedOwner]
+    pagination_class = PaymentPagination
 
     def get_queryset(self):
         queryset = Payment.objects.select_related(
@@ -194,6 +628,15 @@ class PaymentViewSet(
 
         return queryset
 
+    def get_version_queryset(self):
+        return Payment.objects.select_related("borrowing__user").annotate(
+            version=Greatest(
+                "updated_at",
+                "borrowing__updated_at",
+                "borrowing__book__updated_at",
+            )
+        )
+
     def get_serializer_class(self):
         if self.action == "list":
             return PaymentListSerializer
@@ -204,23 +647,68 @@ class PaymentViewSet(
     def success(self, request, pk=None):
         """
         Endpoint to which Stripe redirects users after a successful payment.
-        Here Payment status becomes "PAID"
+        Here Payment status becomes "PAID", along with the customer's name,
+        so later visits are answered without asking Stripe again.
+        Returns 202 while the payment's session is still being created.
         """
-        payment = self.get_object()
-        session = stripe.checkout.Session.retrieve(payment.session_id)
-        if session.payment_status == "paid":
-            customer = stripe.Customer.retrieve(session.customer)
-            payment.status = "PAID"
-            payment.save()
-            return Response(f"Thank you, {customer.name}!", status=200)
+        return self.confirm(self.get_object())
 
-        return Response(f"Not yet, pay first: {session.url}", status=403)
+    @action(methods=["GET"], detail=False, url_path="checkout-success")
+    def checkout_success(self, request):
+        """
+        Endpoint Stripe redirects to after a successful payment, with the
+        checkout session's id (?session_id=), answered like success/.
+        """
+        session_id = request.query_params.get("session_id")
+        # Without it the lookup would match payments with no session yet.
+        if not session_id:
+            raise Http404
+        payment = self.get_queryset().filter(session_id=session_id).first()
+        if payment is None:
+            raise Http404
+        self.check_object_permissions(request, payment)
+        return self.confirm(payment)
+
+    def confirm(self, payment):
+        if payment.status == PAID and payment.customer_name:
+            return Response(
+                f"Thank you, {payment.customer_name}!", status=200
+            )
+        if payment.session_id is None:
+            return Response(
+                "The payment session is being created, please retry shortly",
+                status=202,
+                headers={"Retry-After": "1"},
+            )
+
+        try:
+            session = get_checkout_session(payment.session_id)
+            name = session["customer_name"]
+            if session["payment_status"] == "paid" and not name:
+                name = get_customer_name(session["customer"])
+        except OUTAGE_ERRORS:
+            return Response(
+                "The payment provider is unavailable, please retry shortly",
+                status=503,
+                headers={"Retry-After": str(STRIPE_RETRY_AFTER)},
+            )
+
+        if session["payment_status"] == "paid":
+            # A checkout of several books pays all of their payments.
+            mark_session_paid(payment.session_id, name)
+            return Response(f"Thank you, {name}!", status=200)
+
+        return Response(f"Not yet, pay first: {session['url']}", status=403)
 
     @action(methods=["GET"], detail=True, url_path="cancel")
     def cancel(self, request, pk=None):
         """
         Endpoint to which Stripe redirects users after a canceled payment.
         """
+        return self.checkout_cancel(request)
+
+    @action(methods=["GET"], detail=False, url_path="checkout-cancel")
+    def checkout_cancel(self, request):
         return Response(
             "Please don't forget to complete this payment "
             "later (the session is active for 24 hours). "
@@ -235,11 +723,135 @@ class PaymentViewSet(
         (a new stripe checkout session is created with the same data).
         """
         payment = self.get_object()
-        if payment.status != "EXPIRED":
+        if payment.status != EXPIRED or not recover_payment(request, payment):
             return Response(
                 "This payment is totally fine, no need for a renewal",
                 status=403,
             )
 
-        recover_payment(request, payment)
-        return Response(f"Renewed successfully. Link: {payment.session_url}")
+        return Response(
+            f"Renewed successfully. "
+            f"Link: {get_checkout_url(request, payment)}"
+        )
+
+    @action(methods=["GET"], detail=True, url_path="checkout")
+    def checkout(self, request, pk=None):
+        """
+        Redirects to the Stripe checkout session of a pending payment.
+        While the session is still being created, returns 202
+        with a Retry-After header, so clients can poll this endpoint.
+        """
+        payment = self.get_object()
+        if payment.status != "PENDING":
+            return Response(
+                f"This payment is {payment.status.lower()}, "
+                f"there is nothing to pay",
+                status=403,
+            )
+
+        if payment.session_url:
+            return HttpResponseRedirect(redirect_to=payment.session_url)
+
+        return Response(
+            "The payment session is being created, please retry shortly",
+            status=202,
+            headers={"Retry-After": "1"},
+        )
+
+
+class AnalyticsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="start",
+                description="First day, 29 days before end by default",
+                required=False,
+                type=datetime.date,
+            ),
+            OpenApiParameter(
+                name="end",
+                description="Last day, today by default",
+                required=False,
+                type=datetime.date,
+            ),
+        ]
+    )
+    def get(self, request):
+        """
+        Revenue, payments and borrowings per day, and the fines due now,
+        read from daily rollup tables refreshed every few minutes (see
+        refreshed_at) rather than aggregated over payments and borrowings.
+        """
+        serializer = AnalyticsPeriodSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        period = (
+            serializer.validated_data["start"],
+            serializer.validated_data["end"],
+        )
+
+        payments = PaymentDailyRollup.objects.filter(day__range=period)
+        revenue = {}
+        for rollup in payments:
+            if rollup.status == Payment.StatusChoices.PAID:
+                revenue[rollup.day] = (
+                    revenue.get(rollup.day, 0) + rollup.amount
+                )
+        pending_fines = PaymentDailyRollup.objects.filter(
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.FINE,
+        ).aggregate(total=Sum("amount"))["total"]
+        latest = (
+            BorrowingDailyRollup.objects.filter(overdue__isnull=False)
+            .order_by("-day")
+            .first()
+        )
+        watermark = RollupWatermark.objects.filter(
+            name=ROLLUP_WATERMARK
+        ).first()
+
+        return Response(
+            {
+                "start": period[0],
+                "end": period[1],
+                "refreshed_at": watermark and watermark.value,
+                "revenue": [
+                    {"day": day, "amount": amount}
+                    for day, amount in sorted(revenue.items())
+                ],
+                "outstanding_fines": pending_fines or Decimal("0.00"),
+                "overdue": latest and latest.overdue,
+                "projected_fines": latest and latest.projected_fines,
+                "payments": PaymentDailyRollupSerializer(
+                    payments, many=True
+                ).data,
+                "borrowings": BorrowingDailyRollupSerializer(
+                    BorrowingDailyRollup.objects.filter(day__range=period),
+                    many=True,
+                ).data,
+            }
+        )
+
+
+class StripeWebhookView(APIView):
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(exclude=True)
+    def post(self, request):
+        """
+        Receives Stripe events (checkout.session.completed/expired),
+        verified with the endpoint's signing secret.
+        """
+        try:
+            event = stripe.Webhook.construct_event(
+                payload=request.body,
+                sig_header=request.headers.get("Stripe-Signature", ""),
+                secret=settings.STRIPE_WEBHOOK_SECRET,
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            return Response("Invalid payload or signature", status=400)
+
+        apply_checkout_session_event(event)
+        return Response(status=200)
@@ -30,10 +30,43 @@ STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+
+# e.g. the address of book.testing.fake_stripe.FakeStripeServer
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+
+# Stripe calls (book/stripe_gateway.py): seconds a call may take within a
+# request (background tasks allow more), retries of failed connections
+# and connections kept open per process.
+STRIPE_TIMEOUT = 5
+STRIPE_MAX_NETWORK_RETRIES = 2
+STRIPE_CONNECTION_POOL_SIZE = 10
+
+# After "failure_threshold" outages in a row, Stripe calls fail fast
+# for "reset_timeout" seconds.
+STRIPE_CIRCUIT_BREAKER = {"failure_threshold": 5, "reset_timeout": 30}
+
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
 TELEGRAM_CHAT_ID = "-1002095527677"
 
+TELEGRAM_API_URL = os.getenv(
+    "TELEGRAM_API_URL", "https://api.telegram.org/bot"
+)
+
+# Telegram allows about 20 messages per minute to the same group
+TELEGRAM_MESSAGES_PER_MINUTE = 20
+
+# A fine is the book's daily fee times "multiplier" per overdue day:
+# "grace_days" are free, "tiers" such as [(8, 3)] raise the multiplier
+# from the 8th charged day on, "cap" limits a single fine (book/pricing.py).
+FINE_POLICY = {
+    "multiplier": 2,
+    "grace_days": 0,
+    "tiers": [],
+    "cap": None,
+}
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -49,6 +82,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "django_celery_results",
     "django_celery_beat",
     "debug_toolbar",
@@ -112,9 +146,10 @@ DATABASES = {
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": "redis://127.0.0.1:6379/1",
+        "LOCATION": os.getenv("REDIS_CACHE_URL", "redis://127.0.0.1:6379/1"),
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "IGNORE_EXCEPTIONS": True,
         },
     }
 }
@@ -181,6 +216,13 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_TIMEZONE = "Europe/Kiev"
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+# Telegram messages are all sent from one single-process worker
+# (see docker-compose.yml), so its rate limiter is the only one
+# sending to the chat.
+CELERY_TASK_ROUTES = {
+    "book.tasks.send_notification_batch": {"queue": "telegram"},
+    "book.tasks.deliver_notification": {"queue": "telegram"},
+}
 
 CELERY_BEAT_SCHEDULE = {
     "daily_overdue_check": {
@@ -188,9 +230,17 @@ CELERY_BEAT_SCHEDULE = {
         "schedule": 86400,
     },
     "expired_payments_check": {
-        "task": "book.tasks.mark_expired_payments",
+        "task": "book.tasks.reconcile_payments",
+        "schedule": 60 * 5,
+    },
+    "payment_outbox_relay": {
+        "task": "book.tasks.relay_payment_outbox",
         "schedule": 60,
     },
+    "analytics_rollups_refresh": {
+        "task": "book.tasks.refresh_analytics_rollups",
+        "schedule": 60 * 5,
+    },
 }
 
 SPECTACULAR_SETTINGS = {